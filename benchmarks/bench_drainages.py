@@ -0,0 +1,44 @@
+"""Compares drainage assignment with and without a point-in-polygon
+index.
+
+Run from the package's root directory:
+
+    python -m benchmarks.bench_drainages
+"""
+import time
+
+import shapely
+
+from benchmarks import synthetic
+from floodplains.utils.spatialindex import PolygonIndex
+
+
+def nested_loop(drainage_geoms, flood_geoms):
+    """A representative point per drainage per row, tested pairwise."""
+    found = []
+    for flood in flood_geoms:
+        match = -1
+        for i, drainage in enumerate(drainage_geoms):
+            if drainage.contains(flood.representative_point()):
+                match = i
+                break
+        found.append(match)
+    return found
+
+
+def indexed(drainage_geoms, flood_geoms):
+    """One point per row, located in a single batched index query."""
+    points = shapely.point_on_surface(flood_geoms)
+    return PolygonIndex(drainage_geoms).locate(points)
+
+
+if __name__ == "__main__":
+    for n_flood, n_drain in [(1000, 15), (10000, 30), (50000, 60)]:
+        floods = synthetic.flood_areas(n_flood)
+        drains = synthetic.drainages(n_drain, extent=100 * n_flood ** 0.5)
+        for func in (nested_loop, indexed):
+            start = time.perf_counter()
+            func(drains, floods)
+            elapsed = time.perf_counter() - start
+            print(f"{func.__name__:>12} {n_flood:>6} SFHAs x {n_drain:>3} "
+                  f"drainages: {elapsed:.3f}s")
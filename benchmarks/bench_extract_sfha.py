@@ -0,0 +1,37 @@
+"""Compares SFHA containment checks with and without a spatial index.
+
+Run from the package's root directory:
+
+    python -m benchmarks.bench_extract_sfha
+"""
+import time
+
+from benchmarks import synthetic
+from floodplains.utils.spatialindex import PolygonIndex, match_contained
+
+
+def nested_loop(lomr_geoms, sfha_geoms):
+    """The LOMR x SFHA pairwise containment check."""
+    matches = []
+    for lomr in lomr_geoms:
+        buf = lomr.buffer(1)
+        matches.append([i for i, s in enumerate(sfha_geoms)
+                        if buf.contains(s)])
+    return matches
+
+
+def indexed(lomr_geoms, sfha_geoms):
+    """The containment check against a packed R-tree."""
+    return match_contained(lomr_geoms, PolygonIndex(sfha_geoms), buffer=1)
+
+
+if __name__ == "__main__":
+    for n_sfha, n_lomr in [(1000, 10), (10000, 50), (50000, 100)]:
+        sfhas = synthetic.flood_areas(n_sfha)
+        boundaries = synthetic.lomrs(n_lomr, extent=100 * n_sfha ** 0.5)
+        for func in (nested_loop, indexed):
+            start = time.perf_counter()
+            func(boundaries, sfhas)
+            elapsed = time.perf_counter() - start
+            print(f"{func.__name__:>12} {n_sfha:>6} SFHAs x {n_lomr:>3} "
+                  f"LOMRs: {elapsed:.3f}s")
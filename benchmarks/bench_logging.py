@@ -0,0 +1,121 @@
+"""Compares the latency of log calls when handlers run on the calling
+thread and when records are queued for a background listener.
+
+Each logger writes to two files and emails errors to a local stand-in
+SMTP server that is slow to greet, like the office's mail host.
+
+Run from the package's root directory:
+
+    python -m benchmarks.bench_logging --calls 2000 --delay 0.5
+"""
+import argparse
+import logging
+import logging.handlers
+import os
+import statistics
+import tempfile
+import time
+
+from floodplains.utils import logqueue
+from floodplains.utils.standin import serve_smtp
+
+
+def handlers(folder: str, port: int) -> list:
+    """Creates the process log, error log and email handlers."""
+    formatter = logging.Formatter(
+        "%(asctime)s.%(msecs)03d : %(name)s : %(levelname)s : %(message)s")
+    process = logging.FileHandler(os.path.join(folder, "process.log"))
+    errors = logging.FileHandler(os.path.join(folder, "errors.log"))
+    errors.setLevel(logging.WARNING)
+    email = logqueue.CoalescingSMTPHandler(
+        ("127.0.0.1", port), "etl@test", ["steward@test"], "Errors",
+        credentials=("etl@test", "pw"), window=60)
+    email.setLevel(logging.ERROR)
+    synchronous = logging.handlers.SMTPHandler(
+        ("127.0.0.1", port), "etl@test", ["steward@test"], "Errors",
+        credentials=("etl@test", "pw"))
+    synchronous.setLevel(logging.ERROR)
+    for handler in (process, errors, email, synchronous):
+        handler.setFormatter(formatter)
+    return [process, errors, email, synchronous]
+
+
+def time_calls(log: logging.Logger, calls: int, errors: int) -> dict:
+    """Times individual log calls, with an error every so often."""
+    info, error = [], []
+    for i in range(calls):
+        start = time.perf_counter()
+        if i % (calls // errors) == 0:
+            log.error("Something went wrong")
+            error.append(time.perf_counter() - start)
+        else:
+            log.info("Processed a feature")
+            info.append(time.perf_counter() - start)
+    return {"info_mean_us": statistics.mean(info) * 1e6,
+            "info_p99_us": statistics.quantiles(info, n=100)[-1] * 1e6,
+            "error_max_ms": max(error) * 1e3}
+
+
+def run(calls: int, errors: int, delay: float) -> dict:
+    """Times log calls with synchronous and queued handlers.
+
+    Parameters
+    ----------
+    calls : int
+        The number of log calls to time for each setup
+    errors : int
+        How many of the calls log an error
+    delay : float
+        Seconds the stand-in SMTP server takes to greet each connection
+
+    Returns
+    -------
+    dict
+        Latencies for each setup, and the emails each one sent
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as folder, \
+            serve_smtp(delay=delay) as server:
+        process, errs, email, synchronous = handlers(
+            folder, server.server_address[1])
+
+        log = logging.getLogger("bench.synchronous")
+        log.propagate = False
+        log.setLevel(logging.INFO)
+        for handler in (process, errs, synchronous):
+            log.addHandler(handler)
+        sent = len(server.messages)
+        results["synchronous"] = time_calls(log, calls, errors)
+        results["synchronous"]["emails"] = len(server.messages) - sent
+
+        sink = logging.getLogger(logqueue.SINK)
+        for handler in (process, errs, email):
+            sink.addHandler(handler)
+        logqueue.start()
+        log = logging.getLogger("bench.queued")
+        log.propagate = False
+        log.setLevel(logging.INFO)
+        log.addHandler(logqueue.queue_handler())
+        sent = len(server.messages)
+        results["queued"] = time_calls(log, calls, errors)
+        start = time.perf_counter()
+        logqueue.stop()
+        results["queued"]["flush_s"] = time.perf_counter() - start
+        results["queued"]["emails"] = len(server.messages) - sent
+        for handler in (process, errs, email, synchronous):
+            handler.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--errors", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.5,
+                        help="seconds the SMTP server takes to greet")
+    args = parser.parse_args()
+
+    for setup, result in run(args.calls, args.errors, args.delay).items():
+        stats = ", ".join(f"{k}: {v:.2f}" if isinstance(v, float)
+                          else f"{k}: {v}" for k, v in result.items())
+        print(f"{setup:>12}: {stats}")
@@ -0,0 +1,70 @@
+"""Times how long it takes to import the package's entry points, each in
+a fresh interpreter, and reports which heavy packages they load.
+
+Run from the package's root directory:
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY = ["arcgis", "arcpy", "cryptography"]
+MODULES = ["floodplains.config", "floodplains.utils.esriapi",
+           "floodplains.etl", "floodplains.__main__"]
+
+# Runs in the child interpreter, so nothing is cached between samples
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+# Lazily imported packages stay a _LazyModule until they're first used
+loaded = [m for m in {heavy!r} if m in sys.modules
+          and type(sys.modules[m]).__name__ != "_LazyModule"]
+print(json.dumps({{"seconds": seconds, "loaded": loaded}}))
+"""
+
+
+def time_import(module: str) -> dict:
+    """Imports a module in a new interpreter.
+
+    Parameters
+    ----------
+    module : str
+        The dotted name of the module to import
+
+    Returns
+    -------
+    dict
+        The seconds the import took, and the heavy packages it executed
+    """
+    code = PROBE.format(module=module, heavy=HEAVY)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                         text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(modules: list, repeat: int = 5) -> dict:
+    """Times every module, keeping the fastest import of each."""
+    results = {}
+    for module in modules:
+        samples = [time_import(module) for _ in range(repeat)]
+        results[module] = {
+            "seconds": round(min(s["seconds"] for s in samples), 4),
+            "loaded": samples[0]["loaded"]}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--modules", default=",".join(MODULES),
+                        help="comma separated modules to import")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for module, result in run(args.modules.split(","), args.repeat).items():
+        loaded = ", ".join(result["loaded"]) or "none"
+        print(f"{module:>28}: {result['seconds']:.4f}s, "
+              f"heavy packages loaded: {loaded}")
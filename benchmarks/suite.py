@@ -0,0 +1,297 @@
+"""Times the expensive stages of the ETL against synthetic NFHL data
+served from a local REST stand-in, and compares runs to a baseline.
+
+Run from the package's root directory:
+
+    python -m benchmarks.suite --scales 10,1000,10000 --save base.json
+    python -m benchmarks.suite --scales 10,1000,10000 --compare base.json
+
+Each scale is the number of synthetic SFHAs. The LOMRs, drainages and
+city limits grow with it. Stages that use the esriapi module need the
+arcgis package and are reported as skipped without it.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+import shapely
+
+from benchmarks import synthetic
+from floodplains.utils import partition, restquery, standin
+from floodplains.utils.geometry import as_shapely, union
+from floodplains.utils.spatialindex import PolygonIndex, match_contained
+
+SR = 2876
+SFHA_FIELDS = ['FLD_AR_ID', 'STUDY_TYP', 'FLD_ZONE', 'ZONE_SUBTY', 'SFHA_TF',
+               'STATIC_BFE', 'DEPTH']
+FC_FIELDS = ["FLOODZONE", "FLOODWAY", "REGULATORY", "DRAINAGE", "EFFDATE",
+             "INEFFDATE", "SOURCE"]
+
+
+def dataset(scale: int) -> dict:
+    """Creates every synthetic layer for a scale, keyed by the name it
+    is served under."""
+    extent = 100 * scale ** 0.5
+    return {"sfha": synthetic.sfha_layer(scale),
+            "lomr": synthetic.lomr_layer(max(1, scale // 100), extent),
+            "city_flood": synthetic.drainage_layer(
+                max(2, int(scale ** 0.5) // 2), extent),
+            "city": synthetic.city_layer(extent)}
+
+
+def shapes(feature_set: dict) -> list:
+    return [as_shapely(f["geometry"]) for f in feature_set["features"]]
+
+
+# Each case takes the synthetic layers and the stand-in's url, and
+# returns the function to time, so setup isn't measured
+
+def rest_query(layers, url):
+    return lambda: restquery.query(f"{url}/sfha", out_fields=SFHA_FIELDS)
+
+
+def index_containment(layers, url):
+    lomrs, sfhas = shapes(layers["lomr"]), shapes(layers["sfha"])
+    return lambda: match_contained(lomrs, PolygonIndex(sfhas), buffer=1)
+
+
+def locate_drainages(layers, url):
+    drainages, sfhas = shapes(layers["city_flood"]), shapes(layers["sfha"])
+    return lambda: PolygonIndex(drainages).locate(
+        shapely.point_on_surface(sfhas))
+
+
+def union_dissolve(layers, url):
+    groups = {}
+    for f in layers["sfha"]["features"]:
+        groups.setdefault(f["attributes"]["FLD_ZONE"], []).append(
+            as_shapely(f["geometry"]))
+    return lambda: [union(g) for g in groups.values()]
+
+
+# The same work split into tiles across every core
+
+def parallel_locate(layers, url):
+    drainages, sfhas = shapes(layers["city_flood"]), shapes(layers["sfha"])
+    return lambda: partition.locate(sfhas, drainages)
+
+
+def parallel_dissolve(layers, url):
+    groups = {}
+    for f in layers["sfha"]["features"]:
+        groups.setdefault(f["attributes"]["FLD_ZONE"], []).append(
+            as_shapely(f["geometry"]))
+    return lambda: partition.dissolve(list(groups.values()))
+
+
+def join_lomrs(layers, url):
+    from floodplains.utils import esriapi
+
+    sfha = pd.DataFrame({"SHAPE": [f["geometry"]
+                                   for f in layers["sfha"]["features"]]})
+    lomr = pd.DataFrame([dict(f["attributes"], SHAPE=f["geometry"])
+                         for f in layers["lomr"]["features"]])
+    lomr["EFF_DATE"] = pd.to_datetime(lomr["EFF_DATE"], unit="ms")
+    return lambda: esriapi.join_lomrs(sfha, lomr)
+
+
+def _sfha_sdf(layers, url):
+    """Extracts the SFHAs inside the LOMRs, like Step 4 of the ETL."""
+    import arcgis
+    from floodplains.utils import esriapi
+
+    lomrs = arcgis.features.FeatureSet.from_dict(layers["lomr"])
+    sfha = arcgis.features.FeatureLayer(f"{url}/sfha")
+    subset, _ = esriapi.extract_sfha(sfha, lomrs, "1=1", SFHA_FIELDS, SR)
+    return subset, lomrs
+
+
+def extract_sfha(layers, url):
+    import arcgis
+    from floodplains.utils import esriapi
+
+    lomrs = arcgis.features.FeatureSet.from_dict(layers["lomr"])
+    sfha = arcgis.features.FeatureLayer(f"{url}/sfha")
+    return lambda: esriapi.extract_sfha(sfha, lomrs, "1=1", SFHA_FIELDS, SR)
+
+
+def calc_drainages(layers, url):
+    import arcgis
+    from floodplains.utils import esriapi
+
+    sdf, _ = _sfha_sdf(layers, url)
+    compare = arcgis.features.FeatureSet.from_dict(layers["city_flood"])
+    return lambda: esriapi.calc_drainages(sdf.copy(), compare)
+
+
+def calc_effdate(layers, url):
+    from floodplains.utils import esriapi
+
+    sdf, lomrs = _sfha_sdf(layers, url)
+    return lambda: esriapi.calc_effdate(sdf, lomrs)
+
+
+def dissolve_sdf(layers, url):
+    from floodplains.utils import esriapi
+
+    sdf, lomrs = _sfha_sdf(layers, url)
+    sdf = transform_fields(sdf, lomrs, layers)
+    return lambda: esriapi.dissolve_sdf(sdf, FC_FIELDS)
+
+
+def transform_fields(sdf, lomrs, layers):
+    """Steps 5 to 7 of the ETL, reading city floodplains from the
+    synthetic layer rather than the configured url."""
+    import arcgis
+    from floodplains.utils import esriapi
+
+    compare = arcgis.features.FeatureSet.from_dict(layers["city_flood"])
+    sdf = sdf.copy()
+    esriapi.calc_drainages(sdf, compare)
+    sdf = esriapi.calc_effdate(sdf, lomrs)
+    sdf["INEFFDATE"] = esriapi.calc_ineffdates(sdf)
+    sdf["FLOODWAY"] = esriapi.calc_floodways(sdf)
+    sdf["FLOODZONE"] = esriapi.calc_floodzones(sdf)
+    sdf["SOURCE"] = "FEMA"
+    sdf["REGULATORY"] = 1
+    sdf = sdf[sdf["ZONE_SUBTY"] != "AREA OF MINIMAL FLOOD HAZARD"]
+    return sdf[FC_FIELDS + ["SHAPE"]]
+
+
+def transform(layers, url):
+    from floodplains.utils import esriapi
+
+    sdf, lomrs = _sfha_sdf(layers, url)
+    return lambda: esriapi.dissolve_sdf(
+        transform_fields(sdf, lomrs, layers), FC_FIELDS)
+
+
+CASES = {f.__name__: f for f in [
+    rest_query, index_containment, locate_drainages, union_dissolve,
+    parallel_locate, parallel_dissolve, join_lomrs, extract_sfha,
+    calc_drainages, calc_effdate, dissolve_sdf, transform]}
+
+
+def measure(func, repeat: int) -> float:
+    """Returns the fastest of several calls to a function, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return round(best, 4)
+
+
+def run(scales: list, cases: list, repeat: int = 3) -> dict:
+    """Times every case at every scale.
+
+    Parameters
+    ----------
+    scales : list
+        The numbers of synthetic SFHAs to time each case with
+    cases : list
+        The names of the cases to time
+    repeat : int, optional
+        The number of times each case is run, keeping the fastest,
+        default 3
+
+    Returns
+    -------
+    dict
+        Seconds keyed by "<case>@<scale>", and the reasons any cases
+        were skipped
+    """
+    results, skipped = {}, {}
+    for scale in scales:
+        layers = dataset(scale)
+        with standin.serve(layers) as url:
+            for name in cases:
+                key = f"{name}@{scale}"
+                try:
+                    func = CASES[name](layers, url)
+                except ImportError as e:
+                    skipped[name] = str(e)
+                    continue
+                results[key] = measure(func, repeat)
+                print(f"{key:>28}: {results[key]:.4f}s", flush=True)
+    return {"created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.node(),
+            "results": results,
+            "skipped": skipped}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2,
+            noise: float = 0.005) -> list:
+    """Compares timings to a baseline.
+
+    Parameters
+    ----------
+    baseline : dict
+        A run saved earlier
+    current : dict
+        The run to compare
+    threshold : float, optional
+        The fraction a case may slow down before it's a regression,
+        default 0.2
+    noise : float, optional
+        Seconds a case may slow down by without being a regression,
+        which keeps timer jitter on fast cases out of the report,
+        default 0.005
+
+    Returns
+    -------
+    list
+        (case, baseline seconds, current seconds, ratio, regressed)
+        tuples for every case timed in both runs
+    """
+    rows = []
+    for key, seconds in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        ratio = seconds / base if base else float("inf")
+        regressed = ratio > 1 + threshold and seconds - base > noise
+        rows.append((key, base, seconds, round(ratio, 2), regressed))
+    return rows
+
+
+def report(rows: list) -> str:
+    """Formats a comparison as a plain text table."""
+    lines = [f"{'case':>28} {'baseline':>10} {'current':>10} {'ratio':>6}"]
+    for key, base, seconds, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        lines.append(f"{key:>28} {base:>10.4f} {seconds:>10.4f} "
+                     f"{ratio:>6.2f}{flag}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scales", default="10,1000,10000",
+                        help="comma separated numbers of SFHAs")
+    parser.add_argument("--cases", default=",".join(CASES),
+                        help="comma separated names of cases to time")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="file to save the run to")
+    parser.add_argument("--compare", help="baseline file to compare to")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    current = run([int(s) for s in args.scales.split(",")],
+                  args.cases.split(","), args.repeat)
+    for name, reason in current["skipped"].items():
+        print(f"Skipped {name}: {reason}")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(json.load(f), current, args.threshold)
+        print(report(rows))
+        if any(row[-1] for row in rows):
+            sys.exit(1)
@@ -0,0 +1,214 @@
+import random
+
+from shapely.geometry import box
+
+from floodplains.utils.geometry import as_esri
+
+
+def flood_areas(n: int, size: float = 100, seed: int = 0) -> list:
+    """Creates a square grid of synthetic SFHA polygons.
+
+    Parameters
+    ----------
+    n : int
+        The number of polygons to create
+    size : float, optional
+        The width of each polygon in feet, default 100
+    seed : int, optional
+        Seed for the jitter applied to each polygon, default 0
+
+    Returns
+    -------
+    list
+        A list of shapely polygons
+    """
+    rng = random.Random(seed)
+    width = max(1, int(n ** 0.5))
+    polys = []
+    for i in range(n):
+        x, y = (i % width) * size, (i // width) * size
+        shrink = rng.uniform(0, size / 10)
+        polys.append(box(x + shrink, y + shrink,
+                         x + size - shrink, y + size - shrink))
+    return polys
+
+
+def lomrs(n: int, extent: float, size: float = 1000, seed: int = 0) -> list:
+    """Creates synthetic LOMR polygons scattered across an extent.
+
+    Parameters
+    ----------
+    n : int
+        The number of polygons to create
+    extent : float
+        The width of the square area the polygons are scattered across
+    size : float, optional
+        The width of each polygon in feet, default 1000
+    seed : int, optional
+        Seed for the random placement of each polygon, default 0
+
+    Returns
+    -------
+    list
+        A list of shapely polygons
+    """
+    rng = random.Random(seed)
+    polys = []
+    for _ in range(n):
+        x = rng.uniform(0, max(0, extent - size))
+        y = rng.uniform(0, max(0, extent - size))
+        polys.append(box(x, y, x + size, y + size))
+    return polys
+
+
+def drainages(n: int, extent: float) -> list:
+    """Splits a square extent into vertical strips of synthetic
+    drainage polygons.
+
+    Parameters
+    ----------
+    n : int
+        The number of drainages to create
+    extent : float
+        The width of the square area covered by the drainages
+
+    Returns
+    -------
+    list
+        A list of shapely polygons
+    """
+    width = extent / n
+    return [box(i * width, 0, (i + 1) * width, extent) for i in range(n)]
+
+
+def city_limits(extent: float, parts: int = 4) -> list:
+    """Splits a square extent into rows of synthetic city limit
+    polygons, which dissolve back into the whole extent.
+
+    Parameters
+    ----------
+    extent : float
+        The width of the square area covered by the city
+    parts : int, optional
+        The number of polygons to create, default 4
+
+    Returns
+    -------
+    list
+        A list of shapely polygons
+    """
+    height = extent / parts
+    return [box(0, i * height, extent, (i + 1) * height)
+            for i in range(parts)]
+
+
+def _features(shapes, attributes, sr: int = 2876) -> dict:
+    """Combines shapely polygons and attribute dicts into an ESRI JSON
+    FeatureSet with sequential objectIds."""
+    features = []
+    for oid, (shape, attrs) in enumerate(zip(shapes, attributes), start=1):
+        esri = as_esri(shape, sr)
+        features.append({"attributes": {"OBJECTID": oid, **attrs},
+                         "geometry": {"rings": esri["rings"]}})
+    return {"objectIdFieldName": "OBJECTID",
+            "geometryType": "esriGeometryPolygon",
+            "spatialReference": {"wkid": sr},
+            "features": features}
+
+
+def sfha_layer(n: int, seed: int = 0) -> dict:
+    """Creates a FeatureSet of synthetic SFHAs with the attributes read
+    from FEMA's NFHL, where about one in ten FLD_AR_IDs repeats.
+
+    Parameters
+    ----------
+    n : int
+        The number of features to create
+    seed : int, optional
+        Seed for the geometries and attributes, default 0
+
+    Returns
+    -------
+    dict
+        An ESRI JSON FeatureSet
+    """
+    rng = random.Random(seed)
+    attributes = []
+    for i in range(n):
+        zone = rng.choice(["AE", "AE", "AO", "AH", "X", "A"])
+        subtype = rng.choice([None, "FLOODWAY",
+                              "AREA OF MINIMAL FLOOD HAZARD"])
+        attributes.append({
+            "FLD_AR_ID": f"08013C_{i - i % 10 if i % 10 == 9 else i}",
+            "DFIRM_ID": "08013C",
+            "STUDY_TYP": "NP",
+            "FLD_ZONE": zone,
+            "ZONE_SUBTY": subtype,
+            "SFHA_TF": "F" if zone == "X" else "T",
+            "STATIC_BFE": round(rng.uniform(5200, 5400), 1)
+            if zone == "AH" else -9999.0,
+            "DEPTH": float(rng.randint(1, 3)) if zone == "AO" else -9999.0})
+    return _features(flood_areas(n, seed=seed), attributes)
+
+
+def lomr_layer(n: int, extent: float, seed: int = 0) -> dict:
+    """Creates a FeatureSet of synthetic effective LOMRs.
+
+    Parameters
+    ----------
+    n : int
+        The number of features to create
+    extent : float
+        The width of the square area the LOMRs are scattered across
+    seed : int, optional
+        Seed for the geometries and dates, default 0
+
+    Returns
+    -------
+    dict
+        An ESRI JSON FeatureSet
+    """
+    rng = random.Random(seed)
+    # Effective dates between 2017 and 2023, in epoch milliseconds
+    attributes = [{"CASE_NO": f"20-08-{i:04d}P", "STATUS": "Effective",
+                   "EFF_DATE": rng.randint(15 * 10**11, 17 * 10**11)}
+                  for i in range(n)]
+    return _features(lomrs(n, extent, seed=seed), attributes)
+
+
+def drainage_layer(n: int, extent: float) -> dict:
+    """Creates a FeatureSet of synthetic effective city floodplains,
+    one per drainage.
+
+    Parameters
+    ----------
+    n : int
+        The number of drainages to create
+    extent : float
+        The width of the square area covered by the drainages
+
+    Returns
+    -------
+    dict
+        An ESRI JSON FeatureSet
+    """
+    attributes = [{"DRAINAGE": f"Creek {i}", "INEFFDATE": None,
+                   "CREATED_DATE": 16 * 10**11} for i in range(n)]
+    return _features(drainages(n, extent), attributes)
+
+
+def city_layer(extent: float) -> dict:
+    """Creates a FeatureSet of synthetic city limits.
+
+    Parameters
+    ----------
+    extent : float
+        The width of the square area covered by the city
+
+    Returns
+    -------
+    dict
+        An ESRI JSON FeatureSet
+    """
+    shapes = city_limits(extent)
+    return _features(shapes, [{"TYPE": "City"} for _ in shapes])
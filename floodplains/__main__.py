@@ -1,50 +1,97 @@
-import requests
+import argparse
 
 import floodplains.config as config
-import floodplains.etl as etl
+import floodplains.utils.checkpoint as checkpoint
 import floodplains.utils.email as email
-from floodplains.utils.managedb import remove_version
+import floodplains.utils.metrics as metrics
+import floodplains.utils.preflight as preflight
 from floodplains.utils.managedisk import list_files
 
 # Initiate a logger for __main__
 log = config.logging.getLogger(__name__)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="floodplains")
+    parser.add_argument("--resume", action="store_true",
+                        help="restart the last unfinished run from its last "
+                             "completed stage")
+    args = parser.parse_args()
+    config.load()
+
+    run_id = None
+    if args.resume:
+        run_id = checkpoint.Checkpoints.latest(config.checkpoints)
+        if run_id is None:
+            log.info("No unfinished run to resume, starting a new one.")
+    checkpoints = checkpoint.Checkpoints(config.checkpoints, run_id)
+    run = metrics.start_run(checkpoints.run_id)
+    # Every email in the run shares one connection, opened when needed
+    mailer = email.Mailer(config.sender, config.password)
     try:
         log.info("Testing REST Endpoints.")
-        offline = list(filter(lambda u: requests.get(
-            u, {"f": "pjson"}).status_code != 200, list(config.urls.values())))
+        session = preflight.create_session()
+        with metrics.stage("step00_preflight"):
+            report = preflight.check_endpoints(config.urls.values(),
+                                               session, config.timeout)
+        for line in preflight.describe(report):
+            log.info(line)
+        offline = [r for r in report if not r["online"]]
         if not offline:
-            log.info("Removing old edit version.")
-            remove_version(config.edit_conn, config.version_name)
+            # Imported here so runs that stop early never load arcgis
+            import floodplains.etl as etl
             log.info("Initiating extraction.")
-            new_sfhas, new_lomrs = etl.extract()
+            new_sfhas, new_lomrs = etl.extract(session, checkpoints)
             if new_sfhas is not None:
+                # Keep the version when resuming after its edits were made.
+                # Otherwise it's safe to replace, as LOMRs whose edits were
+                # never posted are extracted again, see last_checked_date
+                if not checkpoints.completed("load"):
+                    from floodplains.utils.managedb import remove_version
+                    log.info("Removing old edit version.")
+                    remove_version(config.edit_conn, config.version_name)
                 log.info("Initiating transformation.")
-                transformed = etl.transform(new_sfhas, new_lomrs)
+                transformed = etl.transform(new_sfhas, new_lomrs, session,
+                                            checkpoints)
+                # The city floodplains already include the edits when
+                # resuming after them, so there's nothing to compare
+                changes = store = None
+                if not checkpoints.completed("load"):
+                    log.info("Detecting changes to city floodplains.")
+                    store = etl.edit_store()
+                    changes = etl.detect_changes(transformed, new_lomrs,
+                                                 store)
                 log.info("Initiating load.")
-                email_table = etl.load(transformed, new_lomrs)
+                email_table = etl.load(transformed, new_lomrs, checkpoints,
+                                       changes, store)
                 log.info("Notifying folks of changes.")
-                etl.notify(email_table)
+                etl.notify(email_table, mailer)
+                etl.record_checked()
+                checkpoints.finish()
             else:
                 log.info("No changes were made in Boulder.")
                 body = email.email_body(
                     ("No changes have been made to floodplains in Boulder "
                      "since the GISSCR user last edited floodplains in "
                      "GISPROD3."))
-                email.send_email(sender=config.sender,
-                                 password=config.password,
-                                 recipients=config.steward,
-                                 body=body)
+                mailer.queue(config.steward, body)
+                mailer.send_all()
+                checkpoints.finish()
         else:
-            log.error("Offline URLs: " + ", ".join(u for u in offline))
+            described = preflight.describe(offline)
+            log.error("Offline URLs: " + ", ".join(described))
             body = email.email_body("The following URLs are offline:<br><br>" +
-                                    ", ".join(u for u in offline) +
+                                    "<br>".join(described) +
                                     "<br><br>Try again later.")
-            email.send_email(sender=config.sender, password=config.password,
-                             recipients=config.steward, body=body)
+            mailer.queue(config.steward, body)
+            mailer.send_all()
     except Exception:
         log.exception("Something prevented the script from running.")
     finally:
+        mailer.close()
         list_files(['.sde'], delete=True)
+        run.write_json(config.metrics_json)
+        run.write_prometheus(config.metrics_prom)
+        for s in run.stages:
+            log.info(f"{s['stage']}: {s['seconds']}s, {s['requests']} "
+                     f"requests, {s['bytes']} bytes")
         log.info("Process finished!")
@@ -4,7 +4,8 @@ import logging.handlers
 import os
 
 import yaml
-from cryptography.fernet import Fernet
+
+import floodplains.utils.logqueue as logqueue
 
 
 def decrypt(key: str, token: str):
@@ -23,59 +24,114 @@ def decrypt(key: str, token: str):
         Decrypted plain text
     """
 
+    from cryptography.fernet import Fernet
+
     f = Fernet(key)
     decrypted = f.decrypt(bytes(token, 'utf-8'))
 
     return decrypted.decode("utf-8")
 
 
-with open(f".{os.sep}floodplains{os.sep}credentials.yaml") as cred_file:
-    creds = yaml.safe_load(cred_file.read())
-
-with open(f".{os.sep}floodplains{os.sep}config.yaml") as config_file:
-    config = yaml.safe_load(config_file.read())
-    config['LOGGING']['handlers']['email']['credentials'] = [
-        creds['EMAIL']['address'],
-        creds['EMAIL']['password']]
-    logging.config.dictConfig(config['LOGGING'])
-
-# ESRI properties
-esri = config["ESRI"]
-esri_folder = os.path.abspath(esri["root"])
-# Pro project location
-aprx_location = os.path.join(esri_folder, esri["aprx_name"])
-
-# Data properties
-urls = config["DATA"]["urls"]
-sde = config["DATA"]["sde"]
-sr = sde["spatialref"]
-fc_name = sde["feature"]["name"]
-fc_fields = sde["feature"]["fields"]
-
-# Database properties
-database = config["DATABASE"]
-# Connections
-read_conn = database["connections"]["read"]
-edit_conn = database["connections"]["edit"]
-
-# Version properties
-version_params = config["VERSIONING"]
-version_name = version_params["version_name"]
-version_params["in_workspace"] = edit_conn
-# Versioned SDE Connection
-db_params = database["info"]
-db_creds = creds["DATABASE"]
-edit_user = db_params["username"].upper()
-db_params["version"] = f"{edit_user}.{version_name}"
-db_params["password"] = decrypt(db_creds["key"], db_creds["token"])
-db_params["out_folder_path"] = esri_folder
-db_params["out_name"] = db_params["version"] + ".sde"
-
-# Email credentials
-sender = creds["EMAIL"]["address"]
-password = creds["EMAIL"]["password"]
-# Email recipient config dict
-recipients = config["EMAIL"]
-# Different lists
-notification = recipients["lomr-notification"]
-steward = recipients["data-steward"]
+_loaded = False
+
+# The settings read from the config and credential files by load
+SETTINGS = ("esri_folder", "aprx_location", "urls", "timeout", "store",
+            "use_mirror", "filter_tolerance", "checkpoints", "workers",
+            "join_predicate", "sr", "fc_name", "fc_fields", "read_conn",
+            "edit_conn", "version_params", "version_name", "edit_user",
+            "db_params", "sender", "password", "notification", "steward",
+            "metrics_json", "metrics_prom")
+
+
+def load() -> None:
+    """Reads the config and credential files and configures logging.
+
+    Settings are read the first time one of them is used, so importing
+    this module is free. Call this first to configure logging before
+    anything is logged.
+    """
+    global _loaded
+    if _loaded:
+        return
+
+    with open(f".{os.sep}floodplains{os.sep}credentials.yaml") as cred_file:
+        creds = yaml.safe_load(cred_file.read())
+
+    with open(f".{os.sep}floodplains{os.sep}config.yaml") as config_file:
+        config = yaml.safe_load(config_file.read())
+        config['LOGGING']['handlers']['email']['credentials'] = [
+            creds['EMAIL']['address'],
+            creds['EMAIL']['password']]
+        logging.config.dictConfig(config['LOGGING'])
+        logqueue.start()
+
+    esri = config["ESRI"]
+    data = config["DATA"]
+    sde = data["sde"]
+    database = config["DATABASE"]
+    esri_folder = os.path.abspath(esri["root"])
+    edit_conn = database["connections"]["edit"]
+
+    # Version properties
+    version_params = config["VERSIONING"]
+    version_name = version_params["version_name"]
+    version_params["in_workspace"] = edit_conn
+    # Versioned SDE Connection, which gets its password the first time
+    # db_params is read
+    db_info = database["info"]
+    edit_user = db_info["username"].upper()
+    db_info["version"] = f"{edit_user}.{version_name}"
+    db_info["out_folder_path"] = esri_folder
+    db_info["out_name"] = db_info["version"] + ".sde"
+
+    recipients = config["EMAIL"]
+    globals().update({
+        # ESRI properties
+        "esri_folder": esri_folder,
+        # Pro project location
+        "aprx_location": os.path.join(esri_folder, esri["aprx_name"]),
+        # Data properties
+        "urls": data["urls"],
+        "timeout": data["timeout"],
+        "store": data["store"],
+        "use_mirror": data["mirror"],
+        "filter_tolerance": data["filter_tolerance"],
+        "checkpoints": data["checkpoints"],
+        "workers": data["workers"] or 1,
+        "join_predicate": data["join_predicate"],
+        "sr": sde["spatialref"],
+        "fc_name": sde["feature"]["name"],
+        "fc_fields": sde["feature"]["fields"],
+        # Connections
+        "read_conn": database["connections"]["read"],
+        "edit_conn": edit_conn,
+        "version_params": version_params,
+        "version_name": version_name,
+        "edit_user": edit_user,
+        "_db_info": db_info,
+        "_db_creds": creds["DATABASE"],
+        # Email credentials and recipient lists
+        "sender": creds["EMAIL"]["address"],
+        "password": creds["EMAIL"]["password"],
+        "notification": recipients["lomr-notification"],
+        "steward": recipients["data-steward"],
+        # Metrics outputs
+        "metrics_json": config["METRICS"]["json"],
+        "metrics_prom": config["METRICS"]["prometheus"]})
+    _loaded = True
+
+
+def __getattr__(name: str):
+    """Loads the settings the first time one is read. The database
+    password is only decrypted when a database connection needs it."""
+    if name not in SETTINGS:
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}")
+    load()
+    settings = globals()
+    if name == "db_params":
+        creds = settings["_db_creds"]
+        settings["_db_info"]["password"] = decrypt(creds["key"],
+                                                   creds["token"])
+        settings["db_params"] = settings["_db_info"]
+    return settings[name]
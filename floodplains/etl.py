@@ -1,18 +1,44 @@
 from datetime import datetime
 
-import arcgis
-
 import floodplains.config as config
+import floodplains.utils.checkpoint as checkpoint
 import floodplains.utils.editdb as edit
+import floodplains.utils.editplan as editplan
 import floodplains.utils.email as email
 import floodplains.utils.esriapi as api
+import floodplains.utils.geometry as geometry
 import floodplains.utils.managedb as db
+import floodplains.utils.metrics as metrics
+import floodplains.utils.mirror as mirror
+import floodplains.utils.restquery as restquery
+from floodplains.utils.lazy import lazy_import
+
+# Only imported once there are new LOMRs to process
+arcgis = lazy_import("arcgis")
 
 # Initiate a logger for etl
 log = config.logging.getLogger(__name__)
 
+# The city floodplains that new delineations can replace
+EFFECTIVE = ("INEFFDATE IS NULL AND "
+             "(FLOODZONE LIKE 'A%' OR FLOODZONE = 'X')")
+
+
+def _as_sdf(df):
+    """Turns a dataframe read from a checkpoint back into a spatial
+    dataframe."""
+    df["SHAPE"] = [arcgis.geometry.Geometry(g) for g in df["SHAPE"]]
+    df.spatial.set_geometry("SHAPE")
+    return df
 
-def extract():
+
+def _lomr_key(lomr_fs) -> list:
+    """Describes a set of LOMRs for a checkpoint key."""
+    return sorted((f.attributes["CASE_NO"], f.attributes["EFF_DATE"])
+                  for f in lomr_fs.features)
+
+
+def extract(session=None, checkpoints=None):
     """The main function used to extract new SFHAs from FEMA's REST
     Endpoint.
 
@@ -22,38 +48,112 @@ def extract():
     the function returns a spatial dataframe of all the SFHA
     delineations that were inside those new LOMRs. If no new LOMRs are
     found, than nothing is returned.
+
+    Parameters
+    ----------
+    session : requests.Session, optional
+        The session used to make every request, default None
+    checkpoints : floodplains.utils.checkpoint.Checkpoints, optional
+        Where the extracted features are saved, and loaded from when
+        resuming a run, default None
     """
     # Step 1: Identify relevant feature services
-    city = arcgis.features.FeatureLayer(config.urls["city"])
-    nfhl = arcgis.features.FeatureLayerCollection(config.urls["nfhl"])
-    lomr = list(filter(lambda x: x.url.endswith('1'),  nfhl.layers))[0]
-    sfha = list(filter(lambda x: x.url.endswith('28'),  nfhl.layers))[0]
-
-    # Step 2: Create spatial filter object for city limits
-    log.info("Creating spatial filter of city limits.")
-    geom_filter = api.create_spatial_filter(city, config.sr, "TYPE = 'City'")
-
-    # Step 3: Extract LOMRs based on spatial filters and SQL query
-    log.info("Querying the LOMR feature service.")
-    city_flood = arcgis.features.FeatureLayer(config.urls["city_flood"])
-    last_date = api.last_checked_date(city_flood)
-    where = f"STATUS = 'Effective' AND EFF_DATE > '{last_date}'"
-    boulder_lomrs = api.query_lomr(lomr, where, geom_filter, config.sr)
-
-    # Step 4: If there are "more than zero" new LOMRs, continue ETL process
-    if len(boulder_lomrs.features) > 0:
+    with metrics.stage("step01_services"):
+        city_url = config.urls["city"]
+        lomr_url = f"{config.urls['nfhl']}/1"
+        sfha_url = f"{config.urls['nfhl']}/28"
+
+    store = mirror.connect(config.store)
+    try:
+        # The run being resumed extracted from the same sources. The
+        # cutoff isn't part of the key, as it may have moved since
+        key = checkpoint.digest(config.urls, config.filter_tolerance)
+        saved = checkpoints and checkpoints.load("extract", key)
+        if saved:
+            log.info("Resuming with the extracted SFHAs and LOMRs.")
+            return (_as_sdf(saved["sfha"]),
+                    arcgis.features.FeatureSet.from_dict(saved["lomr"]))
+
+        # Step 2: Create spatial filter object for city limits
+        log.info("Creating spatial filter of city limits.")
+        with metrics.stage("step02_spatial_filter"):
+            geom_filter = api.create_spatial_filter(
+                city_url, config.sr, "TYPE = 'City'", session=session,
+                store=store, tolerance=config.filter_tolerance)
+
+        # Step 3: Extract LOMRs based on spatial filters and SQL query
+        log.info("Querying the LOMR feature service.")
+        with metrics.stage("step03_lomrs") as stage:
+            last_date = api.last_checked_date(config.urls["city_flood"],
+                                              store, session)
+            if config.use_mirror:
+                log.info("Syncing LOMRs in the local NFHL mirror.")
+                synced = mirror.sync_layer(store, "lomr", lomr_url,
+                                           date_field="EFF_DATE",
+                                           where="STATUS = 'Effective'",
+                                           geometry_filter=geom_filter,
+                                           out_sr=config.sr,
+                                           datum_transformation=1478,
+                                           session=session)
+                log.info(f"LOMR mirror sync: {synced}")
+                after = datetime.strptime(last_date, "%Y-%m-%d").timestamp()
+                lomrs = mirror.read_layer(store, "lomr", after=after * 1000)
+            else:
+                where = ("STATUS = 'Effective' AND "
+                         f"EFF_DATE > '{last_date}'")
+                lomrs = restquery.query(lomr_url, where=where,
+                                        geometry_filter=geom_filter,
+                                        out_sr=config.sr,
+                                        datum_transformation=1478,
+                                        session=session)
+            stage["features_out"] = len(lomrs["features"])
+
+        # Step 4: If there are "more than zero" new LOMRs, continue ETL
+        if len(lomrs["features"]) == 0:
+            return None, None
+        boulder_lomrs = api.drop_duplicate_lomrs(
+            arcgis.features.FeatureSet.from_dict(lomrs))
+
         log.info("Extracting SFHAs.")
-        where = ("DFIRM_ID = '08013C'")
-        fields = ['FLD_AR_ID', 'STUDY_TYP', 'FLD_ZONE',
-                  'ZONE_SUBTY', 'SFHA_TF', 'STATIC_BFE', 'DEPTH']
-        fema_flood, summary = api.extract_sfha(
-            sfha, boulder_lomrs, where, fields, config.sr)
+        with metrics.stage("step04_sfhas") as stage:
+            where = ("DFIRM_ID = '08013C'")
+            fields = ['FLD_AR_ID', 'STUDY_TYP', 'FLD_ZONE',
+                      'ZONE_SUBTY', 'SFHA_TF', 'STATIC_BFE', 'DEPTH']
+            features = None
+            if config.use_mirror:
+                # SFHAs have no edit date, so the ones around the LOMRs
+                # are always downloaded again in case FEMA revised them
+                log.info("Syncing SFHAs in the local NFHL mirror.")
+                area = geometry.bounding_area(
+                    [geometry.as_shapely(f.geometry)
+                     for f in boulder_lomrs.features], buffer=1)
+                refresh = restquery.intersects(
+                    geometry.as_esri(area, config.sr), config.sr)
+                synced = mirror.sync_layer(store, "sfha", sfha_url,
+                                           where=where,
+                                           out_fields=["OBJECTID"] + fields,
+                                           out_sr=config.sr,
+                                           datum_transformation=1478,
+                                           refresh=refresh,
+                                           session=session)
+                log.info(f"SFHA mirror sync: {synced}")
+                features = arcgis.features.FeatureSet.from_dict(
+                    mirror.read_layer(store, "sfha", bbox=area.bounds))
+                stage["features_in"] = len(features.features)
+            sfha = arcgis.features.FeatureLayer(sfha_url)
+            fema_flood, summary = api.extract_sfha(
+                sfha, boulder_lomrs, where, fields, config.sr,
+                features=features, session=session, workers=config.workers)
+            stage["features_out"] = len(fema_flood)
+        if checkpoints:
+            checkpoints.save("extract", key, sfha=fema_flood,
+                             lomr=boulder_lomrs.to_dict())
         return fema_flood, boulder_lomrs
-    else:
-        return None, None
+    finally:
+        store.close()
 
 
-def transform(sfha_sdf, lomr_fs):
+def transform(sfha_sdf, lomr_fs, session=None, checkpoints=None):
     """Transforms SFHA delineations to meet City of Boulder standards.
 
     All transformations are done to the DataFrame in-place.
@@ -64,55 +164,135 @@ def transform(sfha_sdf, lomr_fs):
         Boulder's new special flood hazard areas
     lomr_fs : arcgis.features.FeatureSet
         Boulder's new LOMR areas
+    session : requests.Session, optional
+        The session used to make every request, default None
+    checkpoints : floodplains.utils.checkpoint.Checkpoints, optional
+        Where the dissolved features are saved, and loaded from when
+        resuming a run, default None
     """
+    if checkpoints:
+        key = checkpoint.digest(checkpoint.frame_digest(sfha_sdf),
+                                _lomr_key(lomr_fs))
+        saved = checkpoints.load("transform", key)
+        if saved:
+            log.info("Resuming with the transformed SFHAs.")
+            return _as_sdf(saved["dissolved"])
+
     # Step 5: Query the city's floodplain feature service
-    city_flood = arcgis.features.FeatureLayer(config.urls["city_flood"])
-    compare = city_flood.query(where="INEFFDATE IS NULL",
-                               out_fields=['DRAINAGE'],
-                               out_sr=config.sr)
+    with metrics.stage("step05_city_floodplains") as stage:
+        city_flood = arcgis.features.FeatureLayer(config.urls["city_flood"])
+        compare = api.query_layer(city_flood,
+                                  where="INEFFDATE IS NULL",
+                                  out_fields=['DRAINAGE'],
+                                  out_sr=config.sr,
+                                  session=session)
+        stage["features_out"] = len(compare.features)
 
     # Step 6: Calculate all fields
-    log.info("Calculating DRAINAGE.")
-    api.calc_drainages(sfha_sdf, compare, config.sr)
+    with metrics.stage("step06_calculate") as stage:
+        stage["features_in"] = len(sfha_sdf)
+        log.info("Calculating DRAINAGE.")
+        api.calc_drainages(sfha_sdf, compare, config.workers)
 
-    log.info("Calculating EFFDATE.")
-    sfha_sdf = api.calc_effdate(sfha_sdf, lomr_fs)
+        log.info("Calculating EFFDATE.")
+        sfha_sdf = api.calc_effdate(sfha_sdf, lomr_fs, config.join_predicate)
 
-    log.info("Calculating INEFFDATE.")
-    dups = list(sfha_sdf[sfha_sdf.duplicated(["FLD_AR_ID"])]["FLD_AR_ID"])
-    dup_dates = {i: sorted(
-        list(sfha_sdf[sfha_sdf["FLD_AR_ID"] == i]["ADOPTDATE"])) for i in dups}
-    sfha_sdf["INEFFDATE"] = sfha_sdf.apply(
-        api.calc_ineffdate, date_dict=dup_dates, axis=1)
+        log.info("Calculating INEFFDATE.")
+        sfha_sdf["INEFFDATE"] = api.calc_ineffdates(sfha_sdf)
 
-    log.info("Calculating FLOODWAY.")
-    sfha_sdf["FLOODWAY"] = sfha_sdf.apply(api.calc_floodway, axis=1)
+        log.info("Calculating FLOODWAY.")
+        sfha_sdf["FLOODWAY"] = api.calc_floodways(sfha_sdf)
 
-    log.info("Calculating FLOODZONE.")
-    sfha_sdf["FLOODZONE"] = sfha_sdf.apply(api.calc_floodzone, axis=1)
+        log.info("Calculating FLOODZONE.")
+        sfha_sdf["FLOODZONE"] = api.calc_floodzones(sfha_sdf)
 
-    log.info("Calculating SOURCE.")
-    sfha_sdf["SOURCE"] = "FEMA"
+        log.info("Calculating SOURCE.")
+        sfha_sdf["SOURCE"] = "FEMA"
 
-    log.info("Calculating REGULATORY.")
-    sfha_sdf["REGULATORY"] = 1
+        log.info("Calculating REGULATORY.")
+        sfha_sdf["REGULATORY"] = 1
+        stage["features_out"] = len(sfha_sdf)
 
     # Step 7: Drop all non-essential fields and rows
     log.info("Dissolving SHAPE.")
-    essential = ["SHAPE" if f == "SHAPE@" else f for f in config.fc_fields]
-    sfha_sdf = sfha_sdf[sfha_sdf["ZONE_SUBTY"]
-                        != "AREA OF MINIMAL FLOOD HAZARD"]
-    sfha_sdf = sfha_sdf[essential]
+    with metrics.stage("step07_select") as stage:
+        stage["features_in"] = len(sfha_sdf)
+        essential = ["SHAPE" if f == "SHAPE@" else f
+                     for f in config.fc_fields]
+        sfha_sdf = sfha_sdf[sfha_sdf["ZONE_SUBTY"]
+                            != "AREA OF MINIMAL FLOOD HAZARD"]
+        sfha_sdf = sfha_sdf[essential]
+        stage["features_out"] = len(sfha_sdf)
 
     # Step 8: Dissolve the polygons based on the fields in the PROD3 fc
     # Do not include SHAPE field because it's implicitly used in the
     # dissolve function
-    dissolved = api.dissolve_sdf(sfha_sdf, config.fc_fields[:-1])
-
+    with metrics.stage("step08_dissolve") as stage:
+        stage["features_in"] = len(sfha_sdf)
+        dissolved = api.dissolve_sdf(sfha_sdf, config.fc_fields[:-1],
+                                     config.workers)
+        stage["features_out"] = len(dissolved)
+
+    if checkpoints:
+        checkpoints.save("transform", key, dissolved=dissolved)
     return dissolved
 
 
-def load(sfha_sdf, lomr_fs):
+def edit_store():
+    """Creates a new versioned connection for city floodplains, and the
+    store that reads and edits them through it.
+
+    Returns
+    -------
+    floodplains.utils.editdb.SdeStore
+        The city floodplain feature class in the edit version
+    """
+    with metrics.stage("step09_version"):
+        edit_connect = db.create_versioned_connection(
+            config.version_params, config.db_params)
+    return edit.SdeStore(edit_connect, config.fc_name, config.sr)
+
+
+def detect_changes(sfha_sdf, lomr_fs, store):
+    """Compares the transformed SFHAs with the effective city
+    floodplains around the LOMRs, so that delineations the city already
+    has aren't cut and inserted again.
+
+    The city floodplains are read from the same store that is edited,
+    so the ObjectIDs of the polygons to keep are those of the edit
+    version.
+
+    Parameters
+    ----------
+    sfha_sdf : Pandas DataFrame
+        Transformed special flood hazard areas
+    lomr_fs : arcgis.features.FeatureSet
+        Boulder's LOMR areas
+    store : floodplains.utils.editplan.EditStore
+        The city floodplains to compare with, e.g. from edit_store
+
+    Returns
+    -------
+    floodplains.utils.editplan.ChangeSet
+        The SFHAs that matched and the city floodplains to keep
+    """
+    # Step 10: Match the SFHAs to the city floodplains they'd replace
+    with metrics.stage("step10_changes") as stage:
+        fields = config.fc_fields
+        stage["features_in"] = len(sfha_sdf)
+        area = geometry.bounding_area(
+            [geometry.as_shapely(f.geometry) for f in lomr_fs.features])
+        changes = editplan.detect_changes(
+            store.read(fields, EFFECTIVE, area),
+            edit.sdf_to_rows(sfha_sdf, fields), fields)
+        stage["features_out"] = len(changes)
+    log.info(f"{len(changes.unchanged)} SFHAs are unchanged, "
+             f"{len(changes.updates)} have new attributes and "
+             f"{changes.rows - len(changes.matched)} are new.")
+    return changes
+
+
+def load(sfha_sdf, lomr_fs, checkpoints=None, changes=None, store=None):
     """Loads the transformed SFHAs into the city's dataset.
 
     Parameters
@@ -121,39 +301,81 @@ def load(sfha_sdf, lomr_fs):
         Transformed special flood hazard areas
     lomr_fs : arcgis.features.FeatureSet
         Boulder's LOMR areas
+    checkpoints : floodplains.utils.checkpoint.Checkpoints, optional
+        Where the email table is saved once edits are made, so a resumed
+        run doesn't edit again, default None
+    changes : floodplains.utils.editplan.ChangeSet, optional
+        The result of detect_changes, so only its inserts are loaded and
+        the city floodplains it keeps aren't edited, default None
+    store : floodplains.utils.editplan.EditStore, optional
+        The store changes were detected in, defaults to a new edit
+        version from edit_store
     """
-    # Step 8: Create a new versioned connection for city floodplains
-    edit_connect = db.create_versioned_connection(
-        config.version_params, config.db_params)
-
-    # Step 9: Convert dataframe to list of dicts for use in cursors
-    records = edit.sdf_to_dict(sfha_sdf)
-
-    # Step 10: For every lomr, perform edits to city floodplains
-    where = "INEFFDATE IS NULL AND (FLOODZONE LIKE 'A%' OR FLOODZONE = 'X')"
-    email_info = []
-    for lomr in lomr_fs.features:
-        # Summarize the LOMR for an email
-        lomr_id = lomr.attributes["CASE_NO"]
-        ts = lomr.attributes["EFF_DATE"]/1000
-        lomr_date = datetime.fromtimestamp(ts).strftime("%m/%d/%Y")
-        email_info.append({"FEMA ID": lomr_id, "Valid After": lomr_date})
-        # Perform the edits
-        log.info(f"Making edits for {lomr_id}.")
-        edit.perform_edits(workspace=edit_connect,
-                           fc=config.fc_name,
-                           fields=config.fc_fields,
-                           where_clause=where,
-                           lomr_layer=lomr,
-                           records=records)
+    if checkpoints:
+        key = checkpoint.digest(checkpoint.frame_digest(sfha_sdf),
+                                _lomr_key(lomr_fs))
+        saved = checkpoints.load("load", key)
+        if saved:
+            log.info("Resuming after edits were already made.")
+            return saved["table"]
+
+    # Step 9: Create a new versioned connection for city floodplains,
+    # unless changes were already detected in one
+    if store is None:
+        store = edit_store()
+
+    # Step 11: Convert dataframe to rows for use in cursors, which are
+    # produced lazily while the edits are made. Only rows the city
+    # doesn't already have are loaded once changes have been detected
+    with metrics.stage("step11_rows"):
+        records = edit.sdf_to_rows(sfha_sdf, config.fc_fields)
+        if changes is not None:
+            records = changes.inserts(records)
+
+    # Step 12: Perform the edits for every lomr to city floodplains at once
+    with metrics.stage("step12_edits") as stage:
+        email_info = []
+        lomrs = []
+        for lomr in lomr_fs.features:
+            # Summarize the LOMR for an email
+            lomr_id = lomr.attributes["CASE_NO"]
+            lomr_date = datetime.fromtimestamp(
+                lomr.attributes["EFF_DATE"]/1000)
+            email_info.append({"FEMA ID": lomr_id,
+                               "Valid After": lomr_date.strftime("%m/%d/%Y")})
+            lomrs.append((geometry.as_shapely(lomr.geometry), lomr_date))
+
+        cases = ", ".join(i["FEMA ID"] for i in email_info)
+        log.info(f"Making edits for {cases}.")
+        stage["features_in"] = len(sfha_sdf)
+        plan = edit.perform_edits(store=store,
+                                  fields=config.fc_fields,
+                                  where_clause=EFFECTIVE,
+                                  lomrs=lomrs,
+                                  records=records,
+                                  changes=changes)
+        stage["features_out"] = len(plan)
 
     # Create the HTML table for the email body
     email_table = email.create_html_table(email_info)
+    if checkpoints:
+        checkpoints.save("load", key, table=email_table)
     return email_table
 
 
-def notify(table: str):
-    # Step 11: Notify steward of new version edits
+def record_checked() -> None:
+    """Records the cutoff for the next run's LOMR query, once the edits
+    have been made and everyone has been notified."""
+    store = mirror.connect(config.store)
+    try:
+        api.record_checked_date(store)
+    finally:
+        store.close()
+
+
+@metrics.timed("step13_14_notify")
+def notify(table: str, mailer: email.Mailer):
+    # Step 13: Notify steward of new version edits
     body = email.email_body(("New effective LOMRs exist within Boulder city "
                              "limits. QC the GISSCR.UTIL_FloodplainEdits "
                              "version by verifying that: <ul>"
@@ -166,12 +388,9 @@ def notify(table: str):
                              "attributes</li>"
                              "<li>Drainage designations make sense for new "
                              "polygons</li></ul>"))
-    email.send_email(sender=config.sender,
-                     password=config.password,
-                     recipients=config.steward,
-                     body=body)
+    mailer.queue(config.steward, body)
 
-    # Step 12: Notify SMEs that edits are pending and new LOMRs are available
+    # Step 14: Notify SMEs that edits are pending and new LOMRs are available
     insert = ("New effective LOMRs exist within Boulder's city limits. "
               "Edits are not yet incorporated into the city's data, but "
               "your friendly GIS folks have just received a notification "
@@ -181,7 +400,5 @@ def notify(table: str):
               "was run: <br>")
     insert += table
     body = email.email_body(insert)
-    email.send_email(sender=config.sender,
-                     password=config.password,
-                     recipients=config.notification,
-                     body=body)
+    mailer.queue(config.notification, body)
+    mailer.send_all()
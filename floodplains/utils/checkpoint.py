@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import shapely
+
+import floodplains.config as config
+from floodplains.utils.geometry import (as_esri, as_shapely, fingerprints,
+                                        spatial_reference)
+
+log = config.logging.getLogger(__name__)
+
+
+def digest(*parts) -> str:
+    """Hashes JSON serializable values into a short key.
+
+    Parameters
+    ----------
+    parts : any
+        The values describing the inputs of a stage
+
+    Returns
+    -------
+    str
+        A hex digest of the values
+    """
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def frame_digest(df: pd.DataFrame, geometry: str = "SHAPE") -> str:
+    """Hashes the contents of a spatial dataframe, using geometry
+    fingerprints so the key doesn't depend on vertex order.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The dataframe to hash
+    geometry : str, optional
+        The name of the geometry column, default "SHAPE"
+
+    Returns
+    -------
+    str
+        A hex digest of the dataframe
+    """
+    attrs = df.drop(columns=[geometry])
+    h = hashlib.blake2b(digest_size=16)
+    h.update(",".join(map(str, attrs.columns)).encode())
+    h.update(pd.util.hash_pandas_object(attrs).to_numpy().tobytes())
+    prints = fingerprints(as_shapely(g) for g in df[geometry])
+    h.update("".join(p or "-" for p in prints).encode())
+    return h.hexdigest()
+
+
+def write_frame(path: str, df: pd.DataFrame, geometry: str = "SHAPE"):
+    """Writes a spatial dataframe to Parquet, with geometries as WKB.
+
+    Parameters
+    ----------
+    path : str
+        The file path to write to
+    df : pandas.DataFrame
+        The dataframe to write
+    geometry : str, optional
+        The name of the geometry column, default "SHAPE"
+
+    Returns
+    -------
+    dict
+        The spatial reference of the geometries, needed to read them
+    """
+    sr = spatial_reference(df[geometry])
+    out = pd.DataFrame(df.drop(columns=[geometry]))
+    out[geometry] = shapely.to_wkb([as_shapely(g) for g in df[geometry]])
+    out.to_parquet(path)
+    return sr
+
+
+def read_frame(path: str, sr, geometry: str = "SHAPE") -> pd.DataFrame:
+    """Reads a dataframe written by write_frame, with geometries as
+    ESRI JSON dicts.
+
+    Parameters
+    ----------
+    path : str
+        The file path to read
+    sr : dict
+        The spatial reference of the geometries
+    geometry : str, optional
+        The name of the geometry column, default "SHAPE"
+
+    Returns
+    -------
+    pandas.DataFrame
+        The dataframe as it was written
+    """
+    df = pd.read_parquet(path)
+    df[geometry] = [None if s is None else as_esri(s, sr)
+                    for s in shapely.from_wkb(df[geometry].to_numpy())]
+    return df
+
+
+class Checkpoints:
+    """The outputs of each completed stage of one run, saved on disk so
+    a failed run can resume where it stopped.
+
+    Each stage is saved under a key describing its inputs, and is only
+    loaded again for the same key. The manifest is written after the
+    outputs, so a stage interrupted while saving is never loaded.
+
+    Parameters
+    ----------
+    folder : str
+        The folder holding every run's checkpoints
+    run_id : str, optional
+        The run to open, defaults to a new run named for the time
+    """
+
+    def __init__(self, folder: str, run_id: str = None):
+        self.folder = folder
+        self.run_id = run_id or datetime.now().strftime("%Y%m%dT%H%M%S")
+        self.path = os.path.join(folder, self.run_id)
+        self.manifest = {"run_id": self.run_id, "stages": {}}
+        manifest = os.path.join(self.path, "manifest.json")
+        if os.path.isfile(manifest):
+            with open(manifest) as f:
+                self.manifest = json.load(f)
+
+    @staticmethod
+    def latest(folder: str):
+        """Finds the most recent run that didn't finish, or None."""
+        if not os.path.isdir(folder):
+            return None
+        runs = sorted(r for r in os.listdir(folder)
+                      if os.path.isfile(os.path.join(folder, r,
+                                                     "manifest.json")))
+        return runs[-1] if runs else None
+
+    def _write_manifest(self):
+        temp = os.path.join(self.path, "manifest.json.tmp")
+        with open(temp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temp, os.path.join(self.path, "manifest.json"))
+
+    def save(self, stage: str, key: str, **outputs) -> None:
+        """Saves the outputs of a stage. If they can't be written, e.g.
+        when pyarrow isn't installed, a warning is logged and the stage
+        is left unsaved.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage
+        key : str
+            A digest of the stage's inputs
+        outputs : pandas.DataFrame or dict
+            The outputs by name, where dataframes are written to Parquet
+            and anything else to JSON
+        """
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            saved = {name: self._write(stage, name, value)
+                     for name, value in outputs.items()}
+        except (ImportError, OSError) as e:
+            # A checkpoint only saves time on a resumed run, so the run
+            # carries on without one
+            log.warning(f"Couldn't save a checkpoint after {stage}, which "
+                        f"will run again if the run is resumed: {e}")
+            return
+        self.manifest["stages"][stage] = {
+            "key": key, "outputs": saved,
+            "saved": datetime.now().isoformat(timespec="seconds")}
+        self._write_manifest()
+
+    def _write(self, stage: str, name: str, value) -> dict:
+        """Writes one output of a stage, returning its manifest entry."""
+        if isinstance(value, pd.DataFrame):
+            file = f"{stage}.{name}.parquet"
+            sr = write_frame(os.path.join(self.path, file), value)
+            return {"file": file, "sr": sr}
+        file = f"{stage}.{name}.json"
+        with open(os.path.join(self.path, file), "w") as f:
+            json.dump(value, f)
+        return {"file": file}
+
+    def completed(self, stage: str) -> bool:
+        """Whether a stage was saved for any inputs."""
+        return stage in self.manifest["stages"]
+
+    def load(self, stage: str, key: str):
+        """Loads the outputs of a stage, or None if the stage wasn't
+        completed for the same inputs.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage
+        key : str
+            A digest of the stage's inputs
+
+        Returns
+        -------
+        dict
+            The outputs by name, as they were saved
+        """
+        entry = self.manifest["stages"].get(stage)
+        if entry is None or entry["key"] != key:
+            return None
+        outputs = {}
+        for name, saved in entry["outputs"].items():
+            path = os.path.join(self.path, saved["file"])
+            if "sr" in saved:
+                outputs[name] = read_frame(path, saved["sr"])
+            else:
+                with open(path) as f:
+                    outputs[name] = json.load(f)
+        return outputs
+
+    def finish(self) -> None:
+        """Deletes the run's checkpoints once nothing needs resuming."""
+        shutil.rmtree(self.path, ignore_errors=True)
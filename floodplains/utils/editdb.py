@@ -1,173 +1,203 @@
 import os
-from datetime import datetime
 
-import arcgis
-import arcpy
 import floodplains.config as config
+from floodplains.utils.editplan import (ChangeSet, EditPlan, EditStore,
+                                        plan_edits)
+from floodplains.utils.geometry import as_shapely, bounding_area
+from floodplains.utils.lazy import lazy_import
+import numpy as np
 import pandas as pd
+import shapely
+
+# Only imported once edits are made
+arcpy = lazy_import("arcpy")
 
 log = config.logging.getLogger(__name__)
 
 
-def _edit_existing_polys(fc, fields, where_clause, polygon, date, cursor):
-    """Cuts polygons inside the feature class that cross the supplied
-    geometry boundary, and updates attributes of the resulting polygons.
+class SdeStore(EditStore):
+    """The floodplain feature class inside a versioned enterprise
+    geodatabase.
 
     Parameters
     ----------
+    workspace : str
+        The file path to the sde connection
     fc : str
-        The full path to the feature class
-    fields : list
-        The fields to include in the update cursor
-    where_clause : str
-        A SQL statement used to filter the contents of the database
-        cursor
-    polygon : arcpy.Polygon()
-        The polygon of the lomr being investigated
-    date : datetime
-        The effective date of the lomr
-    cursor : arcpy.da.InsertCursor
-        The insert cursor used to insert new geometries to the feature
-        class
-    """
-    # Enumerate fields to make cursor access easier to understand
-    i = {field: index for index, field in enumerate(fields)}
-    with arcpy.da.UpdateCursor(fc, fields, where_clause) as update:
-        for row in update:
-            if row[i["SHAPE@"]].overlaps(polygon):
-                # save all attributes (other than geometry) before cutting
-                row_dict = {index: value for index, value in enumerate(row)}
-                # save a list of clipped floodplain geometries
-                geoms = row[i["SHAPE@"]].cut(polygon.boundary())
-                # delete the geometry that got cut to avoid duplicates
-                update.deleteRow()
-                for g in geoms:
-                    if g.area > 0:
-                        # create a new row dict
-                        new_record = row_dict
-                        # insert the new geometry
-                        new_record[i["SHAPE@"]] = g
-                        # change LIFECYCLE and INEFFDATE of the inner geom
-                        if polygon.contains(g.centroid):
-                            new_record[i["INEFFDATE"]] = date
-                        # convert back to a list in the proper order
-                        new_row = tuple(new_record.values())
-                        # add the new row to the layer
-                        cursor.insertRow(new_row)
-
-
-def _add_new_polys(records, fields, polygon, cursor):
-    """Inserts newly transformed records into the cursor opened on
-    a feature class.
-
-    Parameters
-    ----------
-    records : list
-        A list of dicts, where every dict is one row of the dataframe
-    fields : list
-        The list of field names ordered based on how they appear in the
-        cursor object
-    polygon : arcpy.Polygon()
-        The polygon of the lomr being investigated
-    cursor : arcpy.da.InsertCursor
-        An insert cursor opened on the versioned feature class being
-        edited
+        The name of the feature class
+    sr : int
+        The spatial reference of new geometries
     """
-    for record in records:
-        point = record["SHAPE@"].labelPoint
-        if polygon.contains(point):
-            row = [record[column_name] for column_name in fields]
-            cursor.insertRow(row)
 
-
-def sdf_to_dict(sdf):
+    def __init__(self, workspace: str, fc: str, sr: int):
+        self.workspace = workspace
+        self.fc_path = os.path.join(workspace, fc)
+        self.sr = arcpy.SpatialReference(sr)
+
+    def _from_shapely(self, shape):
+        """Converts a shapely geometry into arcpy."""
+        return arcpy.FromWKB(bytearray(shape.wkb), self.sr)
+
+    def _to_arcpy(self, row: tuple, shape_i: int) -> list:
+        """Converts the shapely geometry of a row into arcpy."""
+        row = list(row)
+        row[shape_i] = self._from_shapely(row[shape_i])
+        return row
+
+    def _search(self, fields: list, where_clause: str, extent=None):
+        """Opens a search cursor, letting the database skip polygons
+        away from the extent where it can.
+
+        The spatial_filter argument needs ArcGIS Pro 3.2+. Older
+        installs read every row, and the rows are filtered afterwards.
+
+        Returns
+        -------
+        tuple
+            (arcpy.da.SearchCursor, whether the cursor is filtered by
+            the extent)
+        """
+        fields = ["OID@"] + fields
+        if extent is not None:
+            try:
+                return arcpy.da.SearchCursor(
+                    self.fc_path, fields, where_clause,
+                    spatial_filter=self._from_shapely(extent),
+                    spatial_relationship="INTERSECTS"), True
+            except TypeError:
+                log.debug("Spatial filters need ArcGIS Pro 3.2+, so "
+                          "rows are filtered after they are read.")
+        return arcpy.da.SearchCursor(self.fc_path, fields,
+                                     where_clause), extent is None
+
+    def read(self, fields: list, where_clause: str, extent=None):
+        shape_i = fields.index("SHAPE@")
+        search, filtered = self._search(fields, where_clause, extent)
+        with search:
+            for oid, *row in search:
+                row[shape_i] = shapely.from_wkb(bytes(row[shape_i].WKB))
+                if filtered or extent.intersects(row[shape_i]):
+                    yield oid, tuple(row)
+
+    def apply(self, plan: EditPlan, fields: list) -> None:
+        shape_i = fields.index("SHAPE@")
+        session = arcpy.da.Editor(self.workspace)
+        session.startEditing(False, True)
+        session.startOperation()
+
+        # One pass over only the existing polygons that change
+        edited = sorted(plan.deletes | set(plan.updates))
+        if edited:
+            oid_field = arcpy.Describe(self.fc_path).OIDFieldName
+            where = f"{oid_field} IN ({', '.join(map(str, edited))})"
+            with arcpy.da.UpdateCursor(self.fc_path, ["OID@"] + fields,
+                                       where) as update:
+                for row in update:
+                    if row[0] in plan.deletes:
+                        update.deleteRow()
+                    else:
+                        for field, value in plan.updates[row[0]].items():
+                            row[fields.index(field) + 1] = value
+                        update.updateRow(row)
+
+        # One insert cursor for cut pieces and new polygons alike
+        with arcpy.da.InsertCursor(self.fc_path, fields) as insert:
+            for row in plan.inserts:
+                insert.insertRow(self._to_arcpy(row, shape_i))
+
+        session.stopOperation()
+        session.stopEditing(True)
+        del session
+
+
+def sdf_to_rows(sdf, fields: list, chunk_size: int = 1000):
     """Transform the spatial dataframe coming from the esri api into
-    a list of dicts that can be easily consumed into an update cursor.
+    rows that can be consumed directly by an insert cursor.
+
+    Dates and missing values are normalized a whole column at a time,
+    while geometries are converted to shapely one chunk at a time, so
+    memory stays flat no matter how many rows are loaded.
 
     Parameters
     ----------
     sdf : pandas.DataFrame
         The spatial dataframe of new flood areas
-
-    Returns
-    -------
-    list
-        A list of dicts, where every dict is one row of the dataframe
+    fields : list
+        The cursor field names, where SHAPE@ is read from SHAPE
+    chunk_size : int, optional
+        The number of geometries converted at a time, default 1000
+
+    Yields
+    ------
+    tuple
+        One row of the dataframe in field order
     """
-    records = sdf.to_dict("records")
-    for record in records:
-        # Convert timestamps to datetime
-        if pd.notnull(record["EFFDATE"]):
-            record["EFFDATE"] = record["EFFDATE"].to_pydatetime()
-        else:
-            record["EFFDATE"] = None
-        if pd.notnull(record["INEFFDATE"]):
-            record["INEFFDATE"] = record["INEFFDATE"].to_pydatetime()
+    columns = []
+    for field in fields:
+        if field == "SHAPE@":
+            columns.append(sdf["SHAPE"].to_numpy(dtype=object))
+            continue
+        col = sdf[field]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            values = np.array(col.dt.to_pydatetime(), dtype=object)
         else:
-            record["INEFFDATE"] = None
-        # Convert geometry to arcpy
-        record["SHAPE@"] = record["SHAPE"].as_arcpy
-    return records
+            values = col.to_numpy(dtype=object, copy=True)
+        values[col.isna().to_numpy()] = None
+        columns.append(values)
 
+    shape_i = fields.index("SHAPE@")
+    for start in range(0, len(sdf), chunk_size):
+        chunk = [c[start:start + chunk_size] for c in columns]
+        chunk[shape_i] = [as_shapely(g) for g in chunk[shape_i]]
+        yield from zip(*chunk)
 
-def perform_edits(workspace: str, fc: str, fields: list, where_clause: str,
-                  lomr_layer, records):
+
+def perform_edits(store: EditStore, fields: list, where_clause: str,
+                  lomrs: list, records, changes: ChangeSet = None):
     """Makes all the versioned edits necessary to insert new polygons
     into the floodplain feature class inside city databases.
 
-    1: Cuts polygons that cross the lomr. This ensures that
+    The edits for every LOMR are planned up front, then applied in one
+    edit session with a single pass of each cursor.
+
+    1: Cuts polygons that cross a lomr. This ensures that
     when new FEMA polygons are dropped in, they don't overlap with
     existing geometries. This also ensures that polygons tie in properly
     at confluences.
 
-    2: Changes the LIFECYCLE of existing floodplains within the LOMR
-    to "Inactive", and alters the INEFFDATE to match that of the LOMR
+    2: Alters the INEFFDATE of existing floodplains within the LOMR to
+    match that of the LOMR, in place when they sit fully inside it
 
     3: Inserts new FEMA geometries with associated attributes
 
     Parameters
     ----------
-    workspace : str
-        The file path to the sde connection
-    fc : str
-        The name of the feature class
+    store : EditStore
+        The storage holding the floodplain feature class
     fields : list
         The fields used in various update and insert cursors
     where_clause : str
         A SQL query used to edit specific records in various cursors
-    lomr_layer : arcgis.features.Layer
-        A Layer object representing one LOMR geometry and its attributes
-    records : list
-        A list of dicts, where every dict is one row of the dataframe
+    lomrs : list
+        (shapely polygon, effective date) pairs for every LOMR
+    records : iterable
+        New rows as tuples in field order, like those from sdf_to_rows
+    changes : ChangeSet, optional
+        Existing polygons to keep as they are or update in place, from
+        detect_changes, default None
+
+    Returns
+    -------
+    EditPlan
+        The edits that were applied
     """
-    # Path to floodplain feature class
-    fc_path = os.path.join(workspace, fc)
-    # LOMR effective date
-    lomr_date = datetime.fromtimestamp(lomr_layer.attributes["EFF_DATE"]/1000)
-    # Deconstruct lomr layer into a linear boundary
-    lomr_geom = arcgis.geometry.Geometry(lomr_layer.geometry).as_arcpy
-
-    # try:
-    session = arcpy.da.Editor(workspace)
-    session.startEditing(False, True)
-    session.startOperation()
-
-    # Open an insert cursor for edits
-    log.info("Creating Insert cursor.")
-    insert = arcpy.da.InsertCursor(fc_path, fields)
-
-    # Edit existing polygons in the feature class
-    log.info("Editing existing polygons within the LOMR.")
-    _edit_existing_polys(fc=fc_path, fields=fields, where_clause=where_clause,
-                         polygon=lomr_geom, date=lomr_date, cursor=insert)
-
-    # Add the transformed polygons
-    log.info("Adding new polygons into the LOMR area.")
-    _add_new_polys(records=records, fields=fields,
-                   polygon=lomr_geom, cursor=insert)
-
-    session.stopOperation()
-    session.stopEditing(True)
-    del session, insert
-    # except Exception:
-    #     log.error("The edit operation failed.")
+    log.info("Planning edits to existing polygons within the LOMRs.")
+    # Only read existing polygons near a LOMR
+    extent = bounding_area([polygon for polygon, _ in lomrs])
+    existing = store.read(fields, where_clause, extent)
+    plan = plan_edits(existing, lomrs, records, fields, changes=changes)
+
+    log.info(f"Applying {len(plan.deletes)} cuts, {len(plan.updates)} "
+             f"updates and {len(plan.inserts)} inserts.")
+    store.apply(plan, fields)
+    return plan
@@ -0,0 +1,396 @@
+import abc
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from itertools import islice
+from numbers import Number
+
+import numpy as np
+import shapely
+
+from floodplains.utils.geometry import label_points, polygonal
+from floodplains.utils.spatialindex import PolygonIndex
+
+
+class EditPlan:
+    """Every edit needed to bring a set of LOMRs into the floodplain
+    feature class, computed before any cursor is opened.
+
+    Attributes
+    ----------
+    deletes : set
+        ObjectIDs of existing polygons that were cut, and are replaced
+        by their pieces in inserts
+    updates : dict
+        ObjectIDs of existing polygons mapped to the {field: value}
+        attributes to change in place
+    inserts : list
+        Rows to insert, as tuples in cursor field order
+    """
+
+    def __init__(self):
+        self.deletes = set()
+        self.updates = {}
+        self.inserts = []
+
+    def __len__(self):
+        return len(self.deletes) + len(self.updates) + len(self.inserts)
+
+
+class ChangeSet:
+    """The difference between transformed polygons and the active city
+    floodplains they would replace.
+
+    Attributes
+    ----------
+    rows : int
+        The number of transformed rows compared
+    matched : set
+        Positions of transformed rows with a polygon of the same shape
+        in the city floodplains, which aren't inserted
+    unchanged : set
+        ObjectIDs of existing polygons with the same shape and
+        attributes as a transformed row, which are left as they are
+    updates : dict
+        ObjectIDs of existing polygons with the same shape as a
+        transformed row, mapped to the {field: value} attributes that
+        differ
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.matched = set()
+        self.unchanged = set()
+        self.updates = {}
+
+    def __len__(self):
+        return self.rows - len(self.matched) + len(self.updates)
+
+    def inserts(self, records):
+        """Yields the transformed rows without a match.
+
+        Parameters
+        ----------
+        records : iterable
+            The same transformed rows that were compared, in the same
+            order
+
+        Yields
+        ------
+        tuple
+            Each row with no polygon of the same shape in the city
+            floodplains
+        """
+        for i, row in enumerate(records):
+            if i not in self.matched:
+                yield row
+
+
+def _normalize(value):
+    """Puts an attribute value into a form that compares equal however
+    it was read, e.g. 1 and 1.0, or datetimes with microseconds."""
+    if isinstance(value, datetime):
+        return value.replace(microsecond=0).isoformat()
+    if isinstance(value, Number) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def attribute_hashes(rows, fields: list) -> list:
+    """Hashes the attributes of every row, ignoring the geometry.
+
+    Parameters
+    ----------
+    rows : iterable
+        Rows as tuples in field order
+    fields : list
+        The field names, including SHAPE@
+
+    Returns
+    -------
+    list
+        A hex digest per row
+    """
+    keep = [i for i, f in enumerate(fields) if f != "SHAPE@"]
+    return [hashlib.blake2b(json.dumps([_normalize(row[i]) for i in keep],
+                                       default=str).encode(),
+                            digest_size=16).hexdigest()
+            for row in rows]
+
+
+def detect_changes(existing, records, fields: list,
+                   tolerance: float = 0.01,
+                   chunk_size: int = 1000) -> ChangeSet:
+    """Compares transformed rows with the active city floodplains, so
+    only real changes are written.
+
+    Existing polygons are indexed once, and each chunk of transformed
+    rows is joined to the polygons it intersects. A row is matched to
+    one of those candidates when the Hausdorff distance between them is
+    within the tolerance, which absorbs the coordinates snapped by the
+    geodatabase. Matched rows aren't inserted, and the existing polygon
+    is kept, with any attributes that differ updated in place.
+
+    Parameters
+    ----------
+    existing : iterable
+        (ObjectID, row) pairs of the active floodplains, where each row
+        is a tuple in field order with a shapely geometry
+    records : iterable
+        Transformed rows as tuples in field order with shapely
+        geometries, which are read once, a chunk at a time
+    fields : list
+        The field names, including SHAPE@
+    tolerance : float, optional
+        The furthest any part of two polygons can be from the other for
+        them to have the same shape, default 0.01
+    chunk_size : int, optional
+        The number of records compared at a time, default 1000
+
+    Returns
+    -------
+    ChangeSet
+        The rows that matched and the existing polygons to keep
+    """
+    shape_i = fields.index("SHAPE@")
+    existing = list(existing)
+    changes = ChangeSet()
+    index = PolygonIndex([row[shape_i] for _, row in existing])
+    hashes = attribute_hashes((row for _, row in existing), fields)
+    taken = set()
+
+    records = iter(records)
+    chunk = list(islice(records, chunk_size))
+    while chunk:
+        shapes = np.array([row[shape_i] for row in chunk], dtype=object)
+        left, right = index.join(shapes)
+        close = shapely.hausdorff_distance(
+            shapes[left], index.geometries[right]) <= tolerance
+        candidates = {}
+        for i, j in zip(left[close], right[close]):
+            candidates.setdefault(i, []).append(j)
+
+        for i, attrs in zip(candidates, attribute_hashes(
+                (chunk[i] for i in candidates), fields)):
+            options = [j for j in candidates[i] if j not in taken]
+            if not options:
+                continue
+            # Prefer an identical polygon over one that needs updating
+            j = next((j for j in options if hashes[j] == attrs), options[0])
+            taken.add(j)
+            changes.matched.add(changes.rows + i)
+            oid, old = existing[j]
+            if hashes[j] == attrs:
+                changes.unchanged.add(oid)
+            else:
+                changes.updates[oid] = {
+                    f: new for f, new, was in zip(fields, chunk[i], old)
+                    if f != "SHAPE@" and _normalize(new) != _normalize(was)}
+        changes.rows += len(chunk)
+        chunk = list(islice(records, chunk_size))
+    return changes
+
+
+def plan_edits(existing, lomrs: list, records, fields: list,
+               chunk_size: int = 1000, changes: ChangeSet = None
+               ) -> EditPlan:
+    """Computes the combined edits for every LOMR at once.
+
+    1: Existing polygons that cross a LOMR are cut at the boundary.
+    Pieces inside the LOMR take the LOMR's effective date as their
+    INEFFDATE, so later LOMRs only cut pieces that are still effective.
+
+    2: Existing polygons that sit fully inside a LOMR keep their
+    geometry, and only have their INEFFDATE updated in place.
+
+    3: New FEMA polygons whose label point falls inside any LOMR are
+    inserted, once each. Label points are assigned to LOMRs in one
+    indexed pass per chunk of records, and only the rows that fall
+    inside a LOMR are kept.
+
+    Parameters
+    ----------
+    existing : iterable
+        (ObjectID, row) pairs of the effective floodplains, where each
+        row is a tuple in field order with a shapely geometry
+    lomrs : list
+        (shapely polygon, effective date) pairs in the order they are
+        applied
+    records : iterable
+        New rows as tuples in field order with shapely geometries
+    fields : list
+        The cursor field names, including INEFFDATE and SHAPE@
+    chunk_size : int, optional
+        The number of records labelled at a time, default 1000
+    changes : ChangeSet, optional
+        The result of detect_changes, where records are the rows its
+        inserts method yields. Existing polygons it keeps are neither
+        cut nor retired, and its attribute updates are made in place,
+        default None
+
+    Returns
+    -------
+    EditPlan
+        The edits to apply to the feature class
+    """
+    shape_i, ineff_i = fields.index("SHAPE@"), fields.index("INEFFDATE")
+    plan = EditPlan()
+    kept = set()
+    if changes is not None:
+        kept = changes.unchanged | set(changes.updates)
+        plan.updates.update(changes.updates)
+
+    for oid, row in existing:
+        if oid in kept:
+            continue
+        pieces = [(row[shape_i], row[ineff_i])]
+        cut = False
+        for polygon, date in lomrs:
+            next_pieces = []
+            for geom, ineff in pieces:
+                if ineff is not None:
+                    next_pieces.append((geom, ineff))
+                elif polygon.contains(geom):
+                    next_pieces.append((geom, date))
+                elif geom.overlaps(polygon):
+                    # Cuts can also return the lines and points where the
+                    # polygons touch, which can't be inserted
+                    cut = True
+                    for piece, ineff in ((geom.intersection(polygon), date),
+                                         (geom.difference(polygon), None)):
+                        piece = polygonal(piece)
+                        if not piece.is_empty:
+                            next_pieces.append((piece, ineff))
+                else:
+                    next_pieces.append((geom, ineff))
+            pieces = next_pieces
+        if cut:
+            plan.deletes.add(oid)
+            for geom, ineff in pieces:
+                if geom.area > 0:
+                    new_row = list(row)
+                    new_row[shape_i], new_row[ineff_i] = geom, ineff
+                    plan.inserts.append(tuple(new_row))
+        elif pieces[0][1] != row[ineff_i]:
+            plan.updates[oid] = {"INEFFDATE": pieces[0][1]}
+
+    if lomrs:
+        index = PolygonIndex([polygon for polygon, _ in lomrs])
+        records = iter(records)
+        chunk = list(islice(records, chunk_size))
+        while chunk:
+            labels = label_points(row[shape_i] for row in chunk)
+            found = index.locate(shapely.points(labels))
+            plan.inserts.extend(tuple(chunk[i])
+                                for i in np.flatnonzero(found >= 0))
+            chunk = list(islice(records, chunk_size))
+
+    return plan
+
+
+class EditStore(abc.ABC):
+    """The interface between an edit plan and the storage holding the
+    floodplain feature class."""
+
+    @abc.abstractmethod
+    def read(self, fields: list, where_clause: str, extent=None):
+        """Yields (ObjectID, row) pairs matching the where clause, where
+        each row is a tuple in field order with a shapely geometry.
+
+        If a shapely extent is supplied, only rows whose geometries
+        intersect it are read."""
+
+    @abc.abstractmethod
+    def apply(self, plan: EditPlan, fields: list) -> None:
+        """Applies every edit in a plan in a single edit session."""
+
+
+class SQLiteStore(EditStore):
+    """A local floodplain table used to test and dry-run edit plans.
+
+    Geometries are stored as WKB alongside their envelopes, and dates
+    as ISO strings, so where clauses written for the enterprise
+    geodatabase work unchanged.
+
+    Parameters
+    ----------
+    path : str
+        The file path to the SQLite database, or ":memory:"
+    fields : list
+        The field names of the table, including SHAPE@
+    """
+
+    def __init__(self, path: str, fields: list):
+        self.conn = sqlite3.connect(path)
+        columns = ", ".join(f'"{self._column(f)}"' for f in fields)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS floodplains "
+                          f"(OBJECTID INTEGER PRIMARY KEY, {columns}, "
+                          "XMIN REAL, YMIN REAL, XMAX REAL, YMAX REAL)")
+
+    @staticmethod
+    def _column(field: str) -> str:
+        return "SHAPE" if field == "SHAPE@" else field
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, datetime):
+            return value.isoformat(" ")
+        if hasattr(value, "wkb"):
+            return value.wkb
+        return value
+
+    @staticmethod
+    def _decode(field: str, value):
+        if value is None:
+            return None
+        if field == "SHAPE@":
+            return shapely.from_wkb(value)
+        if field.endswith("DATE"):
+            return datetime.fromisoformat(value)
+        return value
+
+    def _insert(self, fields: list, rows) -> None:
+        shape_i = fields.index("SHAPE@")
+        columns = ", ".join(f'"{self._column(f)}"' for f in fields)
+        marks = ", ".join("?" for _ in fields)
+        self.conn.executemany(
+            f"INSERT INTO floodplains ({columns}, XMIN, YMIN, XMAX, YMAX) "
+            f"VALUES ({marks}, ?, ?, ?, ?)",
+            [[self._encode(v) for v in row] + list(row[shape_i].bounds)
+             for row in rows])
+
+    def load(self, fields: list, rows) -> None:
+        """Adds rows to the table, outside of any edit plan."""
+        with self.conn:
+            self._insert(fields, rows)
+
+    def read(self, fields: list, where_clause: str = "1=1", extent=None):
+        shape_i = fields.index("SHAPE@")
+        columns = ", ".join(f'"{self._column(f)}"' for f in fields)
+        sql = (f"SELECT OBJECTID, {columns} FROM floodplains "
+               f"WHERE ({where_clause})")
+        args = []
+        if extent is not None:
+            sql += " AND XMAX >= ? AND XMIN <= ? AND YMAX >= ? AND YMIN <= ?"
+            xmin, ymin, xmax, ymax = extent.bounds
+            args = [xmin, xmax, ymin, ymax]
+        for oid, *values in self.conn.execute(f"{sql} ORDER BY OBJECTID",
+                                              args):
+            row = tuple(self._decode(f, v) for f, v in zip(fields, values))
+            if extent is None or extent.intersects(row[shape_i]):
+                yield oid, row
+
+    def apply(self, plan: EditPlan, fields: list) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM floodplains WHERE OBJECTID = ?",
+                [(oid,) for oid in plan.deletes])
+            for oid, changes in plan.updates.items():
+                assignments = ", ".join(f'"{self._column(f)}" = ?'
+                                        for f in changes)
+                self.conn.execute(
+                    f"UPDATE floodplains SET {assignments} "
+                    "WHERE OBJECTID = ?",
+                    [self._encode(v) for v in changes.values()] + [oid])
+            self._insert(fields, plan.inserts)
@@ -1,10 +1,13 @@
 import os
 import smtplib
+import time
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+SUBJECT = "\N{Water Wave} Floodplain Update \N{Water Wave}"
+
 
 def create_html_table(data: list) -> str:
     """Creates table encoded in HTML, where columns are sorted based on
@@ -88,9 +91,178 @@ def email_body(body: str) -> str:
     return insert
 
 
+def attachment(path: str) -> MIMEBase:
+    """Creates a base64 encoded attachment.
+
+    The file is read and encoded whole rather than a chunk at a time, as
+    smtplib sends each message as a single string, so chunks wouldn't
+    lower the memory a send needs.
+
+    Parameters
+    ----------
+    path : str
+        The file to attach
+
+    Returns
+    -------
+    email.mime.base.MIMEBase
+        The attachment, ready to add to a message
+    """
+    part = MIMEBase('application', 'octet-stream')
+    with open(path, 'rb') as f:
+        part.set_payload(f.read())
+    encoders.encode_base64(part)
+    part.add_header('Content-Disposition', 'attachment',
+                    filename=os.path.basename(path))
+    return part
+
+
+class Mailer:
+    """Sends emails through a Microsoft Office 365 account over a single
+    authenticated connection.
+
+    Messages are queued and sent together by send_all, which opens the
+    connection the first time there is something to send and keeps it
+    for the rest of the run. Used as a context manager, queued messages
+    are sent and the connection closed on exit.
+
+    Parameters
+    ----------
+    sender : str
+        The email address sending the emails
+    password : str
+        The email password
+    host : str, optional
+        The SMTP server, default "smtp.office365.com"
+    port : int, optional
+        The SMTP port, default 587
+    starttls : bool, optional
+        Whether to encrypt the connection before logging in, default True
+    retries : int, optional
+        Attempts made to send each message, default 3
+    backoff : float, optional
+        Seconds waited after the first failed attempt, doubling after
+        each one, default 2
+    timeout : float, optional
+        Seconds to wait on the server, default 60
+    """
+
+    def __init__(self, sender: str, password: str,
+                 host: str = 'smtp.office365.com', port: int = 587,
+                 starttls: bool = True, retries: int = 3,
+                 backoff: float = 2, timeout: float = 60):
+        self.sender = sender
+        self.password = password
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.queued = []
+        self.server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.send_all()
+        finally:
+            self.close()
+
+    def connect(self) -> smtplib.SMTP:
+        """Opens and logs in to the connection, if it isn't already."""
+        if self.server is None:
+            server = smtplib.SMTP(host=self.host, port=self.port,
+                                  timeout=self.timeout)
+            try:
+                server.ehlo()
+                if self.starttls:
+                    server.starttls()
+                    server.ehlo()
+                server.login(self.sender, self.password)
+            except Exception:
+                server.close()
+                raise
+            self.server = server
+        return self.server
+
+    def close(self) -> None:
+        """Closes the connection."""
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except smtplib.SMTPException:
+                self.server.close()
+            self.server = None
+
+    def queue(self, recipients: list, body: str, *attachments,
+              subject: str = SUBJECT) -> None:
+        """Queues an email to be sent by send_all.
+
+        Parameters
+        ----------
+        recipients : list
+            A list of recipients
+        body : str
+            The main body of the email, written in HTML
+        attachments : str
+            Paths of files to attach
+        subject : str, optional
+            The subject line, defaults to the floodplain update subject
+        """
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.sender
+        msg['To'] = "; ".join(recipients)
+        msg['Subject'] = subject
+        for item in attachments:
+            msg.attach(attachment(item))
+        msg.attach(MIMEText(body, 'html'))
+        self.queued.append((list(recipients), msg))
+
+    def _send(self, recipients: list, msg: MIMEMultipart) -> None:
+        """Sends one message, retrying temporary (4xx) failures and
+        reconnecting after a dropped connection."""
+        for attempt in range(self.retries):
+            try:
+                self.connect().sendmail(self.sender, recipients,
+                                        msg.as_string())
+                return
+            except (smtplib.SMTPResponseException,
+                    smtplib.SMTPServerDisconnected, ConnectionError,
+                    TimeoutError) as e:
+                response = isinstance(e, smtplib.SMTPResponseException)
+                if response and not 400 <= e.smtp_code < 500:
+                    raise
+                if attempt + 1 == self.retries:
+                    raise
+                if not response and self.server is not None:
+                    self.server.close()
+                    self.server = None
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def send_all(self) -> int:
+        """Sends every queued email.
+
+        Returns
+        -------
+        int
+            The number of emails sent
+        """
+        sent = 0
+        while self.queued:
+            self._send(*self.queued[0])
+            self.queued.pop(0)
+            sent += 1
+        return sent
+
+
 def send_email(sender: str, password: str, recipients: list, body: str,
-               *attachments):
-    """Send and email through a Microsoft Office 365 account.
+               *attachments, **kwargs):
+    """Sends a single email through a Microsoft Office 365 account, over
+    a connection that is closed once it's sent. Use a Mailer to send
+    several emails over one connection.
 
     Parameters
     ----------
@@ -102,35 +274,10 @@ def send_email(sender: str, password: str, recipients: list, body: str,
         A list of recipients
     body : str
         The main body of the email, written in HTML
+    attachments : str
+        File paths to attach
+    **kwargs
+        Arguments passed on to Mailer (e.g. host, port)
     """
-
-    # message
-    msg = MIMEMultipart('alternative')
-    msg['From'] = sender
-    msg['To'] = "; ".join(recipients)
-    msg['Subject'] = "\N{Water Wave} Floodplain Update \N{Water Wave}"
-
-    if attachments:
-        for item in attachments:
-            a = open(item, 'rb')
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(a.read())
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', 'attachment',
-                            filename=item.split(os.sep).pop())
-            msg.attach(part)
-
-    msg.attach(MIMEText(body, 'html'))
-
-    # create SMTP object
-    server = smtplib.SMTP(host='smtp.office365.com', port=587)
-    server.ehlo()
-    server.starttls()
-    server.ehlo()
-
-    # log in
-    server.login(sender, password)
-
-    # send email
-    server.sendmail(sender, recipients, msg.as_string())
-    server.quit()
+    with Mailer(sender, password, **kwargs) as mailer:
+        mailer.queue(recipients, body, *attachments)
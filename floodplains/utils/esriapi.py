@@ -1,114 +1,245 @@
-import arcgis
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime
+
 import floodplains.config as config
 import numpy as np
 import pandas as pd
+import requests
+from floodplains.utils import mirror, partition, restquery
+from floodplains.utils.geometry import (as_esri, as_shapely, bounding_area,
+                                        covering_area, fingerprints,
+                                        spatial_reference, union)
+from floodplains.utils.lazy import lazy_import
+from floodplains.utils.spatialindex import PolygonIndex, match_contained
 
-from datetime import datetime
+# Only imported once a function needs it
+arcgis = lazy_import("arcgis")
 
 # Initialize log for esriapicalls
 log = config.logging.getLogger(__name__)
 
+# Watermark keys for the cutoff date of the last run whose edits were
+# posted, and of the last run whose edits are still waiting in a version
+LAST_CHECKED = "city_flood.CREATED_DATE"
+PENDING = "city_flood.CREATED_DATE.pending"
+
+
+def query_layer(in_layer: arcgis.features.layer.FeatureLayer, **kwargs):
+    """Queries every feature in a layer that matches the supplied
+    arguments.
+
+    Unlike FeatureLayer.query, the features are fetched in concurrent
+    chunks of objectIds, so results aren't truncated at the server's
+    maxRecordCount.
+
+    Parameters
+    ----------
+    in_layer : arcgis.features.layer.FeatureLayer
+        A feature layer derived from a feature or map service endpoint
+    **kwargs
+        Arguments passed on to restquery.query (e.g. where, out_fields,
+        geometry_filter, out_sr)
+
+    Returns
+    -------
+    arcgis.features.FeatureSet
+        Every matching feature, in objectId order
+    """
+    result = restquery.query(in_layer.url, **kwargs)
+    return arcgis.features.FeatureSet.from_dict(result)
+
 
-def last_checked_date(in_layer):
+def posted_date(url: str, session=None) -> str:
+    """Finds the last time the GISSCR user created floodplain delineations
+    that are posted to the city's floodplains.
+
+    The server is asked for the latest CREATED_DATE, and only if it
+    can't compute statistics are all the dates downloaded.
+
+    Parameters
+    ----------
+    url : str
+        The url of the city's floodplain layer
+    session : requests.Session, optional
+        The session used to make every request, default None
+
+    Returns
+    -------
+    str
+        The last date the layer was edited by the GISSCR user (e.g. 2019-04-01)
+    """
+    where = ("CREATED_USER = 'GISSCR' AND (FLOODZONE LIKE 'A%' OR FLOODZONE "
+             "IN ('X', 'B'))")
+    try:
+        stats = restquery.query_statistics(
+            url, [("max", "CREATED_DATE")], where, session)
+        ts = stats["MAX_CREATED_DATE"]/1000
+    except (requests.HTTPError, KeyError, TypeError):
+        log.warning("Statistics query failed, downloading all CREATED_DATEs.")
+        query = restquery.query(url,
+                                out_fields=["CREATED_USER", "CREATED_DATE"],
+                                where=where,
+                                return_geometry=False,
+                                session=session)
+        ts = max([f["attributes"]["CREATED_DATE"]
+                  for f in query["features"]])/1000
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+def last_checked_date(url: str, store=None, session=None):
     """Checks the last time the GISSCR user created floodplain delineations in
     the city's floodplains in order to approximate the last time the script
     was run.
 
+    The cutoff recorded by the last run whose edits were posted is used
+    when a store is supplied, so the layer doesn't need to be queried at
+    all. A run's cutoff is only trusted once its edits show up in the
+    posted layer. Until then, the posted layer's latest CREATED_DATE is
+    used, so LOMRs whose edits were never posted are extracted again.
+
     Parameters
     ----------
-    in_layer : FeatureLayer
-        An arcgis feature layer
+    url : str
+        The url of the city's floodplain layer
+    store : sqlite3.Connection, optional
+        A connection to the local store of watermarks, default None
+    session : requests.Session, optional
+        The session used to make every request, default None
 
     Returns
     -------
     str
         The last date the layer was edited by the GISSCR user (e.g. 2019-04-01)
     """
-    where = ("CREATED_USER = 'GISSCR' AND (FLOODZONE LIKE 'A%' OR FLOODZONE "
-             "IN ('X', 'B'))")
-    query = in_layer.query(out_fields=["CREATED_USER", "CREATED_DATE"],
-                           where=where,
-                           return_geometry=False)
-    ts = max([f.attributes["CREATED_DATE"] for f in query.features])/1000
-    formatted = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
-    return formatted
+    if store is None:
+        return posted_date(url, session)
+
+    pending = mirror.get_watermark(store, PENDING)
+    if pending:
+        posted = posted_date(url, session)
+        if posted < pending:
+            log.info(f"Edits made on {pending} aren't posted yet, checking "
+                     f"for LOMRs since {posted}.")
+            return posted
+        mirror.set_watermark(store, LAST_CHECKED, pending)
+        mirror.set_watermark(store, PENDING, None)
+
+    cutoff = mirror.get_watermark(store, LAST_CHECKED)
+    return cutoff or posted_date(url, session)
+
+
+def record_checked_date(store, date: datetime = None) -> None:
+    """Records the cutoff of a run that made edits. last_checked_date
+    only uses it once the edits are posted.
+
+    Parameters
+    ----------
+    store : sqlite3.Connection
+        A connection to the local store of watermarks
+    date : datetime, optional
+        The date of the run, defaults to now
+    """
+    date = date or datetime.now()
+    mirror.set_watermark(store, PENDING, date.strftime("%Y-%m-%d"))
+
+
+def _query_shapes(url: str, sr: int, where: str, session) -> list:
+    """Queries the geometries of a layer as shapely geometries."""
+    result = restquery.query(url, out_sr=sr, where=where, session=session)
+    return [as_shapely(f["geometry"]) for f in result["features"]]
 
 
-def create_spatial_filter(in_layer: arcgis.features.layer.FeatureLayer,
-                          sr: int, where: str = "1=1") -> dict:
+def create_spatial_filter(url: str, sr: int, where: str = "1=1",
+                          session=None, store=None,
+                          tolerance: float = 0) -> dict:
     """Creates a spatial filter of dissolved geometries for use in
     querying ESRI's REST API.
 
+    The geometries are dissolved locally and simplified without
+    uncovering any of the original area, which keeps the filter small
+    enough to send with every query. When a store is given, the filter
+    is cached until the layer changes, judged by its last edit date or,
+    if the service doesn't report one, a hash of its geometries.
+
     The returned dict is an ESRI spec'd schema that can be ingesetd by
     their query API call.
 
     Parameters
     ----------
-    in_layer : arcgis.features.layer.FeatureLayer
-        A feature layer derived from a feature or map service endpoint
+    url : str
+        The url of a feature or map service layer
     sr : int
         The output spatial reference
     where : str
-        The query string used to filter data from the FeatureLayer
+        The query string used to filter data from the layer
+    session : requests.Session, optional
+        The session used to make every request, default None
+    store : sqlite3.Connection, optional
+        A connection to the local store where the filter is cached,
+        default None
+    tolerance : float, optional
+        The maximum distance a simplified vertex may move, in the units
+        of the spatial reference, default 0
 
     Returns
     -------
     dict
         A dict that is understood by ESRI's REST API query
     """
-    # ESRI requires that an anonymous instance of a Portal is started
-    # in order to use the geometry union function
-    temp_gis = arcgis.gis.GIS()
+    key = f"spatial_filter:{url}:{where}:{sr}:{tolerance}"
+    shapes = None
+
+    # Only download the features when the layer can't report edits
+    info = restquery.layer_info(url, session)
+    edited = info.get("editingInfo", {}).get("lastEditDate")
+    if edited:
+        version = f"edited:{edited}"
+    else:
+        shapes = _query_shapes(url, sr, where, session)
+        digests = sorted(d for d in fingerprints(shapes) if d)
+        version = "hash:" + hashlib.blake2b(
+            "".join(digests).encode(), digest_size=16).hexdigest()
 
-    # Get the set of features within the FeatureLayer
-    feature_set = in_layer.query(out_sr=sr, where=where)
+    if store is not None:
+        cached = mirror.get_cached(store, key, version)
+        if cached:
+            log.info("Using the cached spatial filter.")
+            return cached
 
-    # Union all output features
-    geoms = [poly.geometry for poly in feature_set.features]
-    unioned = arcgis.geometry.union(
-        spatial_ref=sr, geometries=geoms, gis=temp_gis)
+    if shapes is None:
+        shapes = _query_shapes(url, sr, where, session)
+    area = covering_area(shapes, tolerance)
 
     # Create a filter for use in ESRI's API query
-    geom_filter = arcgis.geometry.filters.intersects(unioned, sr=sr)
+    geom_filter = restquery.intersects(as_esri(area, sr), sr)
 
-    del temp_gis
+    if store is not None:
+        mirror.set_cached(store, key, version, geom_filter)
 
     return geom_filter
 
 
-def query_lomr(in_layer: arcgis.features.layer.FeatureLayer,
-               clause: str, g_filter: dict, sr: int):
-    """Returns all the LOMR boundaries that appear inside the spatial
-    filter based on the clause used.
+def drop_duplicate_lomrs(lomrs: arcgis.features.FeatureSet):
+    """Drops duplicate Case Numbers and Geometries from a set of LOMRs,
+    and orders them from newest to oldest.
 
     Parameters
     ----------
-    in_layer : arcgis.features.layer.FeatureLayer
-        A feature layer derived from a feature or map service endpoint
-    clause : str
-        Conditions used to restrict output, written in SQL syntax (e.g.
-        "STATUS = 'Effective'")
-    g_filter : dict
-        The boundaries that make up where the user is checking for new
-        LOMR boundaries
-    sr : int
-        The output spatial reference
+    lomrs : arcgis.features.FeatureSet
+        LOMR boundaries, queried from FEMA or read from the local mirror
 
     Returns
     -------
-    arcgis.features.layer.FeatureLayer
-        An ESRI FeatureLayer
+    arcgis.features.FeatureSet
+        The unique LOMR boundaries
     """
-    # Query the feature service
-    lomrs = in_layer.query(where=clause,
-                           geometry_filter=g_filter,
-                           out_sr=sr,
-                           datum_transformation=1478)
-    # Drop duplicate Case Numbers and Geometries if features are returned
     if lomrs.features:
         temp = lomrs.sdf
-        temp['GEOM_STR'] = str(temp['SHAPE'])
-        temp.drop_duplicates(subset=['CASE_NO', 'GEOM_STR'], inplace=True)
+        temp['GEOM_ID'] = fingerprints(as_shapely(g) for g in temp['SHAPE'])
+        temp.drop_duplicates(subset=['CASE_NO', 'GEOM_ID'], inplace=True)
+        temp.drop(columns='GEOM_ID', inplace=True)
         temp.sort_values(by='EFF_DATE', inplace=True, ascending=False)
         lomrs = arcgis.features.FeatureSet.from_dataframe(temp)
 
@@ -117,14 +248,20 @@ def query_lomr(in_layer: arcgis.features.layer.FeatureLayer,
 
 def extract_sfha(in_layer: arcgis.features.layer.FeatureLayer,
                  boundaries: arcgis.features.layer.FeatureSet,
-                 clause: str, out_fields: list, sr: int):
+                 clause: str, out_fields: list, sr: int,
+                 spatial_filter: bool = True,
+                 features: arcgis.features.FeatureSet = None,
+                 session=None, workers: int = 1):
     """Extracts all the SFHA floodplains that are within some boundaries
     into a pandas dataframe.
 
-    This package either requires shapely or arcpy, depending on the OS.
-    The output pandas dataframe is spatially enabled, and contains no
-    duplicate geometries based on FEMA's ID scheme. Duplicattes can
-    occur periodically because LOMRs can overlap.
+    Containment is evaluated locally with shapely against a packed
+    R-tree of the SFHAs, so each SFHA geometry is only built once no
+    matter how many LOMRs are checked. LOMRs are checked in groups
+    across processes when there is more than one worker. The output
+    pandas dataframe is spatially enabled, and contains no duplicate
+    geometries based on FEMA's ID scheme. Duplicattes can occur
+    periodically because LOMRs can overlap.
 
     Parameters
     ----------
@@ -139,6 +276,16 @@ def extract_sfha(in_layer: arcgis.features.layer.FeatureLayer,
         The fields to output as columns in the spatial dataframe
     sr : int
         The output spatial reference
+    spatial_filter : bool, optional
+        If True, only SFHAs intersecting the envelopes of the buffered
+        boundaries are requested from the server, default True
+    features : arcgis.features.FeatureSet, optional
+        SFHAs that were already fetched (e.g. from the local mirror),
+        in which case in_layer is not queried, default None
+    session : requests.Session, optional
+        The session used to make every request, default None
+    workers : int, optional
+        The number of processes used to check LOMRs, default 1
 
     Returns
     -------
@@ -148,50 +295,117 @@ def extract_sfha(in_layer: arcgis.features.layer.FeatureLayer,
         A dictionary summarizing number of SFHAs in a given polygon
         based on ID
     """
-    # Query the feature service
-    all_sfha = in_layer.query(where=clause,
-                              out_fields=out_fields,
-                              out_sr=sr,
-                              datum_transformation=1478)
+    lomr_geoms = [as_shapely(lomr.geometry) for lomr in boundaries.features]
+
+    if features is not None:
+        all_sfha = features
+    else:
+        # Push the LOMR extents to the server so only candidate SFHAs come
+        # over the wire, exact containment is still checked below
+        geom_filter = None
+        if spatial_filter:
+            area = as_esri(bounding_area(lomr_geoms, buffer=1), sr)
+            geom_filter = arcgis.geometry.filters.intersects(
+                arcgis.geometry.Geometry(area), sr=sr)
+
+        # Query the feature service
+        all_sfha = query_layer(in_layer,
+                               where=clause,
+                               out_fields=out_fields,
+                               geometry_filter=geom_filter,
+                               out_sr=sr,
+                               datum_transformation=1478,
+                               session=session)
 
-    # Create an empty dataframe with the same schema as the output
     all_sfha_sdf = all_sfha.sdf
-    subset = all_sfha_sdf.copy()
-    subset.drop(list(range(len(subset))), inplace=True)
 
-    # Loop through the LOMR boundaries and ID all SFHAs that are inside
+    # Map every row to the first row sharing its FLD_AR_ID. Factorized codes
+    # are numbered in order of appearance, so code k first appears at the
+    # k-th non-duplicated row.
+    area_ids = all_sfha_sdf['FLD_AR_ID']
+    codes, _ = pd.factorize(area_ids)
+    first_of = np.flatnonzero(~area_ids.duplicated().to_numpy())[codes]
+
+    # Index every SFHA once instead of rebuilding each geometry for every
+    # LOMR that gets evaluated, and buffer LOMR geoms by one foot to avoid
+    # topological errors where polys share an edge
+    shapes = [as_shapely(row.geometry) for row in all_sfha.features]
+    if workers > 1:
+        matches = partition.contained(lomr_geoms, shapes, 1, workers)
+    else:
+        matches = match_contained(lomr_geoms, PolygonIndex(shapes), buffer=1)
+
+    # ID all SFHAs that are inside each LOMR boundary, skipping flood areas
+    # that were already matched by a previous (overlapping) LOMR
     catalog = {}
-    for lomr in boundaries.features:
+    seen = np.zeros(len(all_sfha_sdf), dtype=bool)
+    gathered = []
+    for lomr, positions in zip(boundaries.features, matches):
         case = lomr.attributes['CASE_NO']
-        g = arcgis.geometry.Geometry(lomr.geometry)
-
-        # buffer LOMR geom by one foot to avoid topological errors where polys
-        # share an edge
-        buf = g.buffer(1)
-        count = 0
-
-        for row in all_sfha.features:
-            area_id = row.attributes['FLD_AR_ID']
-            f = arcgis.geometry.Geometry(row.geometry)
-            if buf.contains(f):
-                subset = subset.append(
-                    all_sfha_sdf[all_sfha_sdf['FLD_AR_ID'] == area_id],
-                    ignore_index=True)
-                count += 1
+        rows = pd.unique(first_of[positions])
+        rows = rows[~seen[rows]]
+        seen[rows] = True
+        gathered.append(rows)
 
         # log counts by LOMR Case Number
-        catalog[case] = count
+        catalog[case] = len(positions)
 
-    # drop any rows that represent duplicate flood areas
-    subset.drop_duplicates(subset=['FLD_AR_ID'], inplace=True)
+    # Materialize the matched flood areas with a single gather
+    rows = np.concatenate(gathered) if gathered else np.array([], dtype=int)
+    subset = all_sfha_sdf.take(rows).reset_index(drop=True)
 
     return subset, catalog
 
 
-def calc_effdate(sfha, lomr):
+def join_lomrs(sfha, lomr, predicate: str = "intersects") -> pd.DataFrame:
+    """Pairs every SFHA with each LOMR it falls in, carrying only the
+    LOMR's case number and effective date.
+
+    The LOMRs are indexed in a packed R-tree, and every SFHA is tested
+    in one batched query.
+
+    Parameters
+    ----------
+    sfha : pandas.DataFrame
+        SFHAs with ESRI geometries in a SHAPE column
+    lomr : arcgis.features.FeatureSet or pandas.DataFrame
+        LOMRs with CASE_NO and EFF_DATE attributes
+    predicate : str, optional
+        How SFHAs are matched to LOMRs, one of "intersects", "within"
+        or "representative_point", see PolygonIndex.join, default
+        "intersects"
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per pair, with the position of the SFHA in ROW and the
+        LOMR's CASE_NO and EFFDATE, sorted by ROW. SFHAs outside every
+        LOMR have no rows.
+    """
+    if isinstance(lomr, pd.DataFrame):
+        shapes = [as_shapely(g) for g in lomr["SHAPE"]]
+        cases = lomr["CASE_NO"].to_numpy(dtype=object)
+        dates = pd.to_datetime(lomr["EFF_DATE"]).to_numpy()
+    else:
+        shapes = [as_shapely(f.geometry) for f in lomr.features]
+        cases = np.array([f.attributes["CASE_NO"] for f in lomr.features],
+                         dtype=object)
+        dates = pd.to_datetime([f.attributes["EFF_DATE"]
+                                for f in lomr.features], unit="ms").to_numpy()
+
+    rows, hits = PolygonIndex(shapes).join(
+        [as_shapely(g) for g in sfha["SHAPE"]], predicate)
+    return pd.DataFrame({"ROW": rows, "CASE_NO": cases[hits],
+                         "EFFDATE": dates[hits]})
+
+
+def calc_effdate(sfha, lomr, predicate: str = "intersects"):
     """Calculates the date a given SFHA was adopted based on the LOMR
     boundary in which it resides.
 
+    SFHAs in more than one LOMR get one row per LOMR, which is what
+    calc_ineffdates expects. SFHAs outside every LOMR are dropped.
+
     Parameters
     ----------
     sfha : ESRI Spatial Dataframe
@@ -200,22 +414,24 @@ def calc_effdate(sfha, lomr):
     lomr : ESRI Feature Set
         The Letter of Map Revision areas extracted from an API call to
         FEMA's Rest Endpoint
+    predicate : str, optional
+        How SFHAs are matched to LOMRs, see join_lomrs, default
+        "intersects"
 
     Returns
     -------
     ESRI Spatial Dataframe
-        A copy of the incoming SFHA dataframe, but with a new
-        "EFFDATE" field appended.
+        A copy of the incoming SFHA dataframe, but with new "CASE_NO"
+        and "EFFDATE" fields appended.
     """
-    # Spatial join of LOMRs and SFHAs
     if not isinstance(sfha, pd.DataFrame):
         sfha = sfha.sdf
-    if not isinstance(lomr, pd.DataFrame):
-        lomr = lomr.sdf
-    new_sdf = sfha.spatial.join(lomr)
+    pairs = join_lomrs(sfha, lomr, predicate)
 
-    new_sdf.rename(columns={"EFF_DATE": "EFFDATE"}, inplace=True)
-    # Return new spatial dataframe
+    new_sdf = sfha.drop(columns=["CASE_NO", "EFFDATE"], errors="ignore")
+    new_sdf = new_sdf.take(pairs["ROW"].to_numpy()).reset_index(drop=True)
+    new_sdf["CASE_NO"] = pairs["CASE_NO"].to_numpy()
+    new_sdf["EFFDATE"] = pairs["EFFDATE"].to_numpy()
     return new_sdf
 
 
@@ -303,11 +519,95 @@ def calc_floodzone(row):
     return zone
 
 
-def calc_drainages(to_calc, comparison, spatial_ref: int):
+def calc_ineffdates(sfha_sdf):
+    """Calculates the date every SFHA was deemed ineffective based on
+    whether the SFHA resides inside 2+ different LOMRs.
+
+    This is the whole-column equivalent of calc_ineffdate: rows are
+    sorted by FLD_AR_ID and EFFDATE, and each row takes the next date
+    within its flood area.
+
+    Parameters
+    ----------
+    sfha_sdf : pandas.DataFrame
+        SFHAs with FLD_AR_ID and EFFDATE columns, with one row per
+        LOMR the flood area falls in
+
+    Returns
+    -------
+    pandas.Series
+        The timestamp each polygon went ineffective, or NaT
+    """
+    frame = pd.DataFrame({"ID": sfha_sdf["FLD_AR_ID"].to_numpy(),
+                          "DATE": sfha_sdf["EFFDATE"].to_numpy()})
+    ordered = frame.sort_values(["ID", "DATE"], kind="mergesort")
+    following = ordered.groupby("ID", sort=False)["DATE"].shift(-1)
+    # Rows that tie on date all take the date following the first of the
+    # ties, the same way list.index finds the first match
+    following = following.groupby(
+        [ordered["ID"], ordered["DATE"]], sort=False).transform("first")
+    return pd.Series(following.sort_index().to_numpy(),
+                     index=sfha_sdf.index, name="INEFFDATE")
+
+
+def calc_floodways(sfha_sdf):
+    """Extracts the floodway (e.g. Conveyance Zone) designation of every
+    SFHA. This is the whole-column equivalent of calc_floodway.
+
+    Parameters
+    ----------
+    sfha_sdf : pandas.DataFrame
+        SFHAs with SFHA_TF and ZONE_SUBTY columns
+
+    Returns
+    -------
+    pandas.Series
+        1 for floodways, otherwise 0
+    """
+    floodway = ((sfha_sdf["SFHA_TF"] == "T")
+                & (sfha_sdf["ZONE_SUBTY"] == "FLOODWAY"))
+    return floodway.astype(int).rename("FLOODWAY")
+
+
+def calc_floodzones(sfha_sdf):
+    """Extracts the FEMAZONE of every SFHA. This is the whole-column
+    equivalent of calc_floodzone.
+
+    Parameters
+    ----------
+    sfha_sdf : pandas.DataFrame
+        SFHAs with FLD_ZONE, DEPTH and STATIC_BFE columns
+
+    Returns
+    -------
+    pandas.Series
+        The flood zone designation for every SFHA
+    """
+    def suffix(values, mask):
+        """Rounds the values of the masked rows into strings."""
+        rounded = pd.Series("", index=values.index, dtype=object)
+        rounded[mask] = values[mask].round().astype(int).astype(str)
+        return rounded
+
+    zone = sfha_sdf["FLD_ZONE"]
+    is_ao, is_ah = zone == "AO", zone == "AH"
+    zones = np.select(
+        [is_ao, is_ah],
+        ["AO" + suffix(sfha_sdf["DEPTH"], is_ao),
+         "AH" + suffix(sfha_sdf["STATIC_BFE"], is_ah)],
+        default=zone.astype(object))
+    return pd.Series(zones, index=sfha_sdf.index, name="FLOODZONE")
+
+
+def calc_drainages(to_calc, comparison, workers: int = 1):
     """Checks if geometries in the "to_calc" DataFrame are inside the
     geometries of the "comparison" FeatureSet, and assigns the DRAINAGE
     variable accordingly.
 
+    Drainages are unioned locally and indexed once per process, then a
+    single representative point per row is located in batched queries,
+    one per spatial tile of rows.
+
     Modifies the input DataFrame called "to_calc" with a new DRAINAGE
     column.
 
@@ -317,118 +617,33 @@ def calc_drainages(to_calc, comparison, spatial_ref: int):
         The features that require geometry comparisons.
     comparison : arcgis.features.FeatureSet
         The features to compare geometries against.
-    spatial_ref : int
-        Output spatial reference
+    workers : int, optional
+        The number of processes used to locate rows, default 1
 
     Returns
     -------
     None
         No output, this function modifies the "to_calc" input in-place.
     """
-    # ESRI requires that an anonymous instance of a Portal is started
-    # in order to use the geometry union function
-    temp_gis = arcgis.gis.GIS()
-
-    # Union the city drainages
-    def union_drainages(row):
-        """Unions a given DataFrame row into a new ESRI Geometry object.
-
-        At time of writing this script, geometries coming out of the
-        union function come out with an empty spatial reference. This
-        is a workaround solution to this problem.
-
-        This function acts on individual rows of a pandas DataFrame
-        using the apply built-in.
-
-        Parameters
-        ----------
-        row : pandas.Series
-            A row of a pandas DataFrame
-
-        Returns
-        -------
-        arcgis.geometry.Geometry
-            An arcgis Geometry object
-        """
-        no_sr = arcgis.geometry.union(
-            geometries=row["SHAPE"], spatial_ref=spatial_ref, gis=temp_gis)
-        geom = arcgis.geometry.Geometry(
-            {"rings": no_sr.rings, "spatialReference": {"wkid": spatial_ref}})
-        return geom
-
-    def rand_point_in_poly(row):
-        """Get a random, representative point inside a polygon.
-
-        This function requires the shapely library, and acts on
-        individual rows of a pandas DataFrame using the apply built-in.
-
-        Parameters
-        ----------
-        row : pandas.Series
-            A row of a pandas DataFrame
-
-        Returns
-        -------
-        arcgis.geometry.Geometry
-            A point geometry projected to the parent function's
-            spatial_ref
-        """
-        shapely_shape = row["SHAPE"].as_shapely
-        if shapely_shape:
-            rand = shapely_shape.representative_point()
-            point = arcgis.geometry.Geometry(
-                {"x": rand.x, "y": rand.y,
-                    "spatialReference": {"wkid": spatial_ref}})
-        else:
-            label = row["SHAPE"].as_arcpy.labelPoint
-            point = arcgis.geometry.Geometry(
-                {"x": label.X, "y": label.Y,
-                    "spatialReference": {"wkid": spatial_ref}})
-        return point
-
-    def check_within(row):
-        """Checks whether the representative point inside the supplied
-        DataFrame row is within the unioned drainages of the city.
-
-        This function acts on individual rows of a pandas DataFrame
-        using the apply built-in.
-
-        Parameters
-        ----------
-        row : pandas.Series
-            A row of a pandas DataFrame
-
-        Returns
-        -------
-        str
-            The name of the drainage within which the point lies
-        """
-        for item in drain_fs.features:
-            arcgis_point = rand_point_in_poly(row)
-            g = arcgis.geometry.Geometry(item.geometry)
-            if g.contains(arcgis_point):
-                drain = item.attributes["DRAINAGE"]
-                return drain
-
-    # Create a new pandas DataFrame, where each row is grouped by drainage,
-    # and the geometries for each drainage are put into a list
-    drainages = pd.DataFrame(comparison.sdf.groupby("DRAINAGE")[
-                             "SHAPE"].apply(list)).reset_index()
-    # Convert the list of geometries for each DataFrame row into
-    # an ESRI Geometry object.
-    drainages["SHAPE"] = drainages.apply(union_drainages, axis=1)
-
-    # Convert the DataFrame into a FeatureSet
-    drain_fs = arcgis.features.FeatureSet.from_dataframe(drainages)
-
-    # Calculate all drainages
-    to_calc["DRAINAGE"] = to_calc.apply(check_within, axis=1)
-
-
-def dissolve_sdf(df, by=None):
+    # Union the city drainages into one polygon per drainage
+    drainages = comparison.sdf.groupby("DRAINAGE")["SHAPE"].apply(
+        lambda shapes: union(as_shapely(s) for s in shapes))
+
+    # Locate a representative point inside every polygon. Points outside
+    # of every drainage are located at -1, which picks the trailing None
+    found = partition.locate([as_shapely(s) for s in to_calc["SHAPE"]],
+                             list(drainages), workers)
+    names = np.append(drainages.index.to_numpy(dtype=object), None)
+    to_calc["DRAINAGE"] = names[found]
+
+
+def dissolve_sdf(df, by=None, workers: int = 1):
     """Dissolves geometries in a spatial dataframe based on the supplied
     fields.
 
+    Each group is unioned in spatial tiles spread across processes, and
+    the tiles are stitched back together, see partition.dissolve.
+
     Parameters
     ----------
     df : pd.DataFrame
@@ -436,27 +651,18 @@ def dissolve_sdf(df, by=None):
         consists of arcgis.geometry.Geometry objects)
     by : list, optional
         The list of fields to group by in the dissolve, default None
+    workers : int, optional
+        The number of processes used for the unions, default 1
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per group, with dissolved arcgis Geometry objects in
+        the SHAPE field
     """
-    def dissolve_shapes(row, sr):
-        """Helper function that dissolves a list of arcgis Geometry
-        objects in an DataFrame apply function.
-
-        Parameters
-        ----------
-        row : pd.Series
-            A pandas Series representing a row of a dataframe
-
-        Returns
-        -------
-        arcgis.geometry.Geometry
-            An arcgis geometry object
-        """
-        # Set up a temporary GIS object
-        tmp = arcgis.gis.GIS()
-        # Dissolve the geoms
-        geom = arcgis.geometry.functions.union(
-            geometries=row.SHAPE, spatial_ref=sr, gis=tmp)
-        return geom
+    # Dissolve locally with GEOS, in the spatial reference of the input
+    sr = spatial_reference(df.SHAPE) or df.spatial.sr
+    df = df.assign(SHAPE=[as_shapely(g) for g in df.SHAPE])
 
     if by:
         # Temporarily fill n/a values so that grouping can happen even when
@@ -471,7 +677,7 @@ def dissolve_sdf(df, by=None):
         listed_geoms = listed_geoms.reset_index()
 
         # Re-enable n/a values in the df
-        dissolved = listed_geoms.replace("NONE", np.NaN)
+        dissolved = listed_geoms.replace("NONE", np.nan)
     else:
         # Condense all geometries to a list
         geoms = [df.SHAPE.to_list()]
@@ -479,6 +685,8 @@ def dissolve_sdf(df, by=None):
         dissolved = pd.DataFrame([geoms], columns=["SHAPE"])
 
     # Dissolve the shapes based on field groupings
-    dissolved.SHAPE = dissolved.apply(dissolve_shapes, sr=2876, axis=1)
+    dissolved.SHAPE = [arcgis.geometry.Geometry(as_esri(shape, sr))
+                       for shape in partition.dissolve(dissolved.SHAPE,
+                                                       workers)]
 
     return dissolved
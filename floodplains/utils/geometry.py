@@ -0,0 +1,273 @@
+import hashlib
+
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Point, Polygon
+from shapely.geometry.polygon import orient
+
+
+def _rings_to_shapely(rings: list):
+    """Builds a shapely polygon from ESRI JSON rings.
+
+    ESRI polygons list exterior rings clockwise and interior rings
+    (holes) counter-clockwise. Every hole is assigned to the exterior
+    ring that covers it.
+
+    Parameters
+    ----------
+    rings : list
+        A list of rings, where each ring is a list of [x, y] pairs
+
+    Returns
+    -------
+    shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+        The polygon described by the rings
+    """
+    shells, holes = [], []
+    for ring in rings:
+        if len(ring) < 4:
+            continue
+        if shapely.LinearRing(ring).is_ccw:
+            holes.append(ring)
+        else:
+            shells.append(ring)
+
+    # Rings with a reversed winding order are all treated as exteriors
+    if not shells:
+        shells, holes = holes, []
+
+    parts = [[shell, []] for shell in shells]
+    for hole in holes:
+        for part in parts:
+            if Polygon(part[0]).covers(Point(hole[0])):
+                part[1].append(hole)
+                break
+
+    polygons = [Polygon(shell, interiors) for shell, interiors in parts]
+    if len(polygons) == 1:
+        return polygons[0]
+    return MultiPolygon(polygons)
+
+
+def as_shapely(geometry):
+    """Converts an ESRI JSON geometry into a shapely geometry.
+
+    Works on plain dicts as well as arcgis.geometry.Geometry objects,
+    which are dicts under the hood, so geometries can be compared
+    without an arcpy license or a network connection.
+
+    Parameters
+    ----------
+    geometry : dict
+        An ESRI JSON point or polygon (e.g. {"rings": [...]})
+
+    Returns
+    -------
+    shapely.geometry.base.BaseGeometry
+        The equivalent shapely geometry, or an empty polygon if the
+        input has no coordinates
+    """
+    if not geometry:
+        return Polygon()
+    if "rings" in geometry:
+        return _rings_to_shapely(geometry["rings"])
+    if "x" in geometry:
+        return Point(geometry["x"], geometry["y"])
+    raise ValueError(f"Unsupported geometry type: {list(geometry)}")
+
+
+def _polygons(shape):
+    """Yields every non-empty polygon within a (multi-part) geometry."""
+    if shape.geom_type == "Polygon":
+        if not shape.is_empty:
+            yield shape
+    elif hasattr(shape, "geoms"):
+        for part in shape.geoms:
+            yield from _polygons(part)
+
+
+def polygonal(shape):
+    """Keeps only the polygons of a geometry, e.g. the result of an
+    intersection that also touches along a line or at a point.
+
+    Parameters
+    ----------
+    shape : shapely.geometry.base.BaseGeometry
+        Any shapely geometry, including collections
+
+    Returns
+    -------
+    shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+        The non-empty polygons of the geometry, which is empty if there
+        are none
+    """
+    parts = list(_polygons(shape))
+    if len(parts) == 1:
+        return parts[0]
+    return MultiPolygon(parts) if parts else Polygon()
+
+
+def as_esri(shape, sr) -> dict:
+    """Converts a shapely polygon into an ESRI JSON polygon.
+
+    Exterior rings are written clockwise and holes counter-clockwise
+    per the ESRI spec. Parts of the geometry that aren't polygons are
+    dropped.
+
+    Parameters
+    ----------
+    shape : shapely.geometry.base.BaseGeometry
+        The polygon to convert
+    sr : int or dict
+        The well-known ID of the geometry's spatial reference, or an
+        ESRI spatial reference dict
+
+    Returns
+    -------
+    dict
+        An ESRI JSON polygon
+    """
+    rings = []
+    for part in _polygons(shape):
+        oriented = orient(part, sign=-1.0)
+        rings.append([list(xy) for xy in oriented.exterior.coords])
+        rings.extend([list(xy) for xy in interior.coords]
+                     for interior in oriented.interiors)
+    if isinstance(sr, int):
+        sr = {"wkid": sr}
+    return {"rings": rings, "spatialReference": dict(sr)}
+
+
+def spatial_reference(geometries):
+    """Finds the spatial reference of a set of ESRI JSON geometries.
+
+    Parameters
+    ----------
+    geometries : list
+        ESRI JSON geometries, which may include empty values
+
+    Returns
+    -------
+    dict
+        The spatial reference of the first geometry that has one, or
+        None
+    """
+    for geom in geometries:
+        if geom and geom.get("spatialReference"):
+            return geom["spatialReference"]
+    return None
+
+
+def union(shapes):
+    """Dissolves shapely geometries into a single geometry.
+
+    GEOS performs a cascaded union, so this is far faster than
+    unioning geometries pairwise.
+
+    Parameters
+    ----------
+    shapes : list
+        The shapely geometries to dissolve
+
+    Returns
+    -------
+    shapely.geometry.base.BaseGeometry
+        The dissolved geometry
+    """
+    return shapely.union_all(list(shapes))
+
+
+def bounding_area(geometries, buffer: float = 0):
+    """Unions the envelopes of a set of geometries into one compact
+    polygon, which is cheap to send as a spatial filter in a REST
+    request.
+
+    Parameters
+    ----------
+    geometries : list
+        The shapely geometries to bound
+    buffer : float, optional
+        Distance used to grow each geometry before taking its
+        envelope, default 0
+
+    Returns
+    -------
+    shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+        The union of every geometry's envelope
+    """
+    envelopes = shapely.envelope(shapely.buffer(list(geometries), buffer))
+    return shapely.union_all(envelopes)
+
+
+def label_points(shapes):
+    """Computes a point guaranteed to lie inside each geometry, the way
+    an arcpy labelPoint does, for a whole set of geometries at once.
+
+    Parameters
+    ----------
+    shapes : list
+        The shapely geometries to label
+
+    Returns
+    -------
+    numpy.ndarray
+        An (n, 2) array of the x, y coordinates of every label point
+    """
+    points = shapely.point_on_surface(list(shapes))
+    return shapely.get_coordinates(points).reshape(-1, 2)
+
+
+def fingerprints(shapes, grid: float = 0.001):
+    """Computes an identity for every geometry that doesn't depend on
+    ring orientation, starting vertex or sub-grid coordinate noise.
+
+    Geometries are snapped to a grid and normalized, then their WKB is
+    hashed, so two geometries share a fingerprint when they are the
+    same shape.
+
+    Parameters
+    ----------
+    shapes : list
+        The shapely geometries to fingerprint
+    grid : float, optional
+        The grid size coordinates are snapped to, in the units of the
+        spatial reference, default 0.001
+
+    Returns
+    -------
+    numpy.ndarray
+        A hex digest per geometry, or None where a geometry is missing
+    """
+    shapes = shapely.normalize(shapely.set_precision(list(shapes), grid))
+    digests = [None if wkb is None
+               else hashlib.blake2b(wkb, digest_size=16).hexdigest()
+               for wkb in shapely.to_wkb(shapes)]
+    return np.array(digests, dtype=object)
+
+
+def covering_area(shapes, tolerance: float = 0):
+    """Unions geometries into one polygon and simplifies it, without
+    uncovering any part of the original geometries.
+
+    The union is grown by the tolerance before a topology-preserving
+    simplify, so the simplified outline never cuts inside the original
+    boundary.
+
+    Parameters
+    ----------
+    shapes : list
+        The shapely geometries to cover
+    tolerance : float, optional
+        The maximum distance a simplified vertex may move, in the units
+        of the spatial reference, default 0 which skips simplifying
+
+    Returns
+    -------
+    shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+        A polygon that covers every input geometry
+    """
+    area = union(shapes)
+    if tolerance:
+        area = shapely.simplify(area.buffer(tolerance), tolerance,
+                                preserve_topology=True)
+    return area
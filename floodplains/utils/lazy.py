@@ -0,0 +1,40 @@
+import importlib.util
+import sys
+import types
+
+
+class _Missing(types.ModuleType):
+    """Stands in for a package that isn't installed, raising the import
+    error only when the package is actually used."""
+
+    def __getattr__(self, attr):
+        raise ModuleNotFoundError(f"No module named '{self.__name__}'",
+                                  name=self.__name__)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Imports a package without running it until one of its attributes
+    is used, so packages that are slow to import (e.g. arcpy) only cost
+    time on the code paths that need them.
+
+    Parameters
+    ----------
+    name : str
+        The name of the package
+
+    Returns
+    -------
+    module
+        The package, loaded on first attribute access
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return _Missing(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
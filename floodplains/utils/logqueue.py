@@ -0,0 +1,128 @@
+import atexit
+import email.utils
+import logging
+import logging.handlers
+import queue
+import smtplib
+import threading
+from email.message import EmailMessage
+
+# The logger whose handlers write every record, on the listener's thread
+SINK = "floodplains.log"
+
+_queue = queue.SimpleQueue()
+_listener = None
+
+
+class CoalescingSMTPHandler(logging.handlers.SMTPHandler):
+    """An SMTPHandler that sends every record logged within a window of
+    time as a single email, rather than one email per record.
+
+    The window starts with the first record, so an error is never held
+    back longer than the window. Any records still held are sent when
+    the handler is flushed or closed.
+
+    Parameters
+    ----------
+    window : float, optional
+        Seconds to wait for more records before sending, default 60
+
+    Other parameters are those of logging.handlers.SMTPHandler.
+    """
+
+    def __init__(self, *args, window: float = 60, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.window = window
+        self.buffer = []
+        self.timer = None
+
+    def emit(self, record):
+        self.buffer.append(record)
+        if self.timer is None:
+            self.timer = threading.Timer(self.window, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            records, self.buffer = self.buffer, []
+        finally:
+            self.release()
+        if records:
+            self.send(records)
+
+    def close(self):
+        self.flush()
+        super().close()
+
+    def send(self, records: list) -> None:
+        """Sends records as one email.
+
+        Parameters
+        ----------
+        records : list
+            The log records to send, oldest first
+        """
+        subject = self.getSubject(records[0])
+        if len(records) > 1:
+            subject += f" ({len(records)} messages)"
+        msg = EmailMessage()
+        msg["From"] = self.fromaddr
+        msg["To"] = ",".join(self.toaddrs)
+        msg["Subject"] = subject
+        msg["Date"] = email.utils.localtime()
+        msg.set_content("\n\n".join(self.format(r) for r in records))
+        try:
+            port = self.mailport or smtplib.SMTP_PORT
+            with smtplib.SMTP(self.mailhost, port,
+                              timeout=self.timeout) as smtp:
+                if self.username:
+                    if self.secure is not None:
+                        smtp.ehlo()
+                        smtp.starttls(*self.secure)
+                        smtp.ehlo()
+                    smtp.login(self.username, self.password)
+                smtp.send_message(msg)
+        except Exception:
+            self.handleError(records[-1])
+
+
+def queue_handler() -> logging.handlers.QueueHandler:
+    """Creates a handler that puts records on the queue read by the
+    listener, for use as a handler factory in the logging config."""
+    return logging.handlers.QueueHandler(_queue)
+
+
+def start() -> logging.handlers.QueueListener:
+    """Starts writing queued records with the handlers of the SINK
+    logger on a background thread, and stops it when Python exits.
+
+    Returns
+    -------
+    logging.handlers.QueueListener
+        The listener, already running
+    """
+    global _listener
+    stop()
+    handlers = logging.getLogger(SINK).handlers
+    _listener = logging.handlers.QueueListener(_queue, *handlers,
+                                               respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def stop() -> None:
+    """Writes every queued record and flushes the handlers, including
+    any emails held by a CoalescingSMTPHandler."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.flush()
+    _listener = None
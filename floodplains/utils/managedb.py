@@ -1,8 +1,10 @@
 import os
 
-import arcpy
-from arcpy import ClearWorkspaceCache_management
 import floodplains.config as config
+from floodplains.utils.lazy import lazy_import
+
+# Only imported once a version is managed
+arcpy = lazy_import("arcpy")
 
 log = config.logging.getLogger(__name__)
 
@@ -21,7 +23,7 @@ def clear_cache(func):
     """
     def wrapper(*args, **kwargs):
         log.debug("Clearing workspace cache...")
-        ClearWorkspaceCache_management()
+        arcpy.ClearWorkspaceCache_management()
         value = func(*args, **kwargs)
         return value
     return wrapper
@@ -0,0 +1,211 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+
+def peak_rss() -> int:
+    """Reads the peak resident memory of this process.
+
+    Returns
+    -------
+    int
+        The most memory the process has held at once, in bytes, or 0
+        if the platform doesn't report it
+    """
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD),
+                        ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+                process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+        return 0
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Metrics:
+    """Measurements of one run of the ETL, split into stages.
+
+    Every stage records its wall time, the number of REST requests and
+    bytes received while it was the innermost stage running, counts of
+    features in and out, and the peak memory of the process when it
+    finished.
+
+    Parameters
+    ----------
+    run_id : str, optional
+        The identifier of the run, defaults to the start time
+    """
+
+    def __init__(self, run_id: str = None):
+        self.started = datetime.now()
+        self.run_id = run_id or self.started.strftime("%Y%m%dT%H%M%S")
+        self.stages = []
+        self._active = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Measures the code run inside the context as one stage.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage, e.g. "step03_lomrs"
+
+        Yields
+        ------
+        dict
+            The stage's record, where "features_in" and "features_out"
+            can be set
+        """
+        record = {"stage": name, "seconds": None, "requests": 0,
+                  "bytes": 0, "features_in": None, "features_out": None,
+                  "peak_rss": None, "error": None}
+        with self._lock:
+            self.stages.append(record)
+            self._active.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 3)
+            record["peak_rss"] = peak_rss()
+            with self._lock:
+                self._active.remove(record)
+
+    def record_request(self, nbytes: int) -> None:
+        """Adds a REST request to the innermost stage running, from any
+        thread."""
+        with self._lock:
+            if self._active:
+                self._active[-1]["requests"] += 1
+                self._active[-1]["bytes"] += nbytes
+
+    def to_dict(self) -> dict:
+        """Summarizes the run as a JSON serializable dict."""
+        return {"run_id": self.run_id,
+                "started": self.started.isoformat(timespec="seconds"),
+                "seconds": round(sum(s["seconds"] or 0
+                                     for s in self.stages), 3),
+                "requests": sum(s["requests"] for s in self.stages),
+                "bytes": sum(s["bytes"] for s in self.stages),
+                "peak_rss": peak_rss(),
+                "stages": self.stages}
+
+    def write_json(self, path: str) -> None:
+        """Appends the run to a file of JSON records, one per line."""
+        _make_folder(path)
+        with open(path, "a") as f:
+            f.write(json.dumps(self.to_dict()) + "\n")
+
+    def write_prometheus(self, path: str) -> None:
+        """Writes the run in the Prometheus text format, for the node
+        exporter's textfile collector.
+
+        The file is replaced atomically, so the collector never reads
+        half a run."""
+        lines = []
+        metrics = [("seconds", "Wall time of the stage in seconds"),
+                   ("requests", "REST requests made during the stage"),
+                   ("bytes", "Bytes received from REST requests"),
+                   ("features_in", "Features going into the stage"),
+                   ("features_out", "Features coming out of the stage"),
+                   ("peak_rss", "Peak resident memory in bytes")]
+        for key, description in metrics:
+            name = f"floodplains_stage_{key}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for s in self.stages:
+                if s[key] is not None:
+                    lines.append(f'{name}{{stage="{s["stage"]}"}} {s[key]}')
+        totals = self.to_dict()
+        for key, description in [("requests", "REST requests in the run"),
+                                 ("bytes", "Bytes received in the run")]:
+            name = f"floodplains_run_{key}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {totals[key]}")
+        lines.append("# HELP floodplains_last_run_timestamp_seconds "
+                     "Start time of the last run")
+        lines.append("# TYPE floodplains_last_run_timestamp_seconds gauge")
+        lines.append("floodplains_last_run_timestamp_seconds "
+                     f"{self.started.timestamp():.0f}")
+
+        _make_folder(path)
+        temp = f"{path}.tmp"
+        with open(temp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp, path)
+
+
+def _make_folder(path: str) -> None:
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+
+
+# The run every stage and request is recorded in
+run = Metrics()
+
+
+def start_run(run_id: str = None) -> Metrics:
+    """Starts recording a new run, replacing the current one."""
+    global run
+    run = Metrics(run_id)
+    return run
+
+
+def stage(name: str):
+    """Measures a stage of the current run, see Metrics.stage."""
+    return run.stage(name)
+
+
+def timed(name: str):
+    """Decorates a function so that every call is measured as a stage
+    of the current run.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with run.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_request(nbytes: int) -> None:
+    """Adds a REST request to the current run."""
+    run.record_request(nbytes)
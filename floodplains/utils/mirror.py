@@ -0,0 +1,258 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from floodplains.utils import restquery
+from floodplains.utils.geometry import as_shapely
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS layers (
+    layer TEXT PRIMARY KEY,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS features (
+    layer TEXT NOT NULL,
+    objectid INTEGER NOT NULL,
+    eff_date INTEGER,
+    xmin REAL, ymin REAL, xmax REAL, ymax REAL,
+    feature TEXT NOT NULL,
+    PRIMARY KEY (layer, objectid)
+);
+CREATE INDEX IF NOT EXISTS features_bbox
+    ON features (layer, xmin, xmax, ymin, ymax);
+CREATE TABLE IF NOT EXISTS watermarks (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Opens the mirror database, creating it if it doesn't exist.
+
+    Parameters
+    ----------
+    path : str
+        The file path to the SQLite database, or ":memory:"
+
+    Returns
+    -------
+    sqlite3.Connection
+        A connection to the mirror
+    """
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def get_watermark(conn: sqlite3.Connection, key: str):
+    """Reads a watermark, or None if it has never been set."""
+    row = conn.execute("SELECT value FROM watermarks WHERE key = ?",
+                       (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(conn: sqlite3.Connection, key: str, value) -> None:
+    """Records a watermark, replacing any previous value."""
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?)",
+                     (key, None if value is None else str(value)))
+
+
+def get_cached(conn: sqlite3.Connection, key: str, version: str):
+    """Reads a cached JSON value, or None if it was never cached or was
+    cached for a different version of its source."""
+    row = conn.execute("SELECT value FROM cache WHERE key = ? AND "
+                       "version = ?", (key, str(version))).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def set_cached(conn: sqlite3.Connection, key: str, version: str,
+               value) -> None:
+    """Caches a JSON serializable value for a version of its source,
+    replacing any previous version."""
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                     (key, str(version), json.dumps(value)))
+
+
+def local_ids(conn: sqlite3.Connection, layer: str) -> set:
+    """Returns the objectIds of every feature mirrored for a layer."""
+    rows = conn.execute("SELECT objectid FROM features WHERE layer = ?",
+                        (layer,))
+    return {row[0] for row in rows}
+
+
+def store_features(conn: sqlite3.Connection, layer: str, feature_set: dict,
+                   date_field: str = None) -> int:
+    """Inserts or replaces features in the mirror.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        A connection to the mirror
+    layer : str
+        The name the layer is mirrored under (e.g. "lomr")
+    feature_set : dict
+        An ESRI JSON FeatureSet
+    date_field : str, optional
+        A date attribute that is indexed for incremental reads, default
+        None
+
+    Returns
+    -------
+    int
+        The number of features stored
+    """
+    oid_field = feature_set.get("objectIdFieldName", "OBJECTID")
+    metadata = {k: v for k, v in feature_set.items() if k != "features"}
+    rows = []
+    for feature in feature_set["features"]:
+        attributes = feature["attributes"]
+        bounds = [None] * 4
+        if feature.get("geometry"):
+            bounds = as_shapely(feature["geometry"]).bounds
+        rows.append((layer, attributes[oid_field],
+                     attributes.get(date_field) if date_field else None,
+                     *bounds, json.dumps(feature)))
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO layers VALUES (?, ?)",
+                     (layer, json.dumps(metadata)))
+        conn.executemany("INSERT OR REPLACE INTO features "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def delete_features(conn: sqlite3.Connection, layer: str, ids) -> None:
+    """Removes features from the mirror by objectId."""
+    with conn:
+        conn.executemany("DELETE FROM features WHERE layer = ? "
+                         "AND objectid = ?", [(layer, i) for i in ids])
+
+
+def read_layer(conn: sqlite3.Connection, layer: str, after: int = None,
+               bbox: tuple = None) -> dict:
+    """Reads mirrored features back into an ESRI JSON FeatureSet.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        A connection to the mirror
+    layer : str
+        The name the layer is mirrored under (e.g. "lomr")
+    after : int, optional
+        Only return features whose date field (in epoch milliseconds)
+        is later than this, default None
+    bbox : tuple, optional
+        Only return features whose envelopes intersect this
+        (xmin, ymin, xmax, ymax) box, default None
+
+    Returns
+    -------
+    dict
+        An ESRI JSON FeatureSet that can be read with
+        arcgis.features.FeatureSet.from_dict
+    """
+    row = conn.execute("SELECT metadata FROM layers WHERE layer = ?",
+                       (layer,)).fetchone()
+    feature_set = json.loads(row[0]) if row else {}
+
+    sql = "SELECT feature FROM features WHERE layer = ?"
+    args = [layer]
+    if after is not None:
+        sql += " AND eff_date > ?"
+        args.append(after)
+    if bbox is not None:
+        sql += " AND xmax >= ? AND xmin <= ? AND ymax >= ? AND ymin <= ?"
+        args.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+    sql += " ORDER BY objectid"
+    feature_set["features"] = [json.loads(r[0])
+                               for r in conn.execute(sql, args)]
+    return feature_set
+
+
+def sync_layer(conn: sqlite3.Connection, layer: str, url: str,
+               date_field: str = None, session=None, refresh: dict = None,
+               **kwargs) -> dict:
+    """Brings the mirror of a layer up to date with its REST endpoint.
+
+    Only the objectIds matching the query are requested from the
+    server. Features that are no longer returned are deleted, and
+    features that aren't mirrored yet are downloaded. Features that may
+    have been edited in place are downloaded again: those dated on or
+    after the last synced date if a date field is supplied, otherwise
+    every feature within the refresh filter.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        A connection to the mirror
+    layer : str
+        The name the layer is mirrored under (e.g. "lomr")
+    url : str
+        The url of a feature or map service layer
+    date_field : str, optional
+        A date attribute, in epoch milliseconds, used as a watermark
+        for incremental syncs, default None
+    session : requests.Session, optional
+        The session used to make every request, default None
+    refresh : dict, optional
+        A spatial filter from restquery.intersects, used in place of any
+        geometry_filter to find the features to download again when
+        there's no date field. Defaults to None, which downloads every
+        feature again
+    **kwargs
+        Arguments passed on to restquery.query_params (e.g. where,
+        out_fields, out_sr). Any out_fields must include the layer's
+        ObjectID field, which features are mirrored by
+
+    Returns
+    -------
+    dict
+        Counts of the features "added", "updated" and "deleted"
+    """
+    params = restquery.query_params(**kwargs)
+    remote = set(restquery.query_ids(url, params, session))
+    mirrored = local_ids(conn, layer)
+    stale = mirrored - remote
+    missing = remote - mirrored
+
+    # Refetch features dated on or after the watermark in case they
+    # changed. Without a date, edits can't be told apart, so every
+    # feature that is read is refetched
+    changed = set()
+    watermark = get_watermark(conn, f"{layer}.{date_field}")
+    if date_field and watermark:
+        day = datetime.fromtimestamp(int(watermark)/1000)
+        recent = {**params,
+                  "where": f"({params['where']}) AND {date_field} >= "
+                           f"'{day:%Y-%m-%d}'"}
+        changed = set(restquery.query_ids(url, recent, session)) & mirrored
+    elif not date_field:
+        recent = params
+        if refresh:
+            recent = restquery.query_params(
+                **{**kwargs, "geometry_filter": refresh})
+        changed = set(restquery.query_ids(url, recent, session)) & mirrored
+
+    delete_features(conn, layer, stale)
+    for chunk in restquery.fetch_ids(url, sorted(missing | changed), params,
+                                     session):
+        store_features(conn, layer, chunk, date_field)
+
+    if date_field:
+        latest = conn.execute("SELECT MAX(eff_date) FROM features "
+                              "WHERE layer = ?", (layer,)).fetchone()[0]
+        set_watermark(conn, f"{layer}.{date_field}", latest)
+
+    return {"added": len(missing), "updated": len(changed),
+            "deleted": len(stale)}
@@ -0,0 +1,237 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
+
+from floodplains.utils.geometry import union
+from floodplains.utils.spatialindex import PolygonIndex, match_contained
+
+# The index each worker process builds once, rather than once per task
+_index = None
+
+
+def tile_keys(shapes, tiles: int) -> np.ndarray:
+    """Assigns every geometry to a square tile of a grid laid over all
+    of them, by the center of its envelope.
+
+    Parameters
+    ----------
+    shapes : list
+        The shapely geometries to assign
+    tiles : int
+        The approximate number of tiles in the grid
+
+    Returns
+    -------
+    numpy.ndarray
+        A tile number per geometry, numbered row by row from the lower
+        left
+    """
+    bounds = shapely.bounds(np.asarray(shapes, dtype=object))
+    if len(bounds) == 0:
+        return np.zeros(0, dtype=int)
+    x = (bounds[:, 0] + bounds[:, 2]) / 2
+    y = (bounds[:, 1] + bounds[:, 3]) / 2
+    side = max(1, math.ceil(math.sqrt(tiles)))
+    width = max(x.max() - x.min(), y.max() - y.min()) / side or 1
+    col = np.minimum(((x - x.min()) // width).astype(int), side - 1)
+    row = np.minimum(((y - y.min()) // width).astype(int), side - 1)
+    return row * side + col
+
+
+def split(keys) -> list:
+    """Groups positions by key, in key order and then position order, so
+    the same keys always give the same partitions.
+
+    Parameters
+    ----------
+    keys : numpy.ndarray
+        A partition key per item
+
+    Returns
+    -------
+    list
+        One numpy.ndarray of positions per distinct key
+    """
+    keys = np.asarray(keys)
+    order = np.argsort(keys, kind="stable")
+    _, starts = np.unique(keys[order], return_index=True)
+    return np.split(order, starts[1:])
+
+
+def workers_for(workers: int = None) -> int:
+    """The number of processes to use, defaulting to every core."""
+    return max(1, workers or os.cpu_count() or 1)
+
+
+def pool_map(func, tasks: list, workers: int = None, initializer=None,
+             initargs: tuple = ()) -> list:
+    """Runs a function over tasks in a process pool, returning results
+    in task order. Runs in this process when there's one worker or one
+    task, which avoids starting a pool for small inputs.
+
+    Parameters
+    ----------
+    func : callable
+        A module level function, so it can be sent to other processes
+    tasks : list
+        The argument for each call
+    workers : int, optional
+        The number of processes, defaults to every core
+    initializer : callable, optional
+        A module level function run once in each process, default None
+    initargs : tuple, optional
+        Arguments for the initializer, default ()
+
+    Returns
+    -------
+    list
+        The result of each call, in the same order as the tasks
+    """
+    workers = min(workers_for(workers), len(tasks))
+    if workers <= 1:
+        if initializer:
+            initializer(*initargs)
+        return [func(task) for task in tasks]
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(workers, initializer=initializer,
+                             initargs=initargs) as pool:
+        return list(pool.map(func, tasks, chunksize=chunksize))
+
+
+def _build_index(polygons):
+    global _index
+    _index = PolygonIndex(polygons)
+
+
+def _locate_tile(shapes):
+    return _index.locate(shapely.point_on_surface(shapes))
+
+
+def _contained_group(boundaries):
+    boundaries, buffer = boundaries
+    return match_contained(boundaries, _index, buffer)
+
+
+def contained(boundaries, shapes, buffer: float = 0,
+              workers: int = None) -> list:
+    """Matches every boundary to the geometries it contains, with the
+    boundaries split into groups spread across processes.
+
+    Each process indexes the geometries once, then tests a contiguous
+    group of boundaries against it.
+
+    Parameters
+    ----------
+    boundaries : list
+        The shapely boundaries, e.g. one per LOMR
+    shapes : list
+        The shapely geometries to test against each boundary
+    buffer : float, optional
+        Distance used to grow each boundary before testing, default 0
+    workers : int, optional
+        The number of processes, defaults to every core
+
+    Returns
+    -------
+    list
+        One numpy.ndarray of positions per boundary, in the same order
+        as the boundaries
+    """
+    boundaries = list(boundaries)
+    workers = min(workers_for(workers), max(1, len(boundaries)))
+    groups = np.array_split(np.arange(len(boundaries)), workers)
+    tasks = [([boundaries[i] for i in g], buffer) for g in groups]
+    results = pool_map(_contained_group, tasks, workers, _build_index,
+                       (list(shapes),))
+    return [m for matches in results for m in matches]
+
+
+def locate(shapes, polygons, workers: int = None,
+           tiles_per_worker: int = 4) -> np.ndarray:
+    """Finds the first polygon that contains a representative point of
+    every geometry, with the work split into spatial tiles and spread
+    across processes.
+
+    Each process indexes the polygons once. Geometries are grouped by
+    tile so each process queries a compact part of the index.
+
+    Parameters
+    ----------
+    shapes : list
+        The shapely geometries to locate
+    polygons : list
+        The shapely polygons to locate them in
+    workers : int, optional
+        The number of processes, defaults to every core
+    tiles_per_worker : int, optional
+        Tiles per process, which evens out tiles with more geometries,
+        default 4
+
+    Returns
+    -------
+    numpy.ndarray
+        For every geometry, the position of the first polygon containing
+        its representative point, or -1 if none contains it
+    """
+    shapes = np.asarray(shapes, dtype=object)
+    workers = workers_for(workers)
+    tiles = 1 if workers == 1 else workers * tiles_per_worker
+    parts = split(tile_keys(shapes, tiles))
+    results = pool_map(_locate_tile, [shapes[p] for p in parts], workers,
+                       _build_index, (list(polygons),))
+    found = np.full(len(shapes), -1)
+    for positions, result in zip(parts, results):
+        found[positions] = result
+    return found
+
+
+def dissolve(groups: list, workers: int = None,
+             tiles_per_worker: int = 4) -> list:
+    """Unions each group of geometries, with the unions split into
+    spatial tiles and spread across processes.
+
+    Every group is cut into tiles by the geometries' positions, and
+    each tile of each group is unioned separately. The tile unions of a
+    group are then unioned together, which stitches polygons back
+    together where they cross a seam between tiles.
+
+    Parameters
+    ----------
+    groups : list
+        One list of shapely geometries per group
+    workers : int, optional
+        The number of processes, defaults to every core
+    tiles_per_worker : int, optional
+        Tiles per process, default 4
+
+    Returns
+    -------
+    list
+        The dissolved geometry of each group, in the same order as the
+        groups
+    """
+    workers = workers_for(workers)
+    groups = [np.asarray(list(g), dtype=object) for g in groups]
+    everything = np.concatenate(groups) if groups else []
+    # A single process unions each group whole, as there's nothing to
+    # gain from stitching tiles back together
+    tiles = 1 if workers == 1 else workers * tiles_per_worker
+    keys = tile_keys(everything, tiles)
+
+    # Tasks are ordered by group, then tile, so the merge is repeatable
+    tasks, owners = [], []
+    start = 0
+    for g, shapes in enumerate(groups):
+        for part in split(keys[start:start + len(shapes)]):
+            tasks.append(shapes[part])
+            owners.append(g)
+        start += len(shapes)
+    partials = pool_map(union, tasks, workers)
+
+    pieces = [[] for _ in groups]
+    for g, partial in zip(owners, partials):
+        pieces[g].append(partial)
+    return [p[0] if len(p) == 1 else union(p) for p in pieces]
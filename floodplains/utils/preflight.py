@@ -0,0 +1,110 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from floodplains.utils import metrics
+
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    """Creates an HTTP session that keeps a pool of open connections
+    per host, so every request after the first one to a server skips
+    the TCP and TLS handshakes.
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        The maximum number of connections kept open per host, default
+        10
+
+    Returns
+    -------
+    requests.Session
+        A session to share between every stage of the ETL
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def probe(session: requests.Session, url: str, timeout: float) -> dict:
+    """Checks whether a single REST endpoint is online.
+
+    Parameters
+    ----------
+    session : requests.Session
+        The session used to make the request
+    url : str
+        The url of the REST endpoint
+    timeout : float
+        Seconds to wait for the server
+
+    Returns
+    -------
+    dict
+        The "url", whether it's "online", its HTTP "status", the
+        "latency" in seconds and any "error" raised by the request
+    """
+    result = {"url": url, "online": False, "status": None, "latency": None,
+              "error": None}
+    start = time.perf_counter()
+    nbytes = 0
+    try:
+        response = session.get(url, params={"f": "pjson"}, timeout=timeout)
+        nbytes = len(response.content)
+        result["status"] = response.status_code
+        result["online"] = response.status_code == 200
+    except requests.RequestException as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["latency"] = round(time.perf_counter() - start, 3)
+    metrics.record_request(nbytes)
+    return result
+
+
+def check_endpoints(urls, session: requests.Session = None,
+                    timeout: float = 30) -> list:
+    """Checks whether REST endpoints are online, probing all of them at
+    the same time.
+
+    Parameters
+    ----------
+    urls : list
+        The urls of the REST endpoints
+    session : requests.Session, optional
+        The session used to make every request, default None
+    timeout : float, optional
+        Seconds to wait for each server, default 30
+
+    Returns
+    -------
+    list
+        A report from probe for every url, in the same order as urls
+    """
+    urls = list(urls)
+    session = session or create_session()
+    with ThreadPoolExecutor(max_workers=max(1, len(urls))) as pool:
+        return list(pool.map(lambda u: probe(session, u, timeout), urls))
+
+
+def describe(report: list) -> list:
+    """Describes every endpoint in a report in one line of text.
+
+    Parameters
+    ----------
+    report : list
+        A report created by check_endpoints
+
+    Returns
+    -------
+    list
+        One description per endpoint
+    """
+    lines = []
+    for r in report:
+        state = "online" if r["online"] else "OFFLINE"
+        detail = r["error"] or f"HTTP {r['status']}"
+        lines.append(f"{r['url']}: {state} ({detail}, {r['latency']}s)")
+    return lines
@@ -0,0 +1,331 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from floodplains.utils import metrics
+
+# Parameters that select features, which are unnecessary once the
+# objectIds of the selected features are known
+_SELECTION = ["where", "geometry", "geometryType", "spatialRel", "inSR"]
+
+
+def query_params(where: str = "1=1", out_fields="*",
+                 geometry_filter: dict = None, out_sr: int = None,
+                 return_geometry: bool = True,
+                 datum_transformation: int = None) -> dict:
+    """Translates the arguments of an arcgis FeatureLayer.query call
+    into the parameters understood by a REST query endpoint.
+
+    Parameters
+    ----------
+    where : str, optional
+        Conditions used to restrict output, written in SQL syntax,
+        default "1=1"
+    out_fields : list or str, optional
+        The fields to return, default "*"
+    geometry_filter : dict, optional
+        A spatial filter created by the arcgis.geometry.filters module,
+        default None
+    out_sr : int, optional
+        The output spatial reference, default None
+    return_geometry : bool, optional
+        Whether to return geometries with each feature, default True
+    datum_transformation : int, optional
+        The well-known ID of a datum transformation, default None
+
+    Returns
+    -------
+    dict
+        Parameters for a POST to the layer's query endpoint
+    """
+    if not isinstance(out_fields, str):
+        out_fields = ",".join(out_fields)
+    params = {"where": where,
+              "outFields": out_fields,
+              "returnGeometry": str(return_geometry).lower()}
+    if out_sr is not None:
+        params["outSR"] = out_sr
+    if datum_transformation is not None:
+        params["datumTransformation"] = datum_transformation
+    if geometry_filter:
+        for key, value in geometry_filter.items():
+            if isinstance(value, dict):
+                value = json.dumps(value)
+            params[key] = value
+    return params
+
+
+def intersects(geometry: dict, sr: int) -> dict:
+    """Creates a spatial filter for the features intersecting a
+    geometry, like arcgis.geometry.filters.intersects.
+
+    Parameters
+    ----------
+    geometry : dict
+        An ESRI JSON polygon
+    sr : int
+        The spatial reference of the geometry
+
+    Returns
+    -------
+    dict
+        A filter understood by query_params
+    """
+    return {"geometry": geometry,
+            "geometryType": "esriGeometryPolygon",
+            "spatialRel": "esriSpatialRelIntersects",
+            "inSR": sr}
+
+
+def _request(session, url: str, params: dict, timeout: float,
+             method: str = "POST") -> dict:
+    """Sends a request to an ESRI REST endpoint and returns the JSON
+    response, raising on HTTP errors and on errors reported in the body
+    of a successful response."""
+    payload = "data" if method == "POST" else "params"
+    response = session.request(method, url, timeout=timeout,
+                               **{payload: {**params, "f": "json"}})
+    metrics.record_request(len(response.content))
+    response.raise_for_status()
+    result = response.json()
+    if "error" in result:
+        raise requests.HTTPError(
+            f"{url} returned an error: {result['error']}", response=response)
+    return result
+
+
+def layer_info(url: str, session=None, timeout: float = 60) -> dict:
+    """Reads the description of a feature or map service layer.
+
+    Parameters
+    ----------
+    url : str
+        The url of a feature or map service layer
+    session : requests.Session, optional
+        The session used to make the request, default None
+    timeout : float, optional
+        Seconds to wait for the server, default 60
+
+    Returns
+    -------
+    dict
+        The layer's JSON description
+    """
+    session = session or requests.Session()
+    return _request(session, url, {}, timeout, method="GET")
+
+
+def max_record_count(url: str, session=None, timeout: float = 60) -> int:
+    """Reads the maximum number of records a layer returns per request.
+
+    Parameters
+    ----------
+    url : str
+        The url of a feature or map service layer
+    session : requests.Session, optional
+        The session used to make the request, default None
+    timeout : float, optional
+        Seconds to wait for the server, default 60
+
+    Returns
+    -------
+    int
+        The layer's maxRecordCount, or 1000 if it is not advertised
+    """
+    layer = layer_info(url, session, timeout)
+    return layer.get("maxRecordCount") or 1000
+
+
+def query_ids(url: str, params: dict, session=None,
+              timeout: float = 60) -> list:
+    """Returns the sorted objectIds of the features matching a query.
+
+    Parameters
+    ----------
+    url : str
+        The url of a feature or map service layer
+    params : dict
+        Query parameters, as created by query_params
+    session : requests.Session, optional
+        The session used to make the request, default None
+    timeout : float, optional
+        Seconds to wait for the server, default 60
+
+    Returns
+    -------
+    list
+        The objectIds of every matching feature
+    """
+    session = session or requests.Session()
+    result = _request(session, f"{url}/query",
+                      {**params, "returnIdsOnly": "true"}, timeout)
+    return sorted(result.get("objectIds") or [])
+
+
+def fetch_ids(url: str, ids: list, params: dict, session=None,
+              chunk_size: int = None, max_workers: int = 4,
+              timeout: float = 60):
+    """Fetches features by objectId in chunks that are requested
+    concurrently, yielding each chunk in order as soon as it and every
+    chunk before it have arrived.
+
+    Parameters
+    ----------
+    url : str
+        The url of a feature or map service layer
+    ids : list
+        The objectIds of the features to fetch
+    params : dict
+        Query parameters, as created by query_params. Parameters that
+        select features (e.g. where, geometry) are not resent.
+    session : requests.Session, optional
+        The session used to make every request, default None
+    chunk_size : int, optional
+        The number of objectIds per request, defaults to the layer's
+        maxRecordCount
+    max_workers : int, optional
+        The maximum number of concurrent requests, default 4
+    timeout : float, optional
+        Seconds to wait for the server per request, default 60
+
+    Yields
+    ------
+    dict
+        An ESRI JSON FeatureSet for every chunk of objectIds
+    """
+    if not ids:
+        return
+    session = session or requests.Session()
+    chunk_size = chunk_size or max_record_count(url, session, timeout)
+
+    fetch = {k: v for k, v in params.items() if k not in _SELECTION}
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_request, session, f"{url}/query",
+                               {**fetch, "objectIds": ",".join(map(str, c))},
+                               timeout)
+                   for c in chunks]
+        for future in futures:
+            yield future.result()
+
+
+def query_statistics(url: str, statistics: list, where: str = "1=1",
+                     session=None, timeout: float = 60) -> dict:
+    """Asks the server to summarize the features matching a query, so
+    only the summary comes over the wire.
+
+    Parameters
+    ----------
+    url : str
+        The url of a feature or map service layer
+    statistics : list
+        (statistic type, field) pairs, e.g. [("max", "CREATED_DATE")]
+    where : str, optional
+        Conditions used to restrict the features summarized, written in
+        SQL syntax, default "1=1"
+    session : requests.Session, optional
+        The session used to make the request, default None
+    timeout : float, optional
+        Seconds to wait for the server, default 60
+
+    Returns
+    -------
+    dict
+        The statistics, keyed by type and field (e.g. MAX_CREATED_DATE)
+
+    Raises
+    ------
+    requests.HTTPError
+        If the layer doesn't support statistics queries
+    """
+    session = session or requests.Session()
+    out = [{"statisticType": stat,
+            "onStatisticField": field,
+            "outStatisticFieldName": f"{stat}_{field}".upper()}
+           for stat, field in statistics]
+    result = _request(session, f"{url}/query",
+                      {"where": where,
+                       "outStatistics": json.dumps(out),
+                       "returnGeometry": "false"}, timeout)
+    features = result.get("features") or [{"attributes": {}}]
+    # Some servers change the case of output field names
+    return {k.upper(): v for k, v in features[0]["attributes"].items()}
+
+
+def iter_chunks(url: str, params: dict, session=None,
+                chunk_size: int = None, max_workers: int = 4,
+                timeout: float = 60):
+    """Queries a layer in chunks of objectIds that are fetched
+    concurrently, yielding each chunk in order as soon as it and every
+    chunk before it have arrived.
+
+    Parameters
+    ----------
+    url : str
+        The url of a feature or map service layer
+    params : dict
+        Query parameters, as created by query_params
+    session : requests.Session, optional
+        The session used to make every request, default None
+    chunk_size : int, optional
+        The number of objectIds per request, defaults to the layer's
+        maxRecordCount
+    max_workers : int, optional
+        The maximum number of concurrent requests, default 4
+    timeout : float, optional
+        Seconds to wait for the server per request, default 60
+
+    Yields
+    ------
+    dict
+        An ESRI JSON FeatureSet for every chunk of objectIds
+    """
+    session = session or requests.Session()
+    ids = query_ids(url, params, session, timeout)
+    yield from fetch_ids(url, ids, params, session, chunk_size, max_workers,
+                         timeout)
+
+
+def query(url: str, session=None, chunk_size: int = None,
+          max_workers: int = 4, timeout: float = 60, **kwargs) -> dict:
+    """Queries every feature matching the supplied arguments, regardless
+    of the server's maxRecordCount.
+
+    Parameters
+    ----------
+    url : str
+        The url of a feature or map service layer
+    session : requests.Session, optional
+        The session used to make every request, default None
+    chunk_size : int, optional
+        The number of objectIds per request, defaults to the layer's
+        maxRecordCount
+    max_workers : int, optional
+        The maximum number of concurrent requests, default 4
+    timeout : float, optional
+        Seconds to wait for the server per request, default 60
+    **kwargs
+        Arguments passed on to query_params
+
+    Returns
+    -------
+    dict
+        An ESRI JSON FeatureSet that can be read with
+        arcgis.features.FeatureSet.from_dict
+    """
+    session = session or requests.Session()
+    params = query_params(**kwargs)
+
+    merged = None
+    for chunk in iter_chunks(url, params, session, chunk_size, max_workers,
+                             timeout):
+        if merged is None:
+            merged = chunk
+        else:
+            merged["features"].extend(chunk["features"])
+
+    # Nothing matched, make a regular query so the schema is still returned
+    if merged is None:
+        merged = _request(session, f"{url}/query", params, timeout)
+    return merged
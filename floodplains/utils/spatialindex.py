@@ -0,0 +1,126 @@
+import numpy as np
+import shapely
+
+
+class PolygonIndex:
+    """A packed (Sort-Tile-Recursive) R-tree built once over a fixed
+    set of shapely geometries.
+
+    Queries return integer positions into the sequence of geometries
+    the index was built from, sorted in their original order.
+
+    Parameters
+    ----------
+    geometries : list
+        The shapely geometries to index
+    """
+
+    def __init__(self, geometries):
+        self.geometries = np.asarray(geometries, dtype=object)
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def contained_by(self, boundary) -> np.ndarray:
+        """Finds the indexed geometries that lie completely inside a
+        boundary.
+
+        Parameters
+        ----------
+        boundary : shapely.geometry.base.BaseGeometry
+            The geometry in which to evaluate "insidedness"
+
+        Returns
+        -------
+        numpy.ndarray
+            Positions of the indexed geometries inside the boundary
+        """
+        shapely.prepare(boundary)
+        hits = self.tree.query(boundary, predicate="contains")
+        return np.sort(hits)
+
+    def locate(self, points) -> np.ndarray:
+        """Finds the first indexed geometry that contains each point.
+
+        Parameters
+        ----------
+        points : list
+            The shapely points to locate
+
+        Returns
+        -------
+        numpy.ndarray
+            For every point, the position of the first indexed geometry
+            containing it, or -1 if no geometry contains it
+        """
+        points = np.asarray(points, dtype=object)
+        found = np.full(len(points), -1)
+        inputs, hits = self.tree.query(points, predicate="within")
+        # Keep the lowest position per point, like a loop that stops at
+        # the first match
+        order = np.lexsort((hits, inputs))
+        inputs, hits = inputs[order], hits[order]
+        _, first = np.unique(inputs, return_index=True)
+        found[inputs[first]] = hits[first]
+        return found
+
+    def join(self, shapes, predicate: str = "intersects") -> tuple:
+        """Pairs geometries with every indexed geometry they relate to,
+        in one batched query.
+
+        Parameters
+        ----------
+        shapes : list
+            The shapely geometries to join
+        predicate : str, optional
+            "intersects" pairs a geometry with every indexed geometry it
+            overlaps or touches, "within" with those containing it
+            entirely, and "representative_point" with those containing a
+            point on its surface, default "intersects"
+
+        Returns
+        -------
+        tuple
+            (geometry positions, indexed positions) numpy.ndarrays with
+            one entry per pair, sorted by geometry and then by indexed
+            position
+        """
+        shapes = np.asarray(shapes, dtype=object)
+        if predicate == "representative_point":
+            shapes, predicate = shapely.point_on_surface(shapes), "within"
+        elif predicate not in ("intersects", "within"):
+            raise ValueError(f"Unsupported predicate: {predicate}")
+        inputs, hits = self.tree.query(shapes, predicate=predicate)
+        order = np.lexsort((hits, inputs))
+        return inputs[order], hits[order]
+
+
+def match_contained(boundaries, index: PolygonIndex,
+                    buffer: float = 0) -> list:
+    """Matches every boundary to the indexed geometries it contains.
+
+    Parameters
+    ----------
+    boundaries : list
+        The shapely boundaries in which to evaluate "insidedness"
+    index : PolygonIndex
+        The index of geometries to test against each boundary
+    buffer : float, optional
+        Distance used to grow each boundary before testing, which
+        avoids topological errors where geometries share an edge,
+        default 0
+
+    Returns
+    -------
+    list
+        One numpy.ndarray of positions per boundary, in the same order
+        as the boundaries
+    """
+    matches = []
+    for boundary in boundaries:
+        if buffer:
+            boundary = boundary.buffer(buffer)
+        matches.append(index.contained_by(boundary))
+    return matches
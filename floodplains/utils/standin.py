@@ -0,0 +1,269 @@
+"""Local stand-ins for ArcGIS REST map service layers and an SMTP
+server, shared by the unit tests and the benchmarks.
+
+The REST stand-in serves ESRI JSON FeatureSets under /<layer> for layer
+descriptions and /<layer>/query for queries. It understands enough of
+the query API for the ETL: returnIdsOnly, objectIds, outFields,
+intersects geometry filters and MAX outStatistics, and pages results at
+maxRecordCount. Where clauses are ignored, other than "1=0". ObjectIDs
+are listed newest first, as servers don't promise any order.
+
+The SMTP stand-in accepts any login and keeps every message it receives
+in memory, without STARTTLS.
+"""
+import json
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import shapely
+
+from floodplains.utils.geometry import as_shapely
+
+
+class Layer:
+    """A FeatureSet served by the stand-in, with an index of its
+    geometries for spatial filters.
+
+    Parameters
+    ----------
+    feature_set : dict
+        An ESRI JSON FeatureSet with an OBJECTID attribute per feature
+    max_records : int, optional
+        The most features returned by a single query, default 1000
+    """
+
+    def __init__(self, feature_set: dict, max_records: int = 1000):
+        self.feature_set = feature_set
+        self.features = feature_set["features"]
+        self.max_records = max_records
+        self.tree = shapely.STRtree(
+            [as_shapely(f["geometry"]) for f in self.features])
+
+    def select(self, params: dict) -> list:
+        """Returns the positions of the features a query selects."""
+        if params.get("where") == "1=0":
+            return []
+        if "geometry" in params:
+            shape = as_shapely(json.loads(params["geometry"]))
+            return sorted(self.tree.query(shape, predicate="intersects"))
+        return list(range(len(self.features)))
+
+    def query(self, params: dict) -> dict:
+        """Answers a query the way an ArcGIS REST layer does."""
+        selected = self.select(params)
+        if "objectIds" in params:
+            ids = np.array([int(i) for i in params["objectIds"].split(",")])
+            # OBJECTIDs are sequential from 1
+            selected = sorted(set(selected) & set(ids - 1))
+        features = [self.features[i] for i in selected]
+
+        if "outStatistics" in params:
+            stat = json.loads(params["outStatistics"])[0]
+            values = [f["attributes"][stat["onStatisticField"]]
+                      for f in features]
+            return {"features": [{"attributes": {
+                stat["outStatisticFieldName"]: max(values, default=None)}}]}
+        if params.get("returnIdsOnly") == "true":
+            return {"objectIdFieldName": "OBJECTID",
+                    "objectIds": [f["attributes"]["OBJECTID"]
+                                  for f in reversed(features)]}
+
+        fields = params.get("outFields", "*")
+        if fields != "*":
+            keep = set(fields.split(","))
+            features = [{"attributes": {k: v for k, v in
+                                        f["attributes"].items() if k in keep},
+                         "geometry": f["geometry"]} for f in features]
+        if params.get("returnGeometry") == "false":
+            features = [{"attributes": f["attributes"]} for f in features]
+        return {"objectIdFieldName": "OBJECTID",
+                "geometryType": self.feature_set["geometryType"],
+                "spatialReference": self.feature_set["spatialReference"],
+                "features": features[:self.max_records],
+                "exceededTransferLimit": len(features) > self.max_records}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes requests to the layers of the server they were sent to."""
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _layer(self, name: str):
+        layer = self.server.layers.get(name)
+        if layer is None:
+            self._reply({"error": {"code": 400, "message": "Invalid URL"}})
+        return layer
+
+    def _available(self) -> bool:
+        """Waits, then sends the server's error status if it has one."""
+        time.sleep(self.server.delay)
+        if self.server.status != 200:
+            self.send_error(self.server.status)
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._available():
+            return
+        layer = self._layer(urlparse(self.path).path.strip("/"))
+        if layer:
+            self._reply({"name": self.path.strip("/"),
+                         "geometryType": layer.feature_set["geometryType"],
+                         "maxRecordCount": layer.max_records})
+
+    def do_POST(self):
+        name = urlparse(self.path).path.strip("/").rsplit("/query", 1)[0]
+        length = int(self.headers["Content-Length"])
+        params = {k: v[0] for k, v in
+                  parse_qs(self.rfile.read(length).decode()).items()}
+        self.server.requests.append((name, params))
+        if not self._available():
+            return
+        layer = self._layer(name)
+        if layer:
+            self._reply(layer.query(params))
+
+
+@contextmanager
+def serve(layers: dict, max_records: int = 1000, delay: float = 0,
+          status: int = 200, requests: list = None):
+    """Serves FeatureSets from a local stand-in server for the duration
+    of the context.
+
+    Parameters
+    ----------
+    layers : dict
+        ESRI JSON FeatureSets keyed by the name they're served under
+    max_records : int, optional
+        The most features returned by a single query, default 1000
+    delay : float, optional
+        Seconds to wait before answering each request, to stand in for
+        a hung server, default 0
+    status : int, optional
+        The HTTP status of every response, where anything but 200 stands
+        in for a server that is down, default 200
+    requests : list, optional
+        A list that every query is appended to as a (layer name, params)
+        pair, default None
+
+    Yields
+    ------
+    str
+        The base url of the server, where each layer is at /<name>
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.layers = {name: Layer(fs, max_records)
+                     for name, fs in layers.items()}
+    server.delay, server.status = delay, status
+    server.requests = [] if requests is None else requests
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks enough SMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT,
+    DATA, RSET, NOOP and QUIT."""
+
+    def _reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        time.sleep(server.delay)
+        self._reply("220 stand-in ready")
+        envelope = {}
+        for raw in self.rfile:
+            command = raw.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250-stand-in")
+                self._reply("250 AUTH PLAIN")
+            elif verb == "AUTH":
+                with server.lock:
+                    server.logins += 1
+                self._reply("235 Authentication successful")
+            elif verb == "MAIL":
+                envelope = {"from": command.split(":", 1)[1].strip("<> "),
+                            "to": []}
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                envelope["to"].append(command.split(":", 1)[1].strip("<> "))
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for line in self.rfile:
+                    if line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line[1:] if line.startswith(b"..")
+                                 else line)
+                with server.lock:
+                    failing = server.failures > 0
+                    if failing:
+                        server.failures -= 1
+                    else:
+                        envelope["data"] = b"".join(lines).decode()
+                        server.messages.append(envelope)
+                self._reply("451 Try again later" if failing else "250 OK")
+                envelope = {}
+            elif verb in ("RSET", "NOOP"):
+                envelope = {}
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+@contextmanager
+def serve_smtp(delay: float = 0, failures: int = 0):
+    """Runs a local stand-in SMTP server for the duration of the
+    context.
+
+    Parameters
+    ----------
+    delay : float, optional
+        Seconds to wait before greeting each connection, to stand in for
+        a slow handshake, default 0
+    failures : int, optional
+        The number of messages to refuse with a temporary error before
+        accepting any, default 0
+
+    Yields
+    ------
+    socketserver.ThreadingTCPServer
+        The server, with its port in server_address, the messages it
+        received in messages, and counts of connections and logins
+    """
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.delay, server.failures = delay, failures
+    server.messages, server.connections, server.logins = [], 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+from shapely.geometry import box
+
+from floodplains.utils import checkpoint
+from floodplains.utils.checkpoint import Checkpoints, digest, frame_digest
+from floodplains.utils.geometry import as_esri, as_shapely
+
+
+class TestCheckpoints(unittest.TestCase):
+    """Class to test saving and resuming the outputs of stages.
+
+    A temporary checkpoint folder and a small spatial dataframe are set
+    up for each test."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        sr = {"wkid": 2876}
+        self.sdf = pd.DataFrame({
+            "FLD_ZONE": ["AE", "X", None],
+            "EFFDATE": pd.to_datetime(["2020-01-01", None, "2019-05-05"]),
+            "SHAPE": [as_esri(box(i, 0, i + 1, 1), sr) for i in range(3)]})
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_digests(self):
+        """Tests that keys change with inputs, not vertex order."""
+        reordered = self.sdf.copy()
+        reordered["SHAPE"] = [as_esri(as_shapely(g).reverse(), 2876)
+                              for g in self.sdf["SHAPE"]]
+        changed = self.sdf.copy()
+        changed.loc[1, "FLD_ZONE"] = "AO"
+        self.assertEqual(frame_digest(self.sdf), frame_digest(reordered))
+        self.assertNotEqual(frame_digest(self.sdf), frame_digest(changed))
+        self.assertNotEqual(digest("a", 1), digest("a", 2))
+
+    def test_resume(self):
+        """Tests that stages are only loaded for the same inputs."""
+        run = Checkpoints(self.folder.name)
+        run.save("extract", "k1", lomr={"features": []})
+        self.assertEqual(Checkpoints.latest(self.folder.name), run.run_id)
+
+        resumed = Checkpoints(self.folder.name, run.run_id)
+        self.assertTrue(resumed.completed("extract"))
+        self.assertEqual(resumed.load("extract", "k1"),
+                         {"lomr": {"features": []}})
+        self.assertIsNone(resumed.load("extract", "k2"))
+        self.assertIsNone(resumed.load("transform", "k1"))
+
+        resumed.finish()
+        self.assertIsNone(Checkpoints.latest(self.folder.name))
+
+    def test_frames(self):
+        """Tests that spatial dataframes round trip through Parquet."""
+        run = Checkpoints(self.folder.name)
+        run.save("transform", "k", dissolved=self.sdf)
+        result = Checkpoints(self.folder.name, run.run_id).load(
+            "transform", "k")["dissolved"]
+        self.assertEqual(frame_digest(result), frame_digest(self.sdf))
+        self.assertEqual(result["SHAPE"][0]["spatialReference"],
+                         {"wkid": 2876})
+        self.assertTrue(as_shapely(result["SHAPE"][2]).equals(box(2, 0, 3, 1)))
+
+    def test_unsaved(self):
+        """Tests that a stage that can't be written is left unsaved."""
+        run = Checkpoints(self.folder.name)
+        with mock.patch.object(checkpoint, "write_frame",
+                               side_effect=ImportError("No pyarrow")):
+            with self.assertLogs(checkpoint.log, "WARNING"):
+                run.save("transform", "k", dissolved=self.sdf)
+        self.assertFalse(run.completed("transform"))
+        self.assertIsNone(Checkpoints.latest(self.folder.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
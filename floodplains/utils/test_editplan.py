@@ -0,0 +1,123 @@
+import unittest
+from datetime import datetime
+
+from shapely import union_all
+from shapely.geometry import box
+
+from floodplains.utils.editplan import (SQLiteStore, detect_changes,
+                                        plan_edits)
+
+FIELDS = ["FLOODZONE", "DRAINAGE", "INEFFDATE", "SHAPE@"]
+WHERE = "INEFFDATE IS NULL AND (FLOODZONE LIKE 'A%' OR FLOODZONE = 'X')"
+
+
+class TestPlanEdits(unittest.TestCase):
+    """Class to test planning and applying edits for several LOMRs.
+
+    An in-memory floodplain table with three polygons is set up for
+    each test."""
+
+    def setUp(self):
+        self.store = SQLiteStore(":memory:", FIELDS)
+        self.store.load(FIELDS, [
+            ("AE", "Boulder Creek", None, box(0, 0, 10, 10)),
+            ("X", "Boulder Creek", None, box(20, 0, 30, 10)),
+            ("AE", "Goose Creek", datetime(2015, 1, 1), box(0, 0, 10, 10))])
+        self.lomrs = [(box(5, -5, 15, 15), datetime(2020, 6, 1)),
+                      (box(-5, -5, 3, 15), datetime(2019, 1, 1))]
+
+    def test_cuts(self):
+        """Tests that polygons crossing LOMRs are cut once per LOMR."""
+        plan = plan_edits(self.store.read(FIELDS, WHERE), self.lomrs, [],
+                          FIELDS)
+        self.assertEqual(plan.deletes, {1})
+        pieces = sorted((r[3].bounds, r[2]) for r in plan.inserts)
+        self.assertEqual(pieces, [((0, 0, 3, 10), datetime(2019, 1, 1)),
+                                  ((3, 0, 5, 10), None),
+                                  ((5, 0, 10, 10), datetime(2020, 6, 1))])
+
+    def test_touching_cut(self):
+        """Tests that cuts only keep polygons where a LOMR also touches
+        a polygon along a line."""
+        arms = union_all([box(0, 0, 10, 2), box(0, 0, 2, 10),
+                          box(8, 0, 10, 10)])
+        existing = [(4, ("AE", "Bear Creek", None, arms))]
+        lomrs = [(box(2, 5, 9, 12), datetime(2020, 6, 1))]
+        plan = plan_edits(existing, lomrs, [], FIELDS)
+        self.assertEqual(plan.deletes, {4})
+        self.assertEqual([(r[3].geom_type, r[2]) for r in plan.inserts],
+                         [("Polygon", datetime(2020, 6, 1)),
+                          ("Polygon", None)])
+        self.assertAlmostEqual(sum(r[3].area for r in plan.inserts),
+                               arms.area)
+
+    def test_inside(self):
+        """Tests that polygons fully inside a LOMR are updated in place."""
+        existing = [(4, ("AE", "Bear Creek", None, box(6, 1, 8, 3)))]
+        plan = plan_edits(existing, self.lomrs, [], FIELDS)
+        self.assertEqual(plan.deletes, set())
+        self.assertEqual(plan.inserts, [])
+        self.assertEqual(plan.updates,
+                         {4: {"INEFFDATE": datetime(2020, 6, 1)}})
+
+    def test_extent(self):
+        """Tests that reads skip polygons outside of the extent."""
+        oids = [oid for oid, _ in self.store.read(FIELDS, WHERE,
+                                                  box(-5, -5, 15, 15))]
+        self.assertEqual(oids, [1])
+
+    def test_inserts(self):
+        """Tests that new polygons are inserted once, inside any LOMR."""
+        records = [("AO1", None, None, box(6, 1, 8, 3)),
+                   ("AE", None, None, box(40, 40, 41, 41))]
+        plan = plan_edits([], self.lomrs, records, FIELDS)
+        self.assertEqual([r[0] for r in plan.inserts], ["AO1"])
+
+    def test_chunked_inserts(self):
+        """Tests that records streamed in chunks keep their order."""
+        records = [(f"A{i}", None, None, box(i, 1, i + 1, 2))
+                   for i in range(-10, 20)]
+        plan = plan_edits([], self.lomrs, iter(records), FIELDS,
+                          chunk_size=7)
+        self.assertEqual([r[0] for r in plan.inserts],
+                         [f"A{i}" for i in range(-5, 15) if i not in (3, 4)])
+
+    def test_apply(self):
+        """Tests that a plan is applied to the store."""
+        records = [("AO1", None, None, box(6, 1, 8, 3))]
+        plan = plan_edits(self.store.read(FIELDS, WHERE), self.lomrs,
+                          records, FIELDS)
+        self.store.apply(plan, FIELDS)
+        rows = [row for _, row in self.store.read(FIELDS)]
+        self.assertEqual(len(rows), 6)
+        active = [row[0] for _, row in self.store.read(FIELDS, WHERE)]
+        self.assertEqual(sorted(active), ["AE", "AO1", "X"])
+
+    def test_changes(self):
+        """Tests that polygons the city already has aren't loaded again,
+        even when the geodatabase moved their vertices slightly."""
+        existing = list(self.store.read(FIELDS, WHERE))
+        records = [("AE", "Boulder Creek", None, box(0, 0, 10, 10).reverse()),
+                   ("AE", "Bear Creek", None,
+                    box(20.0004, 0, 30, 10.0007)),
+                   ("AO1", None, None, box(6, 1, 8, 3)),
+                   ("X", "Boulder Creek", None, box(20, 0, 30, 10.1))]
+        changes = detect_changes(existing, iter(records), FIELDS,
+                                 chunk_size=3)
+        self.assertEqual(changes.rows, 4)
+        self.assertEqual(changes.matched, {0, 1})
+        self.assertEqual(changes.unchanged, {1})
+        self.assertEqual(changes.updates,
+                         {2: {"FLOODZONE": "AE", "DRAINAGE": "Bear Creek"}})
+        inserts = list(changes.inserts(records))
+        self.assertEqual([r[0] for r in inserts], ["AO1", "X"])
+
+        plan = plan_edits(self.store.read(FIELDS, WHERE), self.lomrs,
+                          changes.inserts(records), FIELDS, changes=changes)
+        self.assertEqual(plan.deletes, set())
+        self.assertEqual(plan.updates, changes.updates)
+        self.assertEqual([r[0] for r in plan.inserts], ["AO1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import base64
+import os
+import smtplib
+import tempfile
+import unittest
+
+from floodplains.utils.email import Mailer, attachment, send_email
+from floodplains.utils.standin import serve_smtp
+
+
+class TestMailer(unittest.TestCase):
+    """Class to test batched sending over one connection.
+
+    Messages are sent to a local stand-in SMTP server, without STARTTLS
+    and with no wait between retries."""
+
+    def mailer(self, server):
+        return Mailer("etl@test", "pw", host="127.0.0.1",
+                      port=server.server_address[1], starttls=False,
+                      backoff=0)
+
+    def test_batch(self):
+        """Tests that a batch shares one authenticated connection."""
+        with serve_smtp() as server:
+            with self.mailer(server) as mailer:
+                for i in range(3):
+                    mailer.queue(["steward@test"], f"Update {i}")
+                self.assertEqual(server.connections, 0)
+            self.assertEqual(len(server.messages), 3)
+            self.assertEqual((server.connections, server.logins), (1, 1))
+            self.assertIsNone(mailer.server)
+
+    def test_retry(self):
+        """Tests that temporary failures are retried."""
+        with serve_smtp(failures=2) as server:
+            mailer = self.mailer(server)
+            mailer.queue(["steward@test"], "Update")
+            self.assertEqual(mailer.send_all(), 1)
+            mailer.close()
+            self.assertEqual(len(server.messages), 1)
+
+        with serve_smtp(failures=3) as server:
+            mailer = self.mailer(server)
+            mailer.queue(["steward@test"], "Update")
+            with self.assertRaises(smtplib.SMTPDataError):
+                mailer.send_all()
+            mailer.close()
+            self.assertEqual(len(mailer.queued), 1)
+
+    def test_send_email(self):
+        """Tests that a single email is sent over its own connection."""
+        with serve_smtp() as server, tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "edits.csv")
+            with open(path, "w") as f:
+                f.write("FEMA ID\n19-08-0001P\n")
+            send_email("etl@test", "pw", ["steward@test"], "Update", path,
+                       host="127.0.0.1", port=server.server_address[1],
+                       starttls=False)
+            self.assertEqual(len(server.messages), 1)
+            self.assertEqual(server.connections, 1)
+        self.assertIn('filename="edits.csv"', server.messages[0]["data"])
+
+    def test_attachment(self):
+        """Tests that attachments are encoded and decode intact."""
+        data = os.urandom(1000)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "edits.csv")
+            with open(path, "wb") as f:
+                f.write(data)
+            part = attachment(path)
+        self.assertEqual(part.get_payload(decode=True), data)
+        self.assertEqual(part.get_filename(), "edits.csv")
+        self.assertEqual(part.get_payload(),
+                         base64.encodebytes(data).decode())
+
+
+if __name__ == '__main__':
+    unittest.main()
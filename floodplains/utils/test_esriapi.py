@@ -0,0 +1,125 @@
+import unittest
+from datetime import datetime
+
+import pandas as pd
+from shapely.geometry import box
+
+from floodplains.utils import esriapi, mirror
+from floodplains.utils.geometry import as_esri
+from floodplains.utils.standin import serve
+
+
+class TestAttributeCalculations(unittest.TestCase):
+    """Class to test that the whole-column attribute calculations give
+    the same output as their row-wise counterparts."""
+
+    def setUp(self):
+        dates = pd.to_datetime(["2019-01-01", "2020-05-05", "2018-02-02"])
+        self.sdf = pd.DataFrame({
+            "FLD_AR_ID": ["a", "b", "a", "c", "a", "b", "c"],
+            "EFFDATE": [dates[0], dates[1], dates[1], dates[2], dates[1],
+                        dates[0], dates[2]],
+            "SFHA_TF": ["T", "T", "F", "T", "T", "F", "T"],
+            "ZONE_SUBTY": ["FLOODWAY", None, "FLOODWAY", "FLOODWAY", None,
+                           None, "AREA OF MINIMAL FLOOD HAZARD"],
+            "FLD_ZONE": ["AE", "AO", "AH", "X", "AO", "AH", "AE"],
+            "DEPTH": [-9999.0, 1.5, -9999.0, -9999.0, 2.5, -9999.0, 0.0],
+            "STATIC_BFE": [-9999.0, -9999.0, 5280.4, -9999.0, -9999.0,
+                           5281.6, -9999.0]},
+            index=[7, 3, 5, 1, 6, 2, 4])
+
+    def test_ineffdates(self):
+        """Tests INEFFDATE against the dict lookup approach."""
+        dups = list(self.sdf[self.sdf.duplicated(["FLD_AR_ID"])]["FLD_AR_ID"])
+        dup_dates = {i: sorted(self.sdf[self.sdf["FLD_AR_ID"] == i]["EFFDATE"])
+                     for i in dups}
+        expected = self.sdf.apply(esriapi.calc_ineffdate,
+                                  date_dict=dup_dates, axis=1)
+        result = esriapi.calc_ineffdates(self.sdf)
+        self.assertEqual(list(result.index), list(self.sdf.index))
+        for e, r in zip(expected, result):
+            self.assertTrue((pd.isna(e) and pd.isna(r)) or e == r)
+
+    def test_floodways(self):
+        """Tests FLOODWAY against the row-wise calculation."""
+        expected = self.sdf.apply(esriapi.calc_floodway, axis=1)
+        result = esriapi.calc_floodways(self.sdf)
+        self.assertEqual(list(result), list(expected))
+
+    def test_floodzones(self):
+        """Tests FLOODZONE, including AO and AH suffixes."""
+        expected = self.sdf.apply(esriapi.calc_floodzone, axis=1)
+        result = esriapi.calc_floodzones(self.sdf)
+        self.assertEqual(list(result), list(expected))
+        self.assertEqual(list(result[:3]), ["AE", "AO2", "AH5280"])
+
+
+class TestJoinLomrs(unittest.TestCase):
+    """Class to test the indexed join of SFHAs to the LOMRs they fall
+    in, which EFFDATE is calculated from."""
+
+    def test_effdate(self):
+        """Tests that SFHAs get one row per LOMR they fall in."""
+        sfha = pd.DataFrame({
+            "FLD_AR_ID": ["a", "b", "c"],
+            "SHAPE": [as_esri(box(1, 1, 2, 2), 2876),
+                      as_esri(box(4, 1, 5.5, 2), 2876),
+                      as_esri(box(20, 20, 21, 21), 2876)]})
+        lomr = pd.DataFrame({
+            "CASE_NO": ["19-08-0001P", "20-08-0002P"],
+            "EFF_DATE": pd.to_datetime(["2019-01-01", "2020-05-05"]),
+            "SHAPE": [as_esri(box(0, 0, 5, 5), 2876),
+                      as_esri(box(4.5, 0, 10, 10), 2876)]})
+        result = esriapi.calc_effdate(sfha, lomr, "representative_point")
+        self.assertEqual(list(result["FLD_AR_ID"]), ["a", "b", "b"])
+        self.assertEqual(list(result["CASE_NO"]),
+                         ["19-08-0001P", "19-08-0001P", "20-08-0002P"])
+        ineff = esriapi.calc_ineffdates(result)
+        self.assertTrue(pd.isna(ineff[0]))
+        self.assertEqual(ineff[1], pd.Timestamp("2020-05-05"))
+        self.assertTrue(pd.isna(ineff[2]))
+
+
+class TestCheckedDate(unittest.TestCase):
+    """Class to test that a run's cutoff is only used once its edits are
+    posted.
+
+    A stand-in city floodplain layer with GISSCR edits from 2020-05-05
+    is served for each test."""
+
+    def setUp(self):
+        created = datetime(2020, 5, 5, 12).timestamp() * 1000
+        layer = {"geometryType": "esriGeometryPolygon",
+                 "spatialReference": {"wkid": 2876},
+                 "features": [{"attributes": {"OBJECTID": 1,
+                                              "CREATED_DATE": created},
+                               "geometry": as_esri(box(0, 0, 1, 1), 2876)}]}
+        self.context = serve({"city_flood": layer})
+        self.url = self.context.__enter__() + "/city_flood"
+        self.store = mirror.connect(":memory:")
+
+    def tearDown(self):
+        self.store.close()
+        self.context.__exit__(None, None, None)
+
+    def test_unposted(self):
+        """Tests that LOMRs since the posted edits are checked again."""
+        esriapi.record_checked_date(self.store, datetime(2021, 1, 1))
+        self.assertEqual(esriapi.last_checked_date(self.url, self.store),
+                         "2020-05-05")
+        self.assertEqual(mirror.get_watermark(self.store, esriapi.PENDING),
+                         "2021-01-01")
+
+    def test_posted(self):
+        """Tests that the cutoff is kept once the edits are posted."""
+        esriapi.record_checked_date(self.store, datetime(2020, 5, 5))
+        self.assertEqual(esriapi.last_checked_date(self.url, self.store),
+                         "2020-05-05")
+        self.assertIsNone(mirror.get_watermark(self.store, esriapi.PENDING))
+        self.assertEqual(
+            mirror.get_watermark(self.store, esriapi.LAST_CHECKED),
+            "2020-05-05")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import floodplains.config as config
+from floodplains.utils.lazy import lazy_import
+
+
+class TestLazyImport(unittest.TestCase):
+    """Class to test packages that are imported on first use."""
+
+    def test_deferred(self):
+        """Tests that a package only runs when it's used."""
+        sys.modules.pop("colorsys", None)
+        colorsys = lazy_import("colorsys")
+        self.assertEqual(type(colorsys).__name__, "_LazyModule")
+        self.assertEqual(colorsys.rgb_to_hsv(0, 0, 0), (0, 0, 0))
+        self.assertNotEqual(type(colorsys).__name__, "_LazyModule")
+
+    def test_missing(self):
+        """Tests that a missing package only fails when it's used."""
+        missing = lazy_import("not_an_installed_package")
+        with self.assertRaises(ModuleNotFoundError):
+            missing.features
+
+
+class TestLazyConfig(unittest.TestCase):
+    """Class to test settings that are read on first use.
+
+    The package's config file and a credentials file are copied into a
+    temporary working directory for each test, and logging is left as
+    it is."""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.folder = tempfile.TemporaryDirectory()
+        package = os.path.join(self.folder.name, "floodplains")
+        os.mkdir(package)
+        shutil.copy(os.path.join(os.path.dirname(config.__file__),
+                                 "config.yaml"), package)
+        with open(os.path.join(package, "credentials.yaml"), "w") as f:
+            f.write("DATABASE: {key: k, token: t}\n"
+                    "EMAIL: {address: etl@test, password: pw}\n")
+        os.chdir(self.folder.name)
+        patches = [mock.patch("logging.config.dictConfig"),
+                   mock.patch.object(config.logqueue, "start")]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.folder.cleanup()
+        for name in config.SETTINGS + ("_db_info", "_db_creds"):
+            vars(config).pop(name, None)
+        config._loaded = False
+
+    def test_settings(self):
+        """Tests that only the listed settings are exposed."""
+        self.assertEqual(config.sender, "etl@test")
+        self.assertEqual(config.workers, 1)
+        public = {k for k in vars(config) if not k.startswith("_")}
+        self.assertLessEqual(set(config.SETTINGS) - {"db_params"}, public)
+        for name in ("config", "creds", "db_creds", "esri", "database",
+                     "recipients"):
+            self.assertNotIn(name, public)
+
+    def test_typo(self):
+        """Tests that unknown settings fail without reading files."""
+        with mock.patch.object(config, "load") as load:
+            with self.assertRaises(AttributeError):
+                config.fc_feilds
+        load.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
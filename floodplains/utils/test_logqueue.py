@@ -0,0 +1,61 @@
+import logging
+import time
+import unittest
+
+from floodplains.utils import logqueue
+from floodplains.utils.standin import serve_smtp
+
+
+class TestLogQueue(unittest.TestCase):
+    """Class to test queued logging and coalesced error emails.
+
+    Error records are sent to a local stand-in SMTP server that takes a
+    second to greet each connection."""
+
+    def setUp(self):
+        self.context = serve_smtp(delay=1)
+        self.server = self.context.__enter__()
+        self.email = logqueue.CoalescingSMTPHandler(
+            ("127.0.0.1", self.server.server_address[1]), "etl@test",
+            ["steward@test"], "Errors", credentials=("etl@test", "pw"),
+            window=10)
+        self.email.setLevel(logging.ERROR)
+        logging.getLogger(logqueue.SINK).addHandler(self.email)
+        logqueue.start()
+        self.log = logging.getLogger("floodplains.test")
+        self.log.propagate = False
+        self.log.addHandler(logqueue.queue_handler())
+
+    def tearDown(self):
+        logqueue.stop()
+        self.log.handlers.clear()
+        logging.getLogger(logqueue.SINK).removeHandler(self.email)
+        self.context.__exit__(None, None, None)
+
+    def test_coalesce(self):
+        """Tests that errors are sent as one email when flushed."""
+        start = time.perf_counter()
+        for i in range(3):
+            self.log.error(f"Problem {i}")
+        self.log.warning("Not emailed")
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        logqueue.stop()
+        self.assertEqual(len(self.server.messages), 1)
+        message = self.server.messages[0]
+        self.assertEqual(message["to"], ["steward@test"])
+        self.assertIn("Errors (3 messages)", message["data"])
+        for i in range(3):
+            self.assertIn(f"Problem {i}", message["data"])
+        self.assertNotIn("Not emailed", message["data"])
+
+    def test_window(self):
+        """Tests that errors are sent once the window closes."""
+        self.email.window = 0.1
+        self.log.error("Problem")
+        time.sleep(2)
+        self.assertEqual(len(self.server.messages), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
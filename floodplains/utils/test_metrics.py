@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from floodplains.utils import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    """Class to test recording stages of a run and writing them out."""
+
+    def setUp(self):
+        self.run = metrics.start_run("test")
+
+    def test_stages(self):
+        """Tests that requests from any thread go to the inner stage."""
+        with metrics.stage("outer"):
+            with metrics.stage("inner") as stage:
+                with ThreadPoolExecutor(4) as pool:
+                    list(pool.map(metrics.record_request, [10] * 8))
+                stage["features_out"] = 3
+            metrics.record_request(5)
+        outer, inner = self.run.stages
+        self.assertEqual((outer["requests"], outer["bytes"]), (1, 5))
+        self.assertEqual((inner["requests"], inner["bytes"]), (8, 80))
+        self.assertEqual(inner["features_out"], 3)
+        self.assertGreater(inner["peak_rss"], 0)
+
+    def test_errors(self):
+        """Tests that a failing stage is still recorded."""
+        @metrics.timed("broken")
+        def broken():
+            raise ValueError("bad")
+        with self.assertRaises(ValueError):
+            broken()
+        self.assertEqual(self.run.stages[0]["error"], "ValueError")
+        self.assertIsNotNone(self.run.stages[0]["seconds"])
+
+    def test_outputs(self):
+        """Tests the JSON record and the Prometheus textfile."""
+        with metrics.stage("step01_services"):
+            metrics.record_request(100)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "log", "metrics.jsonl")
+            self.run.write_json(path)
+            self.run.write_json(path)
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+            prom = os.path.join(folder, "floodplains.prom")
+            self.run.write_prometheus(prom)
+            with open(prom) as f:
+                text = f.read()
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["run_id"], "test")
+        self.assertEqual((records[0]["requests"], records[0]["bytes"]),
+                         (1, 100))
+        self.assertIn("floodplains_run_bytes 100", text)
+        self.assertIn('floodplains_stage_bytes{stage="step01_services"} 100',
+                      text)
+        self.assertNotIn("features_in{", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
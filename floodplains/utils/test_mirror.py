@@ -0,0 +1,109 @@
+import unittest
+
+from floodplains.utils import mirror, restquery
+from floodplains.utils.standin import serve
+
+
+def square(oid, x, eff_date):
+    """Creates an ESRI JSON feature of a unit square at (x, 0)."""
+    ring = [[x, 0], [x, 1], [x + 1, 1], [x + 1, 0], [x, 0]]
+    return {"attributes": {"OBJECTID": oid, "EFF_DATE": eff_date},
+            "geometry": {"rings": [ring]}}
+
+
+class TestMirror(unittest.TestCase):
+    """Class to test storing and reading features in the local mirror.
+
+    An in-memory mirror with three LOMRs is set up for each test."""
+
+    def setUp(self):
+        self.conn = mirror.connect(":memory:")
+        self.feature_set = {"objectIdFieldName": "OBJECTID",
+                            "geometryType": "esriGeometryPolygon",
+                            "features": [square(1, 0, 1000),
+                                         square(2, 5, 2000),
+                                         square(3, 10, 3000)]}
+        mirror.store_features(self.conn, "lomr", self.feature_set,
+                              "EFF_DATE")
+
+    def tearDown(self):
+        self.conn.close()
+
+    def read_ids(self, **kwargs):
+        result = mirror.read_layer(self.conn, "lomr", **kwargs)
+        return [f["attributes"]["OBJECTID"] for f in result["features"]]
+
+    def test_round_trip(self):
+        """Tests that features and layer metadata are returned."""
+        result = mirror.read_layer(self.conn, "lomr")
+        self.assertEqual(result["geometryType"], "esriGeometryPolygon")
+        self.assertEqual(result["features"], self.feature_set["features"])
+
+    def test_filters(self):
+        """Tests the date and bounding box filters."""
+        self.assertEqual(self.read_ids(after=1500), [2, 3])
+        self.assertEqual(self.read_ids(bbox=(4, 0, 10.5, 1)), [2, 3])
+        self.assertEqual(self.read_ids(after=2500, bbox=(0, 0, 6, 1)), [])
+
+    def test_replace_and_delete(self):
+        """Tests that stored features replace and delete by objectId."""
+        mirror.store_features(self.conn, "lomr",
+                              {"features": [square(2, 20, 4000)]}, "EFF_DATE")
+        mirror.delete_features(self.conn, "lomr", [1])
+        self.assertEqual(mirror.local_ids(self.conn, "lomr"), {2, 3})
+        self.assertEqual(self.read_ids(after=3500), [2])
+
+    def test_watermark(self):
+        """Tests that watermarks are stored and replaced."""
+        self.assertIsNone(mirror.get_watermark(self.conn, "lomr.EFF_DATE"))
+        mirror.set_watermark(self.conn, "lomr.EFF_DATE", 3000)
+        mirror.set_watermark(self.conn, "lomr.EFF_DATE", 4000)
+        self.assertEqual(mirror.get_watermark(self.conn, "lomr.EFF_DATE"),
+                         "4000")
+
+    def test_cache(self):
+        """Tests that cached values are only read for their version."""
+        value = {"geometry": {"rings": [[[0, 0], [0, 1], [1, 1], [0, 0]]]}}
+        mirror.set_cached(self.conn, "city", "edited:1000", value)
+        self.assertEqual(mirror.get_cached(self.conn, "city", "edited:1000"),
+                         value)
+        self.assertIsNone(mirror.get_cached(self.conn, "city", "edited:2000"))
+
+    def test_sync(self):
+        """Tests that a sync with selected fields mirrors by ObjectID."""
+        new = square(4, 15, 5000)
+        new["attributes"]["CASE_NO"] = "20-08-0001P"
+        served = {"lomr": {**self.feature_set,
+                           "spatialReference": {"wkid": 2876},
+                           "features": self.feature_set["features"] + [new]}}
+        with serve(served) as url:
+            synced = mirror.sync_layer(self.conn, "lomr", f"{url}/lomr",
+                                       out_fields=["OBJECTID", "EFF_DATE"])
+        self.assertEqual(synced, {"added": 1, "updated": 3, "deleted": 0})
+        result = mirror.read_layer(self.conn, "lomr", bbox=(15, 0, 16, 1))
+        self.assertEqual(result["features"][0]["attributes"],
+                         {"OBJECTID": 4, "EFF_DATE": 5000})
+
+    def test_refresh(self):
+        """Tests that features without a date are downloaded again
+        within the refresh filter, in case they were edited in place."""
+        edited = [square(1, 0, 1000), square(2, 5, 2000),
+                  square(3, 10, 3000)]
+        for feature in edited:
+            feature["attributes"]["FLD_ZONE"] = "AE"
+        served = {"sfha": {**self.feature_set, "features": edited,
+                           "spatialReference": {"wkid": 2876}}}
+        mirror.store_features(self.conn, "sfha", self.feature_set)
+        area = {"rings": [[[4, 0], [4, 1], [7, 1], [7, 0], [4, 0]]]}
+        with serve(served) as url:
+            synced = mirror.sync_layer(
+                self.conn, "sfha", f"{url}/sfha",
+                refresh=restquery.intersects(area, 2876))
+        self.assertEqual(synced, {"added": 0, "updated": 1, "deleted": 0})
+        zones = [f["attributes"].get("FLD_ZONE") for f in
+                 mirror.read_layer(self.conn, "sfha")["features"]]
+        self.assertEqual(zones, [None, "AE", None])
+
+
+if __name__ == '__main__':
+    unittest.main()
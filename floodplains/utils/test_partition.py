@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+import shapely
+from shapely.geometry import box
+
+from floodplains.utils import partition
+from floodplains.utils.spatialindex import PolygonIndex, match_contained
+
+
+class TestPartition(unittest.TestCase):
+    """Class to test geometry work split into tiles across processes.
+
+    A 20 by 20 grid of unit squares is set up for each test, with two
+    drainages splitting it down the middle."""
+
+    def setUp(self):
+        self.squares = [box(x, y, x + 1, y + 1)
+                        for y in range(20) for x in range(20)]
+        self.drainages = [box(0, 0, 10, 20), box(10, 0, 20, 20)]
+
+    def test_tiles(self):
+        """Tests that partitions are repeatable and cover every item."""
+        keys = partition.tile_keys(self.squares, 16)
+        self.assertEqual(len(np.unique(keys)), 16)
+        parts = partition.split(keys)
+        self.assertEqual(sorted(np.concatenate(parts)), list(range(400)))
+        for a, b in zip(parts, partition.split(keys)):
+            np.testing.assert_array_equal(a, b)
+
+    def test_locate(self):
+        """Tests that a process pool locates like a single index."""
+        expected = PolygonIndex(self.drainages).locate(
+            shapely.point_on_surface(self.squares))
+        found = partition.locate(self.squares, self.drainages, workers=2)
+        np.testing.assert_array_equal(found, expected)
+
+    def test_contained(self):
+        """Tests that groups of boundaries match like a single index."""
+        lomrs = [box(-1, -1, 5, 5), box(8, 8, 13, 13), box(30, 30, 31, 31)]
+        expected = match_contained(lomrs, PolygonIndex(self.squares), 1)
+        found = partition.contained(lomrs, self.squares, 1, workers=2)
+        for a, b in zip(found, expected):
+            np.testing.assert_array_equal(a, b)
+
+    def test_dissolve(self):
+        """Tests that polygons crossing tile seams are stitched back
+        together, and groups keep their order."""
+        groups = [self.squares[::2], self.squares, []]
+        dissolved = partition.dissolve(groups, workers=2)
+        self.assertEqual(len(dissolved), 3)
+        self.assertTrue(dissolved[1].equals(box(0, 0, 20, 20)))
+        self.assertAlmostEqual(dissolved[0].area, 200)
+        self.assertTrue(dissolved[2].is_empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
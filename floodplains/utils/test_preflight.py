@@ -0,0 +1,55 @@
+import time
+import unittest
+
+from floodplains.utils import metrics, preflight
+from floodplains.utils.standin import serve
+
+LAYER = {"geometryType": "esriGeometryPolygon", "features": []}
+
+
+class TestCheckEndpoints(unittest.TestCase):
+    """Class to test concurrent endpoint checks, against stand-in
+    servers that are online, down, or hung."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.contexts = [serve({"up": LAYER}),
+                        serve({"down": LAYER}, status=500),
+                        serve({"hung": LAYER}, delay=1)]
+        cls.up, cls.down, cls.hung = [c.__enter__() for c in cls.contexts]
+
+    @classmethod
+    def tearDownClass(cls):
+        for context in cls.contexts:
+            context.__exit__(None, None, None)
+
+    def test_report(self):
+        """Tests the status of each endpoint, in the order supplied."""
+        urls = [f"{self.up}/up", f"{self.down}/down", f"{self.hung}/hung"]
+        report = preflight.check_endpoints(urls, timeout=0.3)
+        self.assertEqual([r["url"] for r in report], urls)
+        self.assertEqual([r["online"] for r in report], [True, False, False])
+        self.assertEqual(report[1]["status"], 500)
+        self.assertIn("Timeout", report[2]["error"])
+        self.assertIn("OFFLINE", preflight.describe(report)[2])
+
+    def test_metrics(self):
+        """Tests that every probe is recorded, even when it fails."""
+        run = metrics.start_run("test")
+        urls = [f"{self.up}/up", f"{self.hung}/hung"]
+        with metrics.stage("step00_preflight"):
+            preflight.check_endpoints(urls, timeout=0.3)
+        self.assertEqual(run.stages[0]["requests"], 2)
+        self.assertGreater(run.stages[0]["bytes"], 0)
+
+    def test_concurrent(self):
+        """Tests that hung endpoints are waited on at the same time."""
+        urls = [f"{self.hung}/hung?i={i}" for i in range(4)]
+        start = time.perf_counter()
+        report = preflight.check_endpoints(urls, timeout=0.3)
+        self.assertLess(time.perf_counter() - start, 0.9)
+        self.assertFalse(any(r["online"] for r in report))
+
+
+if __name__ == '__main__':
+    unittest.main()
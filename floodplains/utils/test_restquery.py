@@ -0,0 +1,75 @@
+import json
+import unittest
+
+from floodplains.utils import restquery
+from floodplains.utils.standin import serve
+
+MAX_RECORDS = 3
+FEATURES = [{"attributes": {"OBJECTID": i, "CASE_NO": f"19-08-{i:04d}P"},
+             "geometry": {"x": i, "y": i}} for i in range(1, 11)]
+
+
+class TestQuery(unittest.TestCase):
+    """Class to test chunked queries against a local stand-in server,
+    which never returns more than MAX_RECORDS features at a time."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.requests = []
+        layer = {"geometryType": "esriGeometryPoint",
+                 "spatialReference": {"wkid": 2876}, "features": FEATURES}
+        cls.context = serve({"lomr": layer}, MAX_RECORDS,
+                            requests=cls.requests)
+        cls.url = cls.context.__enter__() + "/lomr"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.context.__exit__(None, None, None)
+
+    def setUp(self):
+        self.requests.clear()
+
+    def test_params(self):
+        """Tests translation of FeatureLayer.query style arguments."""
+        g_filter = {"geometry": {"x": 1, "y": 2},
+                    "geometryType": "esriGeometryPoint",
+                    "spatialRel": "esriSpatialRelIntersects"}
+        params = restquery.query_params(out_fields=["CASE_NO", "EFF_DATE"],
+                                        geometry_filter=g_filter,
+                                        out_sr=2876, return_geometry=False)
+        self.assertEqual(params["outFields"], "CASE_NO,EFF_DATE")
+        self.assertEqual(params["returnGeometry"], "false")
+        self.assertEqual(json.loads(params["geometry"]), {"x": 1, "y": 2})
+        self.assertEqual(params["outSR"], 2876)
+
+    def test_pages_past_max_records(self):
+        """Tests that every feature is returned in objectId order."""
+        result = restquery.query(self.url, where="STATUS = 'Effective'")
+        ids = [f["attributes"]["OBJECTID"] for f in result["features"]]
+        self.assertEqual(ids, list(range(1, 11)))
+        self.assertEqual(result["geometryType"], "esriGeometryPoint")
+
+    def test_chunks(self):
+        """Tests chunk sizes and that selection params aren't resent."""
+        chunks = list(restquery.iter_chunks(
+            self.url, restquery.query_params(where="STATUS = 'Effective'"),
+            chunk_size=2, max_workers=3))
+        self.assertEqual([len(c["features"]) for c in chunks], [2] * 5)
+        fetches = [p for _, p in self.requests if "objectIds" in p]
+        self.assertEqual(len(fetches), 5)
+        self.assertTrue(all("where" not in p for p in fetches))
+
+    def test_statistics(self):
+        """Tests that only a summary is requested from the server."""
+        stats = restquery.query_statistics(self.url, [("max", "OBJECTID")])
+        self.assertEqual(stats, {"MAX_OBJECTID": 10})
+        self.assertEqual(len(self.requests), 1)
+
+    def test_no_matches(self):
+        """Tests that an empty query still returns a FeatureSet."""
+        result = restquery.query(self.url, where="1=0")
+        self.assertEqual(result["features"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
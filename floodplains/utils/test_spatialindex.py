@@ -0,0 +1,127 @@
+import unittest
+
+from shapely.geometry import Point, Polygon, box
+
+from floodplains.utils.geometry import (as_esri, as_shapely, bounding_area,
+                                        covering_area, fingerprints,
+                                        label_points, spatial_reference,
+                                        union)
+from floodplains.utils.spatialindex import PolygonIndex, match_contained
+
+
+class TestConversion(unittest.TestCase):
+    """Class to test round trips between ESRI JSON and shapely."""
+
+    def test_holes(self):
+        """Tests that counter-clockwise rings become holes."""
+        donut = box(0, 0, 10, 10).difference(box(4, 4, 6, 6))
+        esri = as_esri(donut, 2876)
+        self.assertEqual(len(esri["rings"]), 2)
+        self.assertEqual(esri["spatialReference"], {"wkid": 2876})
+        self.assertTrue(as_shapely(esri).equals(donut))
+
+    def test_multipart(self):
+        """Tests that multiple clockwise rings become a multipolygon."""
+        parts = box(0, 0, 1, 1).union(box(5, 5, 6, 6))
+        result = as_shapely(as_esri(parts, 2876))
+        self.assertEqual(result.geom_type, "MultiPolygon")
+        self.assertTrue(result.equals(parts))
+
+    def test_dissolve(self):
+        """Tests that a dissolve keeps the input's spatial reference."""
+        sr = {"wkid": 2876, "latestWkid": 2876}
+        geoms = [as_esri(box(x, 0, x + 1, 1), sr) for x in range(3)]
+        dissolved = as_esri(union(as_shapely(g) for g in geoms),
+                            spatial_reference([None] + geoms))
+        self.assertEqual(dissolved["spatialReference"]["latestWkid"], 2876)
+        self.assertEqual(len(dissolved["rings"]), 1)
+        self.assertAlmostEqual(as_shapely(dissolved).area, 3)
+
+    def test_label_points(self):
+        """Tests that label points fall inside concave polygons."""
+        u_shape = box(0, 0, 10, 10).difference(box(2, 2, 8, 10))
+        labels = label_points([u_shape, box(0, 0, 2, 2)])
+        self.assertEqual(labels.shape, (2, 2))
+        self.assertTrue(u_shape.contains(Point(labels[0])))
+        self.assertFalse(u_shape.contains(u_shape.centroid))
+
+    def test_fingerprints(self):
+        """Tests that fingerprints ignore vertex order and tiny noise."""
+        square = Polygon([(0, 0), (0, 1), (1, 1), (1, 0)])
+        shifted = Polygon([(1, 1), (1, 0), (0, 0), (0, 1.00001)])
+        prints = fingerprints([square, shifted, box(0, 0, 1, 2), None])
+        self.assertEqual(prints[0], prints[1])
+        self.assertNotEqual(prints[0], prints[2])
+        self.assertIsNone(prints[3])
+
+    def test_covering_area(self):
+        """Tests that a simplified filter still covers the originals."""
+        circles = [Point(0, 0).buffer(10, 64), Point(15, 0).buffer(10, 64)]
+        exact = covering_area(circles)
+        simple = covering_area(circles, tolerance=1)
+        self.assertTrue(simple.covers(exact))
+        self.assertLess(len(simple.exterior.coords),
+                        len(exact.exterior.coords))
+
+
+class TestPolygonIndex(unittest.TestCase):
+    """Class to test containment queries against the packed R-tree.
+
+    A 10 x 10 grid of unit squares is indexed for each test."""
+
+    def setUp(self):
+        self.squares = [box(x, y, x + 1, y + 1)
+                        for x in range(10) for y in range(10)]
+        self.index = PolygonIndex(self.squares)
+
+    def test_contained_by(self):
+        """Tests that only fully contained geometries are returned."""
+        hits = self.index.contained_by(box(0, 0, 2, 2.5))
+        self.assertEqual(list(hits), [0, 1, 10, 11])
+
+    def test_shared_edges(self):
+        """Tests that buffering catches geometries sharing an edge."""
+        lomrs = [box(0, 0, 2, 2), box(8, 8, 10, 10), box(20, 20, 30, 30)]
+        matches = match_contained(lomrs, self.index, buffer=0.01)
+        self.assertEqual([len(m) for m in matches], [4, 4, 0])
+
+    def test_matches_brute_force(self):
+        """Tests that the index agrees with pairwise contains calls."""
+        lomr = box(2.5, 1, 7, 6).buffer(1)
+        expected = [i for i, s in enumerate(self.squares) if lomr.contains(s)]
+        self.assertEqual(list(self.index.contained_by(lomr)), expected)
+
+    def test_locate(self):
+        """Tests that points resolve to the first containing geometry."""
+        drainages = PolygonIndex([box(0, 0, 5, 10), box(5, 0, 10, 10),
+                                  box(0, 0, 10, 10)])
+        points = [Point(1, 1), Point(7, 3), Point(5, 5), Point(20, 20)]
+        self.assertEqual(list(drainages.locate(points)), [0, 1, 2, -1])
+
+    def test_join(self):
+        """Tests that each predicate pairs geometries one-to-many."""
+        lomrs = PolygonIndex([box(0, 0, 5, 5), box(4.5, 0, 10, 10)])
+        sfhas = [box(1, 1, 2, 2), box(4, 1, 5.5, 2), box(5, 5, 6, 6)]
+        rows, hits = lomrs.join(sfhas)
+        self.assertEqual(list(zip(rows, hits)),
+                         [(0, 0), (1, 0), (1, 1), (2, 0), (2, 1)])
+        rows, hits = lomrs.join(sfhas, "within")
+        self.assertEqual(list(zip(rows, hits)), [(0, 0), (2, 1)])
+        rows, hits = lomrs.join(sfhas, "representative_point")
+        self.assertEqual(list(zip(rows, hits)),
+                         [(0, 0), (1, 0), (1, 1), (2, 1)])
+
+    def test_bounding_area(self):
+        """Tests that the prefilter area keeps every contained geometry."""
+        lomrs = [box(0.5, 0.5, 3, 3), box(6, 2, 9, 9.5)]
+        area = bounding_area(lomrs, buffer=0.01)
+        candidates = [s for s in self.squares if area.intersects(s)]
+        expected = match_contained(lomrs, self.index)
+        result = match_contained(lomrs, PolygonIndex(candidates))
+        self.assertEqual([len(m) for m in result],
+                         [len(m) for m in expected])
+        self.assertLess(len(candidates), len(self.squares))
+
+
+if __name__ == '__main__':
+    unittest.main()